@@ -0,0 +1,191 @@
+"""
+Benchmarks for pysnips.audio on synthetic wav files of increasing size
+"""
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import soundfile as sf
+
+from pysnips.audio import (ambisonics_reorder_channels, ambisonics_rotate, analyze_levels,
+                           extract_channels_from_wav, monofiles_to_multitrack,
+                           multitrack_to_monofiles, wav_to_planar, white_noise,
+                           white_noise_blocks)
+
+FS = 48000
+
+
+def _write_noise(filename, seconds, channels):
+    """Write a 16 bit noise file block by block, so setup does not distort peak memory"""
+    with sf.SoundFile(filename, 'w', FS, channels, subtype='PCM_16') as f:
+        for block in white_noise_blocks(seconds, FS, -6, 10 * FS, channels=channels,
+                                        seed=0, dtype=np.float32):
+            f.write(block)
+
+
+class _FileBenchmark(object):
+    """Base class that provides a temporary directory"""
+
+    def setup(self, *params):
+        self.tmpdir = tempfile.mkdtemp(prefix='pysnips-bench-')
+
+    def teardown(self, *params):
+        shutil.rmtree(self.tmpdir)
+
+    def _path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+
+class MonofilesToMultitrack(_FileBenchmark):
+    params = ([10, 60], [2, 16])
+    param_names = ['seconds', 'channels']
+
+    def setup(self, seconds, channels):
+        super(MonofilesToMultitrack, self).setup()
+        self.files = [self._path('mono%d.wav' % i) for i in range(channels)]
+        for f in self.files:
+            _write_noise(f, seconds, 1)
+
+    def time_merge(self, seconds, channels):
+        monofiles_to_multitrack(self.files, self._path('multi.wav'))
+
+    def time_merge_sequential(self, seconds, channels):
+        monofiles_to_multitrack(self.files, self._path('multi.wav'), io_threads=0)
+
+    def bytes_processed(self, seconds, channels):
+        return sum(os.path.getsize(f) for f in self.files)
+
+
+class ExtractChannels(_FileBenchmark):
+    params = ([5, 30], [4, 16, 64])
+    param_names = ['seconds', 'channels']
+
+    def setup(self, seconds, channels):
+        super(ExtractChannels, self).setup()
+        self.file = self._path('multi.wav')
+        _write_noise(self.file, seconds, channels)
+
+    def time_extract_two(self, seconds, channels):
+        extract_channels_from_wav(self.file, [0, 1], write_file=self._path('out.wav'))
+
+    def time_extract_two_mmap(self, seconds, channels):
+        extract_channels_from_wav(self.file, [0, 1], write_file=self._path('out.wav'),
+                                  mmap=True)
+
+    def bytes_processed(self, seconds, channels):
+        return os.path.getsize(self.file)
+
+
+class MultitrackToMonofiles(_FileBenchmark):
+    params = ([10, 60], [2, 16])
+    param_names = ['seconds', 'channels']
+
+    def setup(self, seconds, channels):
+        super(MultitrackToMonofiles, self).setup()
+        self.file = self._path('multi.wav')
+        _write_noise(self.file, seconds, channels)
+
+    def time_split(self, seconds, channels):
+        multitrack_to_monofiles(self.file, self._path('mono%d.wav'))
+
+    def time_split_int16(self, seconds, channels):
+        multitrack_to_monofiles(self.file, self._path('mono%d.wav'), dtype='int16',
+                                subtype='PCM_16')
+
+    def bytes_processed(self, seconds, channels):
+        return os.path.getsize(self.file)
+
+
+class PlanarQuery(_FileBenchmark):
+    params = ([60, 300], [16, 64])
+    param_names = ['seconds', 'channels']
+
+    def setup(self, seconds, channels):
+        super(PlanarQuery, self).setup()
+        self.file = self._path('multi.wav')
+        _write_noise(self.file, seconds, channels)
+        self.store = wav_to_planar(self.file, self._path('multi.planar'))
+
+    def time_extract_slice(self, seconds, channels):
+        # four channels, ten seconds from the middle
+        extract_channels_from_wav(self.file, [4, 5, 6, 7], start=seconds / 2,
+                                  stop=seconds / 2 + 10)
+
+    def time_planar_slice(self, seconds, channels):
+        self.store.read([4, 5, 6, 7], seconds / 2, seconds / 2 + 10)
+
+    def time_convert(self, seconds, channels):
+        wav_to_planar(self.file, self._path('convert.planar'), force=True)
+
+
+class AnalyzeLevels(_FileBenchmark):
+    params = ([10, 60], [2, 16])
+    param_names = ['seconds', 'channels']
+
+    def setup(self, seconds, channels):
+        super(AnalyzeLevels, self).setup()
+        self.file = self._path('multi.wav')
+        _write_noise(self.file, seconds, channels)
+
+    def time_levels(self, seconds, channels):
+        analyze_levels(self.file)
+
+    def time_levels_loudness(self, seconds, channels):
+        analyze_levels(self.file, loudness=True)
+
+    def bytes_processed(self, seconds, channels):
+        return os.path.getsize(self.file)
+
+
+class AmbisonicsReorder(object):
+    params = ([5, 20], [1, 3, 5])
+    param_names = ['seconds', 'order']
+
+    def setup(self, seconds, order):
+        self.signal = white_noise(seconds, FS, -6, channels=(order + 1)**2, seed=0)
+
+    def time_sid_to_acn(self, seconds, order):
+        ambisonics_reorder_channels(self.signal, order, 'sid', 'acn')
+
+    def bytes_processed(self, seconds, order):
+        return self.signal.nbytes
+
+
+class AmbisonicsRotate(object):
+    params = ([5, 20], [1, 3, 5])
+    param_names = ['seconds', 'order']
+
+    def setup(self, seconds, order):
+        self.signal = white_noise(seconds, FS, -6, channels=(order + 1)**2, seed=0,
+                                  dtype=np.float32)
+        # head tracking: a new orientation for every block of 512 frames
+        blocks = -(-len(self.signal) // 512)
+        t = np.linspace(0, seconds, blocks)
+        self.orientations = np.column_stack((90 * np.sin(t), 20 * np.sin(3 * t),
+                                             10 * np.sin(5 * t)))
+
+    def time_rotate_tracked(self, seconds, order):
+        ambisonics_rotate(self.signal, order, self.orientations, blocksize=512)
+
+    def time_rotate_fixed(self, seconds, order):
+        ambisonics_rotate(self.signal, order, (30, 10, 0), blocksize=512)
+
+    def bytes_processed(self, seconds, order):
+        return self.signal.nbytes
+
+
+class WhiteNoise(object):
+    params = ([10, 60], [1, 8])
+    param_names = ['seconds', 'channels']
+
+    def time_white_noise(self, seconds, channels):
+        white_noise(seconds, FS, -6, channels=channels)
+
+    def time_white_noise_float32_threaded(self, seconds, channels):
+        white_noise(seconds, FS, -6, channels=channels, dtype=np.float32, threads=4)
+
+    def bytes_processed(self, seconds, channels):
+        # counted as float64 samples for both variants
+        return seconds * FS * channels * 8
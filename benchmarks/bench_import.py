@@ -0,0 +1,35 @@
+"""
+Import time of the pysnips packages
+
+Every import runs in a fresh interpreter (so the time includes its startup) and
+fails if it loads heavy dependencies it should not need.
+"""
+
+import subprocess
+import sys
+
+# modules that must not be loaded by importing the key
+FORBIDDEN = {'pysnips': ['numpy', 'matplotlib', 'soundfile'],
+             'pysnips.audio': ['numpy', 'matplotlib', 'soundfile'],
+             'pysnips.plotting': ['numpy', 'matplotlib'],
+             'pysnips.plotting.svg': ['matplotlib'],
+             'pysnips.audio.signals': ['matplotlib', 'soundfile'],
+             'pysnips.instrument': ['numpy', 'matplotlib', 'soundfile']}
+
+CHECK = """
+import sys
+import {module}
+loaded = [m for m in {forbidden!r} if m in sys.modules]
+if loaded:
+    sys.exit('importing {module} loaded ' + ', '.join(loaded))
+"""
+
+
+class Import(object):
+    params = sorted(FORBIDDEN)
+    param_names = ['module']
+
+    def time_import(self, module):
+        subprocess.run([sys.executable, '-c',
+                        CHECK.format(module=module, forbidden=FORBIDDEN[module])],
+                       check=True)
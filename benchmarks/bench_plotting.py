@@ -0,0 +1,60 @@
+"""
+Benchmarks for pysnips.plotting on the headless Agg backend
+"""
+
+import warnings
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+from pysnips.plotting import plot_radar_chart, plot_sem_diff, radar_chart_svg, sem_diff_svg
+
+
+class _PlotBenchmark(object):
+
+    def setup(self, rows, cols):
+        rng = np.random.default_rng(0)
+        self.data = rng.integers(1, 5, (rows, cols)).astype(float)
+        self.line_labels = ['obs %d' % i for i in range(rows)]
+        self.var_labels = ['var %d' % i for i in range(cols)]
+        # plt.show is a no-op on Agg but warns about it
+        warnings.simplefilter('ignore', UserWarning)
+
+    def teardown(self, rows, cols):
+        plt.close('all')
+
+
+class RadarChart(_PlotBenchmark):
+    params = ([1, 10, 100], [5, 20])
+    param_names = ['rows', 'cols']
+
+    def time_plot_radar_chart(self, rows, cols):
+        fig, ax = plot_radar_chart(self.data, self.line_labels, self.var_labels)
+        fig.canvas.draw()
+        plt.close(fig)
+
+    def time_radar_chart_svg(self, rows, cols):
+        radar_chart_svg(self.data, self.line_labels, self.var_labels)
+
+
+class SemanticDifferential(_PlotBenchmark):
+    params = ([1, 10, 100], [5, 20])
+    param_names = ['rows', 'cols']
+
+    def setup(self, rows, cols):
+        super(SemanticDifferential, self).setup(rows, cols)
+        # punch some holes into the data to exercise the nan handling
+        self.data[::3, ::4] = np.nan
+        self.y_labels = list(zip(self.var_labels, self.var_labels[::-1]))
+
+    def time_plot_sem_diff(self, rows, cols):
+        fig = plot_sem_diff(self.data, np.arange(1, 5), self.y_labels, x_offset=1,
+                            line_labels=self.line_labels)
+        fig.canvas.draw()
+        plt.close(fig)
+
+    def time_sem_diff_svg(self, rows, cols):
+        sem_diff_svg(self.data, np.arange(1, 5), self.y_labels, x_offset=1,
+                     line_labels=self.line_labels)
@@ -0,0 +1,173 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Run the pysnips benchmarks
+
+Benchmarks are written in the style of airspeed velocity (asv): classes in the
+bench_*.py modules with `params`, `param_names`, `setup`, `teardown` and
+`time_*` methods. Classes can additionally define `bytes_processed(*params)` to
+get a throughput figure.
+
+Every benchmark case runs in a fresh python process, so the reported peak RSS
+belongs to that case alone.
+
+Usage:
+    python benchmarks/run.py                      # run everything
+    python benchmarks/run.py -k radar             # only cases containing 'radar'
+    python benchmarks/run.py --save base.json     # store results as baseline
+    python benchmarks/run.py --compare base.json  # compare against baseline
+"""
+
+import argparse
+import glob
+import importlib
+import inspect
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# the checkout, so the benchmarks run against it without installing pysnips
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+
+def _add_paths():
+    """Make the bench_* modules and the pysnips of the checkout importable"""
+    for path in (ROOT_DIR, BENCH_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def _case_environment():
+    """Environment of the case processes, with the checkout on the PYTHONPATH"""
+    env = dict(os.environ)
+    paths = [ROOT_DIR] + [p for p in env.get('PYTHONPATH', '').split(os.pathsep) if p]
+    env['PYTHONPATH'] = os.pathsep.join(paths)
+    return env
+
+
+def _discover():
+    """Return a list of (case name, module name, class name, method name, params)"""
+    _add_paths()
+    cases = []
+    for path in sorted(glob.glob(os.path.join(BENCH_DIR, 'bench_*.py'))):
+        module_name = os.path.splitext(os.path.basename(path))[0]
+        module = importlib.import_module(module_name)
+        for class_name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ != module_name or class_name.startswith('_'):
+                continue
+            params = getattr(cls, 'params', [])
+            if params and not isinstance(params[0], (list, tuple)):
+                params = [params]
+            methods = [m for m in dir(cls) if m.startswith('time_')]
+            for method, p in itertools.product(methods, itertools.product(*params)):
+                name = '%s.%s.%s(%s)' % (module_name, class_name, method,
+                                         ', '.join(repr(v) for v in p))
+                cases.append((name, module_name, class_name, method, list(p)))
+    return cases
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macos bytes
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def _run_case(module_name, class_name, method, params, repeat):
+    """Run a single benchmark case in this process, return the results as dict"""
+    _add_paths()
+    cls = getattr(importlib.import_module(module_name), class_name)
+    bench = cls()
+    if hasattr(bench, 'setup'):
+        bench.setup(*params)
+    rss_before = _peak_rss_mb()
+    try:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            getattr(bench, method)(*params)
+            times.append(time.perf_counter() - start)
+        result = {'time': min(times),
+                  'peak_rss': _peak_rss_mb(),
+                  'peak_rss_increase': max(_peak_rss_mb() - rss_before, 0.)}
+        if hasattr(bench, 'bytes_processed'):
+            result['throughput'] = bench.bytes_processed(*params) / result['time'] / 1e6
+    finally:
+        if hasattr(bench, 'teardown'):
+            bench.teardown(*params)
+    return result
+
+
+def _format_row(name, result, baseline=None):
+    row = '%-70s %10.2f ms' % (name, result['time'] * 1e3)
+    row += '  %8.1f MB/s' % result['throughput'] if 'throughput' in result else ' ' * 15
+    row += '  %8.1f MB (+%.1f)' % (result['peak_rss'], result['peak_rss_increase'])
+    if baseline is not None:
+        row += '  x%.2f time, x%.2f mem' % (result['time'] / baseline['time'],
+                                            result['peak_rss'] / baseline['peak_rss'])
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', dest='pattern', default='', help='only run matching cases')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='repetitions per case, the fastest counts (default: 3)')
+    parser.add_argument('--save', help='write results to this json file')
+    parser.add_argument('--compare', help='compare against results in this json file')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='ratio to the baseline that counts as regression (default: 1.2)')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        # child process: run one case and report back via stdout
+        case = json.loads(args.case)
+        print(json.dumps(_run_case(*case, repeat=args.repeat)))
+        return 0
+
+    baseline = {}
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    env = _case_environment()
+    for name, module_name, class_name, method, params in _discover():
+        if args.pattern not in name:
+            continue
+        case = json.dumps([module_name, class_name, method, params])
+        proc = subprocess.run([sys.executable, __file__, '--case', case,
+                               '--repeat', str(args.repeat)],
+                              stdout=subprocess.PIPE, universal_newlines=True, env=env)
+        if proc.returncode != 0:
+            print('%-70s FAILED' % name)
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        results[name] = result
+        base = baseline.get(name)
+        print(_format_row(name, result, base))
+        if base is not None and (result['time'] > args.threshold * base['time'] or
+                                 result['peak_rss'] > args.threshold * base['peak_rss']):
+            regressions.append(name)
+
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if regressions:
+        print('\n%d regressions (threshold x%.2f):' % (len(regressions), args.threshold))
+        for name in regressions:
+            print('    ' + name)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
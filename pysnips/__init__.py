@@ -1,5 +1,19 @@
-from . import plotting, audio
+import importlib
 
 name = 'pysnips'
+__version__ = '0.1'
 __all__ = ['plotting',
-           'audio']
+           'audio',
+           'instrument']
+
+
+def __getattr__(attr):
+    # subpackages are imported on first access, so that `import pysnips` does
+    # not pull in matplotlib or soundfile
+    if attr in __all__:
+        return importlib.import_module('.' + attr, __name__)
+    raise AttributeError("module %r has no attribute %r" % (__name__, attr))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,2 +1,40 @@
-from .utils import *
-from .signals import *
+import importlib
+
+# public functions of the submodules, imported on first access so that e.g.
+# the signal generators can be used without loading soundfile
+_PUBLIC = {'utils': ['ambisonics_reorder_channels',
+                     'extract_channels_from_wav',
+                     'monofiles_to_multitrack',
+                     'multitrack_to_monofiles'],
+           'signals': ['white_noise', 'white_noise_blocks',
+                       'pink_noise', 'pink_noise_blocks',
+                       'brown_noise', 'brown_noise_blocks',
+                       'exponential_sweep', 'exponential_sweep_blocks',
+                       'mls', 'mls_blocks'],
+           'memmap': ['memmap_wav'],
+           'ambisonics': ['ambisonics_channel_order',
+                          'ambisonics_normalization_gains',
+                          'ambisonics_convert',
+                          'ambisonics_convert_file'],
+           'rotation': ['ambisonics_rotation_matrix',
+                        'ambisonics_rotate',
+                        'ambisonics_rotate_file',
+                        'AmbisonicsRotator'],
+           'analysis': ['LevelMeter', 'analyze_levels', 'analyze_files'],
+           'planar': ['wav_to_planar', 'PlanarStore']}
+_LAZY = {attr: module for module, attrs in _PUBLIC.items() for attr in attrs}
+_SUBMODULES = set(_PUBLIC) | {'blockio', 'cli', 'filters'}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(attr):
+    if attr in _LAZY:
+        return getattr(importlib.import_module('.' + _LAZY[attr], __name__), attr)
+    if attr in _SUBMODULES:
+        return importlib.import_module('.' + attr, __name__)
+    raise AttributeError("module %r has no attribute %r" % (__name__, attr))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
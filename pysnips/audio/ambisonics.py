@@ -0,0 +1,263 @@
+"""
+Conversion of ambisonics signals between channel orderings and normalizations
+for arbitrary orders.
+
+Channels are identified by their spherical harmonic degree l and index m
+(-l <= m <= l). Supported orderings are ACN, SID and FuMa, supported
+normalizations are SN3D, N3D, maxN and FuMa (maxN with W scaled by 1/sqrt(2)).
+FuMa is only defined up to 3rd order.
+"""
+
+import functools
+
+import numpy as np
+
+from ..instrument import stage, staged
+from .blockio import BlockReader, _as_float, _open_output, _writable
+
+__all__ = ['ambisonics_channel_order',
+           'ambisonics_normalization_gains',
+           'ambisonics_convert',
+           'ambisonics_convert_file']
+
+
+ORDERINGS = ('acn', 'sid', 'fuma')
+NORMALIZATIONS = ('sn3d', 'n3d', 'maxn', 'fuma')
+FUMA_MAX_ORDER = 3
+
+
+def _ambisonics_channel_count_from_order(order, three_dim=True):
+    """
+    Helper function that computes the number of channels for a given ambisonics order.
+    """
+    return (order + 1)**2 if three_dim else (2 * order + 1)
+
+
+@functools.lru_cache(maxsize=None)
+def ambisonics_channel_order(order, ordering):
+    """
+    Return the channels of a full sphere ambisonics signal as tuple of (l, m)
+    pairs in the order given by `ordering`.
+
+    order - ambisonics order
+    ordering - name of the channel ordering ['acn', 'sid', 'fuma']
+    """
+    if ordering not in ORDERINGS:
+        raise ValueError('unknown ambisonics ordering: %s' % ordering)
+    if ordering == 'fuma' and order > FUMA_MAX_ORDER:
+        raise ValueError('FuMa is only defined up to order %d' % FUMA_MAX_ORDER)
+    channels = []
+    for l in range(order + 1):
+        if ordering == 'acn':
+            ms = range(-l, l + 1)
+        elif ordering == 'sid':
+            # l, -l, l-1, -(l-1), ..., 0
+            ms = [s * k for k in range(l, 0, -1) for s in (1, -1)] + [0]
+        elif l == 1:
+            # fuma: first order is x, y, z
+            ms = [1, -1, 0]
+        else:
+            # fuma: 0, 1, -1, 2, -2, ...
+            ms = [0] + [s * k for k in range(1, l + 1) for s in (1, -1)]
+        channels.extend((l, m) for m in ms)
+    return tuple(channels)
+
+
+def _legendre(l, m, x):
+    """Associated legendre function P_l^m(x) without Condon-Shortley phase"""
+    # start from P_m^m and walk the recurrence up in degree
+    p_mm = np.prod(np.arange(1, 2 * m, 2)) * (1 - x**2)**(m / 2.)
+    if l == m:
+        return p_mm
+    p_prev, p = p_mm, x * (2 * m + 1) * p_mm
+    for k in range(m + 2, l + 1):
+        p_prev, p = p, ((2 * k - 1) * x * p - (k + m - 1) * p_prev) / (k - m)
+    return p
+
+
+def _sn3d_factor(l, m):
+    """SN3D normalization factor of the spherical harmonic of degree l and index m"""
+    m = abs(m)
+    delta = 1 if m == 0 else 0
+    ratio = np.prod(np.arange(l - m + 1, l + m + 1, dtype=float))
+    return np.sqrt((2 - delta) / ratio)
+
+
+@functools.lru_cache(maxsize=None)
+def _sn3d_maximum(l, m):
+    """
+    Maximum absolute value of the SN3D spherical harmonic of degree l and index m
+    on the sphere, found by successively refined grid search over the elevation.
+    """
+    m = abs(m)
+    lo, hi = -1., 1.
+    for _ in range(4):
+        x = np.linspace(lo, hi, 1025)
+        y = np.abs(_legendre(l, m, x))
+        i = np.argmax(y)
+        step = x[1] - x[0]
+        lo, hi = max(x[i] - step, -1.), min(x[i] + step, 1.)
+    return _sn3d_factor(l, m) * y[i]
+
+
+def _gain_from_sn3d(l, m, normalization):
+    """Gain that converts a SN3D channel to the given normalization"""
+    if normalization == 'sn3d':
+        return 1.
+    if normalization == 'n3d':
+        return np.sqrt(2 * l + 1)
+    if normalization == 'fuma' and l > FUMA_MAX_ORDER:
+        raise ValueError('FuMa is only defined up to order %d' % FUMA_MAX_ORDER)
+    gain = 1. / _sn3d_maximum(l, m)
+    if normalization == 'fuma' and l == 0:
+        gain /= np.sqrt(2)
+    return gain
+
+
+def ambisonics_normalization_gains(order, ordering, input_normalization, output_normalization):
+    """
+    Return the per channel gains that convert a signal in `ordering` from one
+    normalization to another.
+
+    order - ambisonics order
+    ordering - name of the channel ordering ['acn', 'sid', 'fuma']
+    input_normalization - ['sn3d', 'n3d', 'maxn', 'fuma']
+    output_normalization - ['sn3d', 'n3d', 'maxn', 'fuma']
+    """
+    return _conversion_plan(order, ordering, ordering,
+                            input_normalization, output_normalization)[1]
+
+
+@functools.lru_cache(maxsize=None)
+def _conversion_plan(order, input_ordering, output_ordering,
+                     input_normalization, output_normalization):
+    """
+    Compute the channel permutation and gains for a conversion, such that
+    output[:, i] = input[:, indices[i]] * gains[i].
+    Gains are None if the conversion is a pure permutation.
+    """
+    for n in (input_normalization, output_normalization):
+        if n not in NORMALIZATIONS:
+            raise ValueError('unknown ambisonics normalization: %s' % n)
+    in_channels = ambisonics_channel_order(order, input_ordering)
+    out_channels = ambisonics_channel_order(order, output_ordering)
+    position = {lm: i for i, lm in enumerate(in_channels)}
+    indices = np.array([position[lm] for lm in out_channels], dtype=np.intp)
+    indices.flags.writeable = False
+    if input_normalization == output_normalization:
+        return indices, None
+    gains = np.array([_gain_from_sn3d(l, m, output_normalization) /
+                      _gain_from_sn3d(l, m, input_normalization)
+                      for l, m in out_channels])
+    gains.flags.writeable = False
+    return indices, gains
+
+
+def _apply_plan(signal_array, out, indices, gains, scratch):
+    """
+    Gather and scale the channels of `signal_array` into `out` in blocks of
+    the size of `scratch`. `out` may be `signal_array` itself.
+    """
+    blocksize = len(scratch)
+    for start in range(0, len(signal_array), blocksize):
+        stop = min(start + blocksize, len(signal_array))
+        block = scratch[:stop - start]
+        np.take(signal_array[start:stop], indices, axis=1, out=block)
+        if gains is None:
+            out[start:stop] = block
+        else:
+            np.multiply(block, gains, out=out[start:stop], casting='same_kind')
+    return out
+
+
+def _check_output(signal_array, out, gains):
+    """Validate or allocate the output array for a conversion"""
+    if out is None:
+        floating = np.issubdtype(signal_array.dtype, np.floating)
+        dtype = signal_array.dtype if gains is None or floating else np.float64
+        out = np.empty(signal_array.shape, dtype=dtype)
+    elif out.shape != signal_array.shape:
+        raise ValueError("Output array has shape %s, expected %s" %
+                         (out.shape, signal_array.shape))
+    if gains is not None and not np.issubdtype(out.dtype, np.floating):
+        raise TypeError("Changing the normalization requires a floating point output array")
+    return out
+
+
+@staged('ambisonics_convert')
+def ambisonics_convert(signal_array, order, input_ordering='acn', output_ordering='acn',
+                       input_normalization='sn3d', output_normalization='sn3d',
+                       out=None, blocksize=4096):
+    """
+    Convert ambisonics signals between channel orderings and normalizations.
+
+    The permutation and gains for a conversion are computed once and cached.
+    They are applied as a gather-and-scale in blocks of `blocksize` frames, so
+    apart from `out` only one block is allocated.
+
+    signal_array - array of shape (frames, channels), e.g. from soundfile.read or memmap_wav
+    order - order of the ambisonics signals, full sphere representation is assumed
+    input_ordering - channel ordering of the array ['acn', 'sid', 'fuma']
+    output_ordering - desired channel ordering ['acn', 'sid', 'fuma']
+    input_normalization - normalization of the array ['sn3d', 'n3d', 'maxn', 'fuma']
+    output_normalization - desired normalization ['sn3d', 'n3d', 'maxn', 'fuma']
+    out - output array of the same shape, may be `signal_array` itself to
+          convert in place, a new array is allocated if not given
+    blocksize - number of frames processed at once
+
+    returns:
+        the converted signals (`out` if given)
+    """
+    indices, gains = _conversion_plan(order, input_ordering, output_ordering,
+                                      input_normalization, output_normalization)
+    signal_array = np.asarray(signal_array)
+    if signal_array.ndim != 2 or signal_array.shape[1] != len(indices):
+        raise ValueError("Order %d needs an array with %d channels" % (order, len(indices)))
+    out = _check_output(signal_array, out, gains)
+    scratch = np.empty((min(blocksize, len(signal_array)), len(indices)),
+                       dtype=signal_array.dtype)
+    with stage('reorder') as st:
+        _apply_plan(signal_array, out, indices, gains, scratch)
+        st.add(len(out), out.nbytes)
+    return out
+
+
+@staged('ambisonics_convert_file')
+def ambisonics_convert_file(filename, new_filename, order, input_ordering='acn',
+                            output_ordering='acn', input_normalization='sn3d',
+                            output_normalization='sn3d', blocksize=65536, mmap=False,
+                            dtype='native', subtype=None):
+    """
+    Convert an ambisonics wav file block by block into a new file, see
+    `ambisonics_convert` for the conversion parameters.
+
+    blocksize - number of frames read, converted and written at once
+    mmap - if true, the input is memory mapped instead of decoded (see memmap_wav)
+    dtype - dtype the file is decoded to ['native', 'float64', 'float32', 'int32', 'int16'],
+            with 'native' a pure reordering moves the samples without conversion,
+            integer samples are converted to float only if the normalization changes
+    subtype - soundfile subtype of the new file, default: the subtype of the input
+    """
+    indices, gains = _conversion_plan(order, input_ordering, output_ordering,
+                                      input_normalization, output_normalization)
+    with BlockReader(filename, blocksize, mmap, dtype) as f:
+        if f.channels != len(indices):
+            raise ValueError("Order %d needs a file with %d channels" % (order, len(indices)))
+        # integer samples have to be scaled to [-1, 1) before applying gains
+        to_float = gains is not None and not np.issubdtype(f.dtype, np.floating)
+        dtype = np.float64 if to_float else f.dtype
+        buffer = np.empty((blocksize, f.channels), dtype=dtype)
+        scratch = np.empty((blocksize, f.channels), dtype=dtype)
+        with _open_output(new_filename, f.samplerate, f.channels, subtype, f.subtype) as out:
+            while True:
+                block = f.read(blocksize)
+                if len(block) == 0:
+                    break
+                with stage('reorder') as st:
+                    if to_float:
+                        block = _as_float(block)
+                    block = _apply_plan(block, buffer[:len(block)], indices, gains, scratch)
+                    st.add(len(block), block.nbytes)
+                with stage('write') as st:
+                    out.write(_writable(block))
+                    st.add(len(block), block.nbytes)
@@ -0,0 +1,221 @@
+"""
+Block-wise level and loudness analysis of (multichannel) sound files
+
+Files are streamed block by block, the statistics are accumulated with carried
+state, so the results do not depend on the block size and files of any length
+can be analysed with constant memory.
+"""
+
+import math
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ..instrument import stage, staged
+from .filters import IIRFilter
+
+__all__ = ['LevelMeter', 'analyze_levels', 'analyze_files']
+
+
+# per channel results, values are arrays with one entry per channel
+Levels = namedtuple('Levels', ['peak', 'rms', 'crest_factor', 'dc_offset', 'loudness',
+                               'frames'])
+
+# K-weighting of ITU-R BS.1770: high shelf (head effects) followed by a high pass,
+# given as (gain in dB, Q, center frequency), which reproduces the coefficients
+# of the standard at 48 kHz and extends them to other sample rates
+K_SHELF = (3.999843853973347, 0.7071752369554196, 1681.974450955533)
+K_HIGHPASS = (0., 0.5003270373253953, 38.13547087613982)
+# gating of the integrated loudness: blocks of 400 ms with 75 % overlap
+LOUDNESS_STEP = 0.1
+LOUDNESS_BLOCK_STEPS = 4
+LOUDNESS_ABSOLUTE_GATE = -70.
+LOUDNESS_RELATIVE_GATE = -10.
+
+
+def _k_weighting(fs):
+    """Coefficients (b, a) of both K-weighting stages for sample rate `fs`"""
+    gain, q, fc = K_SHELF
+    K = math.tan(math.pi * fc / fs)
+    Vh = 10**(gain / 20)
+    Vb = Vh**0.4996667741545416
+    shelf = ([Vh + Vb * K / q + K * K, 2 * (K * K - Vh), Vh - Vb * K / q + K * K],
+             [1 + K / q + K * K, 2 * (K * K - 1), 1 - K / q + K * K])
+
+    _, q, fc = K_HIGHPASS
+    K = math.tan(math.pi * fc / fs)
+    # the standard normalizes only the denominator, the numerator stays [1, -2, 1]
+    a0 = 1 + K / q + K * K
+    highpass = ([a0, -2 * a0, a0], [a0, 2 * (K * K - 1), 1 - K / q + K * K])
+    return shelf, highpass
+
+
+def _to_db(values):
+    with np.errstate(divide='ignore'):
+        return 20 * np.log10(values)
+
+
+class LevelMeter(object):
+    """
+    Accumulates peak, RMS, crest factor and DC offset of every channel (and
+    optionally the integrated loudness) over consecutive blocks of a signal.
+
+    channels - number of channels
+    samplerate - sample rate of the signal, only needed for the loudness
+    loudness - if true, the integrated loudness (ITU-R BS.1770, K-weighted and
+               gated) of every channel is measured as well, default: False
+
+    Example:
+        meter = LevelMeter(2, 48000, loudness=True)
+        for block in blocks:
+            meter.process(block)
+        levels = meter.result()
+    """
+
+    def __init__(self, channels, samplerate=None, loudness=False):
+        if loudness and not samplerate:
+            raise ValueError("The loudness can only be measured with a given samplerate")
+        self.channels = channels
+        self.samplerate = samplerate
+        self.frames = 0
+        self._peak = np.zeros(channels)
+        self._sum = np.zeros(channels)
+        self._sum_sq = np.zeros(channels)
+        self._loudness = loudness
+        if loudness:
+            self._filters = [IIRFilter(b, a) for b, a in _k_weighting(samplerate)]
+            self._step = int(round(LOUDNESS_STEP * samplerate))
+            # energy of the completed steps and of the step that is filled at the moment
+            self._steps = []
+            self._partial = np.zeros(channels)
+            self._partial_len = 0
+
+    def process(self, block):
+        """Add the next `block` of shape (frames, channels) (or (frames,) for mono)"""
+        block = np.asarray(block, dtype=float)
+        if block.ndim == 1:
+            block = block[:, None]
+        if block.ndim != 2 or block.shape[1] != self.channels:
+            raise ValueError("Blocks must have shape (frames, %d)" % self.channels)
+        if not len(block):
+            return
+        self.frames += len(block)
+        np.maximum(self._peak, np.max(np.abs(block), axis=0), out=self._peak)
+        self._sum += np.sum(block, axis=0)
+        self._sum_sq += np.einsum('ij,ij->j', block, block)
+        if self._loudness:
+            self._process_loudness(block)
+
+    def _process_loudness(self, block):
+        weighted = block.T
+        for f in self._filters:
+            weighted = f.process(weighted)
+        energy = weighted * weighted
+        # complete the step that was started by the previous block
+        n = min(self._step - self._partial_len, energy.shape[1])
+        self._partial += np.sum(energy[:, :n], axis=1)
+        self._partial_len += n
+        if self._partial_len < self._step:
+            return
+        self._steps.append(self._partial[None])
+        # full steps of this block and the start of the next step
+        k = (energy.shape[1] - n) // self._step
+        full = energy[:, n:n + k * self._step]
+        if k:
+            self._steps.append(full.reshape(self.channels, k, self._step).sum(axis=2).T)
+        rest = energy[:, n + k * self._step:]
+        self._partial = np.sum(rest, axis=1)
+        self._partial_len = rest.shape[1]
+
+    def _integrated_loudness(self):
+        """Gated loudness of every channel in LUFS (-inf for too short signals)"""
+        loudness = np.full(self.channels, -np.inf)
+        if not self._steps:
+            return loudness
+        steps = np.concatenate(self._steps)
+        if len(steps) < LOUDNESS_BLOCK_STEPS:
+            return loudness
+        # mean square of the overlapping gating blocks
+        cumulated = np.concatenate([np.zeros((1, self.channels)), np.cumsum(steps, axis=0)])
+        z = ((cumulated[LOUDNESS_BLOCK_STEPS:] - cumulated[:-LOUDNESS_BLOCK_STEPS]) /
+             (LOUDNESS_BLOCK_STEPS * self._step))
+        with np.errstate(divide='ignore'):
+            block_loudness = -0.691 + 10 * np.log10(z)
+        for c in range(self.channels):
+            zc = z[block_loudness[:, c] > LOUDNESS_ABSOLUTE_GATE, c]
+            if not len(zc):
+                continue
+            relative_gate = -0.691 + 10 * np.log10(np.mean(zc)) + LOUDNESS_RELATIVE_GATE
+            zc = zc[-0.691 + 10 * np.log10(zc) > relative_gate]
+            loudness[c] = -0.691 + 10 * np.log10(np.mean(zc))
+        return loudness
+
+    def result(self, db=False):
+        """
+        Return the levels of the blocks processed so far as `Levels`
+
+        db - if true, peak and RMS are given in dBFS and the crest factor in dB
+        """
+        if not self.frames:
+            raise ValueError("No frames have been processed")
+        rms = np.sqrt(self._sum_sq / self.frames)
+        peak = self._peak.copy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crest_factor = peak / rms
+        if db:
+            peak, rms, crest_factor = _to_db(peak), _to_db(rms), _to_db(crest_factor)
+        loudness = self._integrated_loudness() if self._loudness else None
+        return Levels(peak, rms, crest_factor, self._sum / self.frames, loudness,
+                      self.frames)
+
+
+@staged('analyze_levels')
+def analyze_levels(filename, blocksize=65536, loudness=False, db=False, mmap=False):
+    """
+    Measure peak, RMS, crest factor, DC offset and optionally the integrated
+    loudness of every channel of a sound file, reading it block by block.
+
+    filename - name of the file
+    blocksize - number of frames read per block
+    loudness - if true, the integrated loudness (LUFS) is measured as well
+    db - if true, peak and RMS are given in dBFS and the crest factor in dB
+    mmap - if true, the file is memory mapped instead of decoded (see memmap_wav)
+
+    returns:
+        Levels with arrays of one value per channel (`loudness` is None if not
+        measured) and the number of frames
+    """
+    from .blockio import BlockReader, _as_float
+    with BlockReader(filename, blocksize, mmap) as f:
+        meter = LevelMeter(f.channels, f.samplerate, loudness)
+        for _ in range(0, f.frames, blocksize):
+            block = f.read(blocksize)
+            with stage('analyze') as st:
+                meter.process(_as_float(block))
+                st.add(len(block), block.nbytes)
+    return meter.result(db)
+
+
+def _analyze_job(args):
+    filename, kwargs = args
+    return analyze_levels(filename, **kwargs)
+
+
+def analyze_files(filenames, workers=None, **kwargs):
+    """
+    Run analyze_levels for many files on a process pool
+
+    filenames - sequence of file names
+    workers - number of worker processes, default: number of cores,
+              0 analyses in the calling process
+    kwargs - further keyword arguments for analyze_levels
+
+    returns:
+        list with the Levels of every file, in the order of `filenames`
+    """
+    tasks = [(filename, kwargs) for filename in filenames]
+    if workers == 0:
+        return [_analyze_job(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_analyze_job, tasks))
@@ -0,0 +1,231 @@
+"""
+Block-wise reading of sound files shared by the audio helpers
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+from ..instrument import _current_stack, _run_in_stack, stage
+from .memmap import memmap_wav
+
+# dtypes soundfile can decode to, 'native' picks the one matching the file
+DTYPES = ('native', 'float64', 'float32', 'int32', 'int16')
+
+# smallest dtype that holds the samples of a subtype without loss
+_SUBTYPE_DTYPES = {'PCM_S8': 'int16', 'PCM_U8': 'int16', 'PCM_16': 'int16',
+                   'ALAW': 'int16', 'ULAW': 'int16', 'DPCM_8': 'int16', 'DPCM_16': 'int16',
+                   'PCM_24': 'int32', 'PCM_32': 'int32', 'DWVW_24': 'int32',
+                   'FLOAT': 'float32', 'DOUBLE': 'float64'}
+# subtypes of memory mapped files
+_MMAP_SUBTYPES = {'u1': 'PCM_U8', 'i2': 'PCM_16', 'i4': 'PCM_32', 'f4': 'FLOAT',
+                  'f8': 'DOUBLE'}
+
+
+# bits of the integer subtypes, to find a common subtype for files of different formats
+_PCM_BITS = {'PCM_S8': 8, 'PCM_U8': 8, 'PCM_16': 16, 'PCM_24': 24, 'PCM_32': 32}
+
+
+def _common_subtype(subtypes):
+    """Subtype that holds the samples of all `subtypes` without loss, None if there is none"""
+    subtypes = set(subtypes)
+    if len(subtypes) == 1:
+        return subtypes.pop()
+    if not subtypes <= set(_PCM_BITS) | {'FLOAT', 'DOUBLE'}:
+        return None
+    bits = max(_PCM_BITS.get(s, 0) for s in subtypes)
+    # float holds integer samples of up to 24 bits exactly
+    if 'DOUBLE' in subtypes or ('FLOAT' in subtypes and bits > 24):
+        return 'DOUBLE'
+    if 'FLOAT' in subtypes:
+        return 'FLOAT'
+    # signed and unsigned 8 bit files are combined in 16 bit
+    return 'PCM_16' if bits == 8 else 'PCM_%d' % bits
+
+
+def _native_dtype(subtype):
+    """Dtype to decode a file of `subtype` to without conversion to float"""
+    return np.dtype(_SUBTYPE_DTYPES.get(subtype, 'float64'))
+
+
+class BlockReader(object):
+    """
+    Sequential block-wise access to a sound file. Blocks are either decoded by
+    soundfile into a reused buffer of `dtype` ('native', 'float64', 'float32',
+    'int32' or 'int16', 'native' being the smallest one that holds the samples
+    of the file without loss) or, with `mmap`, sliced from a memory map of the
+    file in its native dtype without any copying.
+    """
+
+    def __init__(self, filename, blocksize, mmap=False, dtype='float64'):
+        if dtype not in DTYPES and np.dtype(dtype).name not in DTYPES:
+            raise ValueError("Unsupported dtype %s, use one of %s" % (dtype, ', '.join(DTYPES)))
+        self.name = filename
+        self._pos = 0
+        if mmap:
+            self._file = None
+            self._view, self.samplerate = memmap_wav(filename)
+            self.frames, self.channels = self._view.shape
+            self.dtype = self._view.dtype
+            self.subtype = _MMAP_SUBTYPES[self.dtype.str[1:]]
+        else:
+            self._file = sf.SoundFile(filename)
+            self.samplerate = self._file.samplerate
+            self.frames = self._file.frames
+            self.channels = self._file.channels
+            self.subtype = self._file.subtype
+            if dtype == 'native':
+                self.dtype = _native_dtype(self.subtype)
+            else:
+                self.dtype = np.dtype(dtype)
+            self._buffer = np.empty((blocksize, self.channels), dtype=self.dtype)
+
+    def seek(self, frame):
+        self._pos = frame
+        if self._file is not None:
+            self._file.seek(frame)
+
+    def read(self, n, out=None):
+        """
+        Return the next (up to) `n` frames as array of shape (frames, channels)
+
+        out - optional array of shape (>= n, channels) and the dtype of the reader
+              to read into instead of the internal buffer (or the memory map)
+        """
+        with stage('read') as st:
+            if self._file is None:
+                block = self._view[self._pos:self._pos + n]
+                if out is not None:
+                    out[:len(block)] = block
+                    block = out[:len(block)]
+            else:
+                if out is None:
+                    out = self._buffer
+                block = self._file.read(n, always_2d=True, out=out[:n])
+            st.add(len(block), block.nbytes)
+        self._pos += len(block)
+        return block
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        self._view = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ReadAhead(object):
+    """
+    Reads the blocks of several BlockReaders ahead on a thread pool.
+
+    Iterating yields a list with the next block of every reader (shorter or
+    empty once a reader runs out of frames). While the caller processes one
+    step, the next `depth - 1` steps of all readers are already decoded by
+    `workers` threads (libsndfile releases the GIL while decoding), so reading
+    from slow storage overlaps with the processing and among the inputs.
+    Every reader gets `depth` buffers that are used in turn, so a yielded
+    block stays valid until the iteration continues.
+
+    readers - sequence of BlockReaders
+    blocksize - number of frames per block
+    frames - total number of frames to read from every reader
+    workers - number of threads, default: one per reader (at most 16),
+              0 reads in the calling thread without any read-ahead
+    depth - number of blocks per reader in flight, 2 is double buffering
+    """
+
+    def __init__(self, readers, blocksize, frames, workers=None, depth=2):
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        self._readers = list(readers)
+        self._blocksize = blocksize
+        self._frames = frames
+        self._workers = min(len(self._readers), 16) if workers is None else workers
+        self._depth = depth if self._workers else 1
+        self._buffers = [[np.empty((blocksize, r.channels), dtype=r.dtype)
+                          for _ in range(self._depth)] for r in self._readers]
+        self._locks = [threading.Lock() for _ in self._readers]
+
+    def _read(self, i, start, slot):
+        reader = self._readers[i]
+        if start >= reader.frames:
+            return self._buffers[i][slot][:0]
+        n = min(self._blocksize, self._frames - start)
+        # tasks of one reader may run in any order, each one seeks to its block
+        with self._locks[i]:
+            reader.seek(start)
+            return reader.read(n, out=self._buffers[i][slot])
+
+    def __iter__(self):
+        starts = range(0, self._frames, self._blocksize)
+        if not self._workers:
+            for start in starts:
+                yield [self._read(i, start, 0) for i in range(len(self._readers))]
+            return
+
+        pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='pysnips-read')
+        pending = []
+        # the reads of the pool threads are reported under the stages of the caller
+        stack = _current_stack()
+        try:
+            def submit(k):
+                if stack:
+                    step = [pool.submit(_run_in_stack, stack, self._read, i, starts[k],
+                                        k % self._depth) for i in range(len(self._readers))]
+                else:
+                    step = [pool.submit(self._read, i, starts[k], k % self._depth)
+                            for i in range(len(self._readers))]
+                pending.append(step)
+
+            for k in range(min(self._depth, len(starts))):
+                submit(k)
+            for k in range(len(starts)):
+                step = pending.pop(0)
+                yield [future.result() for future in step]
+                # the buffers of step k are free again once the caller is done with them
+                if k + self._depth < len(starts):
+                    submit(k + self._depth)
+        finally:
+            for step in pending:
+                for future in step:
+                    future.cancel()
+            pool.shutdown(wait=True)
+
+
+def _open_output(filename, samplerate, channels, subtype=None, source_subtype=None):
+    """
+    Open `filename` for writing with `subtype`, or with `source_subtype` if no
+    subtype is given and the format of the file supports it
+    """
+    if subtype is None and source_subtype is not None:
+        format = os.path.splitext(filename)[1][1:].upper()
+        if sf.check_format(format, source_subtype):
+            subtype = source_subtype
+    return sf.SoundFile(filename, 'w', samplerate, channels, subtype=subtype)
+
+
+def _writable(block):
+    """soundfile can not write uint8, these blocks are converted to int16"""
+    if block.dtype == np.uint8:
+        return (block.astype(np.int16) - 128) << 8
+    return block
+
+
+def _as_float(block):
+    """
+    Convert a block in its native dtype to float64 with the same scaling as
+    soundfile, i.e. integers are mapped to [-1, 1)
+    """
+    if block.dtype.kind == 'f':
+        return block.astype(np.float64, copy=False)
+    if block.dtype.kind == 'u':
+        offset = 2**(8 * block.dtype.itemsize - 1)
+        return (block - float(offset)) / offset
+    return block / float(2**(8 * block.dtype.itemsize - 1))
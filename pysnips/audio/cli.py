@@ -0,0 +1,225 @@
+"""
+Command line interface for running the audio helpers over many files.
+
+Example:
+    pysnips-audio batch extract 'recordings/*.wav' --channels 0 1 -o stereo/
+    pysnips-audio batch reorder 'ambi/*.wav' --order 3 --from fuma --to acn -o acn/
+    pysnips-audio batch merge --manifest stems.txt
+
+Jobs run on a process pool, outputs that are newer than all of their inputs
+are skipped and failing files are reported without stopping the batch.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .utils import extract_channels_from_wav, monofiles_to_multitrack
+from .ambisonics import ambisonics_convert_file, ORDERINGS, NORMALIZATIONS
+from .blockio import DTYPES
+
+
+def _run_job(kind, inputs, output, options):
+    """Run a single job, returns the number of input bytes processed"""
+    out_dir, out_name = os.path.split(output)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    # write to a temporary file first (keeping the extension for soundfile) so
+    # that a failed job never leaves an output that looks up to date
+    tmp_output = os.path.join(out_dir, '.tmp-%d-%s' % (os.getpid(), out_name))
+    try:
+        if kind == 'extract':
+            extract_channels_from_wav(inputs[0], options['channels'], write_file=tmp_output,
+                                      start=options['start'], stop=options['stop'],
+                                      blocksize=options['blocksize'], return_signal=False,
+                                      mmap=options['mmap'], dtype=options['dtype'],
+                                      subtype=options['subtype'])
+        elif kind == 'reorder':
+            ambisonics_convert_file(inputs[0], tmp_output, options['order'],
+                                    options['input_ordering'], options['output_ordering'],
+                                    options['input_normalization'],
+                                    options['output_normalization'],
+                                    blocksize=options['blocksize'], mmap=options['mmap'],
+                                    dtype=options['dtype'], subtype=options['subtype'])
+        elif kind == 'merge':
+            monofiles_to_multitrack(inputs, tmp_output, blocksize=options['blocksize'],
+                                    length=options['length'], mmap=options['mmap'],
+                                    dtype=options['dtype'], subtype=options['subtype'])
+        else:
+            raise ValueError('unknown job: %s' % kind)
+        os.replace(tmp_output, output)
+    finally:
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+    return sum(os.path.getsize(f) for f in inputs)
+
+
+def _is_up_to_date(inputs, output):
+    """
+    True if `output` exists and is newer than all of `inputs`. Missing inputs
+    make the output out of date, so the job runs and fails on its own.
+    """
+    if not os.path.exists(output):
+        return False
+    out_time = os.path.getmtime(output)
+    try:
+        return all(os.path.getmtime(f) <= out_time for f in inputs)
+    except OSError:
+        return False
+
+
+def _read_manifest(filename):
+    """Read whitespace separated entries per line, ignoring empty lines and comments"""
+    entries = []
+    with open(filename) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                entries.append(line.split())
+    return entries
+
+
+def _collect_jobs(args):
+    """Return a list of (inputs, output) pairs for the requested job"""
+    if args.job == 'merge':
+        # manifest lines: output followed by the mono input files
+        if args.manifest is None:
+            raise ValueError("merge jobs need a --manifest")
+        entries = _read_manifest(args.manifest)
+        if any(len(e) < 2 for e in entries):
+            raise ValueError("merge manifest lines need an output and at least one input")
+        return [(e[1:], e[0]) for e in entries]
+
+    # manifest lines: input and optionally output
+    if args.manifest is not None:
+        entries = _read_manifest(args.manifest)
+    else:
+        entries = []
+        for pattern in args.inputs:
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                print('warning: no files match %s' % pattern, file=sys.stderr)
+            entries.extend([m] for m in matches)
+    jobs = []
+    for entry in entries:
+        if len(entry) > 1:
+            output = entry[1]
+        elif args.output_dir is not None:
+            output = os.path.join(args.output_dir, os.path.basename(entry[0]))
+        else:
+            raise ValueError("no output given for %s, use --output-dir" % entry[0])
+        if os.path.abspath(output) == os.path.abspath(entry[0]):
+            raise ValueError("output would overwrite input %s" % entry[0])
+        jobs.append(([entry[0]], output))
+    return jobs
+
+
+def run_batch(args):
+    """Run all jobs described by the parsed arguments, returns the number of failures"""
+    options = {k: getattr(args, k, None) for k in
+               ('channels', 'start', 'stop', 'order', 'input_ordering', 'output_ordering',
+                'input_normalization', 'output_normalization', 'length', 'blocksize', 'mmap',
+                'dtype', 'subtype')}
+    jobs = _collect_jobs(args)
+    todo = [j for j in jobs if args.force or not _is_up_to_date(*j)]
+    skipped = len(jobs) - len(todo)
+    if skipped and not args.quiet:
+        print('skipping %d up-to-date outputs' % skipped, file=sys.stderr)
+
+    failed = 0
+    done = 0
+    total_bytes = 0
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(_run_job, args.job, inputs, output, options): output
+                   for inputs, output in todo}
+        for future in as_completed(futures):
+            done += 1
+            output = futures[future]
+            try:
+                total_bytes += future.result()
+            except Exception as e:
+                failed += 1
+                print('[%d/%d] FAILED %s: %s' % (done, len(todo), output, e), file=sys.stderr)
+                continue
+            if not args.quiet:
+                elapsed = time.time() - start_time
+                print('[%d/%d] %s (%.1f files/s, %.1f MB/s)' %
+                      (done, len(todo), output, done / elapsed, total_bytes / elapsed / 1e6),
+                      file=sys.stderr)
+
+    elapsed = time.time() - start_time
+    if not args.quiet:
+        print('%d done, %d failed, %d skipped in %.1f s (%.1f MB/s)' %
+              (len(todo) - failed, failed, skipped, elapsed,
+               total_bytes / max(elapsed, 1e-9) / 1e6), file=sys.stderr)
+    return failed
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(prog='pysnips-audio',
+                                     description='Audio helpers from pysnips')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+    batch = commands.add_parser('batch', help='run a job over many files in parallel')
+    jobs = batch.add_subparsers(dest='job')
+    jobs.required = True
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--manifest', help='file with one job per line instead of globs')
+    common.add_argument('-j', '--workers', type=int, default=None,
+                        help='number of worker processes (default: number of cores)')
+    common.add_argument('-f', '--force', action='store_true',
+                        help='also process files whose outputs are up to date')
+    common.add_argument('--blocksize', type=int, default=65536,
+                        help='frames per block (default: 65536)')
+    common.add_argument('--mmap', action='store_true',
+                        help='memory map uncompressed wav inputs instead of decoding them')
+    common.add_argument('--dtype', choices=DTYPES, default='native',
+                        help='sample type used for processing (default: native, i.e. '
+                             'the samples are not converted unless necessary)')
+    common.add_argument('--subtype', help='subtype of the outputs, e.g. PCM_24 or FLOAT '
+                                          '(default: the subtype of the input)')
+    common.add_argument('-q', '--quiet', action='store_true', help='only report failures')
+
+    single = argparse.ArgumentParser(add_help=False)
+    single.add_argument('inputs', nargs='*', help='glob patterns of input files')
+    single.add_argument('-o', '--output-dir', help='directory for the output files')
+
+    extract = jobs.add_parser('extract', parents=[common, single],
+                              help='extract channels (manifest: input [output])')
+    extract.add_argument('-c', '--channels', type=int, nargs='+', required=True)
+    extract.add_argument('--start', type=float, help='start time in seconds')
+    extract.add_argument('--stop', type=float, help='stop time in seconds')
+
+    reorder = jobs.add_parser('reorder', parents=[common, single],
+                              help='convert ambisonics files (manifest: input [output])')
+    reorder.add_argument('--order', type=int, required=True)
+    reorder.add_argument('--from', dest='input_ordering', choices=ORDERINGS, required=True)
+    reorder.add_argument('--to', dest='output_ordering', choices=ORDERINGS, required=True)
+    reorder.add_argument('--from-norm', dest='input_normalization', choices=NORMALIZATIONS,
+                         default='sn3d')
+    reorder.add_argument('--to-norm', dest='output_normalization', choices=NORMALIZATIONS,
+                         default='sn3d')
+
+    merge = jobs.add_parser('merge', parents=[common],
+                            help='merge mono files (manifest: output input1 input2 ...)')
+    merge.add_argument('--length', choices=('longest', 'shortest'), default='longest')
+    return parser
+
+
+def main(argv=None):
+    args = _build_parser().parse_args(argv)
+    try:
+        failed = run_batch(args)
+    except (ValueError, OSError) as e:
+        print('error: %s' % e, file=sys.stderr)
+        return 2
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
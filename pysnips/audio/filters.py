@@ -0,0 +1,110 @@
+"""
+Stateful filters for processing long signals block by block.
+"""
+
+import numpy as np
+
+__all__ = ['IIRFilter']
+
+
+class IIRFilter(object):
+    """
+    IIR filter with carried state, filtering along the last axis of the input
+    (like scipy.signal.lfilter with initial conditions passed from block to block).
+
+    The signal is processed in sub-blocks of `sub_block` samples via matrix
+    products of the state space representation of the filter, so there is no
+    python loop over the individual samples. Calling `process` on consecutive
+    blocks gives the same result as processing the whole signal at once,
+    independent of the block sizes.
+
+    b - numerator coefficients
+    a - denominator coefficients
+    sub_block - number of samples handled by one matrix product
+    """
+
+    def __init__(self, b, a, sub_block=256):
+        b = np.atleast_1d(np.asarray(b, dtype=float))
+        a = np.atleast_1d(np.asarray(a, dtype=float))
+        if a[0] == 0:
+            raise ValueError("First denominator coefficient must not be zero")
+        b, a = b / a[0], a / a[0]
+        order = max(len(a), len(b)) - 1
+        b = np.pad(b, (0, order + 1 - len(b)), 'constant')
+        a = np.pad(a, (0, order + 1 - len(a)), 'constant')
+        self.order = order
+        self.sub_block = sub_block
+
+        # controllable canonical form: s[n+1] = A s[n] + B x[n], y[n] = C s[n] + D x[n]
+        A = np.zeros((order, order))
+        A[0] = -a[1:]
+        A[1:, :-1] = np.eye(order - 1)
+        B = np.zeros(order)
+        if order:
+            B[0] = 1.
+        C = b[1:] - b[0] * a[1:]
+        D = b[0]
+        self._A, self._B, self._C, self._D = A, B, C, D
+
+        # powers A^0 ... A^L
+        L = sub_block
+        powers = [np.eye(order)]
+        for _ in range(L):
+            powers.append(A @ powers[-1])
+        self._powers = powers
+        # impulse response h[0] ... h[L-1]
+        h = np.array([D] + [C @ powers[k - 1] @ B for k in range(1, L)])
+        idx = np.arange(L)
+        lag = idx[:, None] - idx[None, :]
+        # H maps the input of a sub-block to its output for zero initial state
+        self._H = np.where(lag >= 0, h[np.clip(lag, 0, None)], 0.)
+        # O maps the initial state to the output, G maps the input to the final state
+        self._O = np.array([C @ powers[i] for i in range(L)]).reshape(L, order)
+        self._G = np.array([powers[L - 1 - j] @ B for j in range(L)]).reshape(L, order).T
+        self._state = None
+
+    def reset(self):
+        """Reset the filter state to zero"""
+        self._state = None
+
+    def noise_gain(self):
+        """
+        RMS gain of the filter for white noise, i.e. the square root of the sum
+        of the squared impulse response
+        """
+        if self.order == 0:
+            return abs(self._D)
+        # controllability gramian W = A W A^T + B B^T
+        n = self.order
+        W = np.linalg.solve(np.eye(n * n) - np.kron(self._A, self._A),
+                            np.outer(self._B, self._B).ravel()).reshape(n, n)
+        return np.sqrt(self._D**2 + self._C @ W @ self._C)
+
+    def process(self, x):
+        """Filter the next block of `x` along its last axis"""
+        x = np.asarray(x, dtype=float)
+        if self.order == 0:
+            return self._D * x
+        lead, n = x.shape[:-1], x.shape[-1]
+        L = self.sub_block
+        s = self._state if self._state is not None else np.zeros(lead + (self.order,))
+        y = np.empty(x.shape)
+        K, r = divmod(n, L)
+        if K:
+            X = x[..., :K * L].reshape(lead + (K, L))
+            Y = X @ self._H.T
+            E = X @ self._G.T
+            # walk the state from sub-block to sub-block
+            A_L = self._powers[L].T
+            S = np.empty(lead + (K, self.order))
+            for k in range(K):
+                S[..., k, :] = s
+                s = s @ A_L + E[..., k, :]
+            Y += S @ self._O.T
+            y[..., :K * L] = Y.reshape(lead + (K * L,))
+        if r:
+            xr = x[..., K * L:]
+            y[..., K * L:] = xr @ self._H[:r, :r].T + s @ self._O[:r].T
+            s = s @ self._powers[r].T + xr @ self._G[:, L - r:].T
+        self._state = s
+        return y
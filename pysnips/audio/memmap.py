@@ -0,0 +1,138 @@
+"""
+Zero-copy access to uncompressed wav files via numpy memory maps.
+
+Supports RIFF/WAVE as well as the 64-bit variants RF64 and Sony Wave64 (W64)
+for files larger than 4 GB.
+"""
+
+import struct
+import os
+
+import numpy as np
+
+__all__ = ['memmap_wav']
+
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Wave64 chunk identifiers are GUIDs; the first four bytes are the ascii name,
+# the rest is shared by all chunks except the riff header
+W64_RIFF = b'riff\x2e\x91\xcf\x11\xa5\xd6\x28\xdb\x04\xc1\x00\x00'
+W64_SUFFIX = b'\xf3\xac\xd3\x11\x8c\xd1\x00\xc0\x4f\x8e\xdb\x8a'
+
+
+def memmap_wav(filename, mode='r'):
+    """
+    Memory map the sample data of an uncompressed wav file.
+
+    Returns a tuple (signal_array, samplerate) where signal_array is a
+    numpy.memmap of shape (frames, channels) in the native dtype of the file
+    (uint8, int16, int32, float32 or float64). Nothing is decoded, reading from
+    the array reads from disk (or rather the page cache of the OS).
+
+    filename - name of a RIFF, RF64 or W64 wav file
+    mode - mode for numpy.memmap ['r', 'r+', 'c']
+    """
+    with open(filename, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        header = f.read(16)
+        riff = header[:4] == b'RIFF'
+        if header[:4] in (b'RIFF', b'RF64') and header[8:12] == b'WAVE':
+            fmt, offset, size = _parse_riff(f, not riff)
+        elif header == W64_RIFF:
+            fmt, offset, size = _parse_w64(f)
+        else:
+            raise ValueError("%s is not a RIFF, RF64 or W64 wav file" % filename)
+
+    channels, samplerate, block_align, dtype = fmt
+    remaining = file_size - offset
+    if riff and remaining > 0xFFFFFFFF:
+        # some tools write riff files > 4 GB with the 32 bit size saturated or
+        # wrapped around, take the largest size with the same lower 32 bits
+        if size == 0xFFFFFFFF:
+            size = remaining
+        else:
+            size += (remaining - size) // 2**32 * 2**32
+    # truncated files end before their data chunk does
+    size = min(size, remaining)
+    frames = size // block_align
+    if frames == 0:
+        return np.empty((0, channels), dtype=dtype), samplerate
+    signal_array = np.memmap(filename, dtype=dtype, mode=mode, offset=offset,
+                             shape=(frames, channels))
+    return signal_array, samplerate
+
+
+def _parse_riff(f, rf64):
+    """Walk the chunks of a RIFF/RF64 file, return format, data offset and size"""
+    fmt = None
+    ds64_data_size = None
+    f.seek(12)
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            raise ValueError("No data chunk found")
+        chunk_id, chunk_size = struct.unpack('<4sI', chunk)
+        if chunk_id == b'ds64':
+            ds64_data_size = struct.unpack('<QQ', f.read(16))[1]
+            f.seek(chunk_size - 16, 1)
+        elif chunk_id == b'fmt ':
+            fmt = _parse_fmt(f.read(chunk_size))
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise ValueError("data chunk found before fmt chunk")
+            if rf64 and chunk_size == 0xFFFFFFFF:
+                if ds64_data_size is None:
+                    raise ValueError("RF64 file without ds64 chunk")
+                chunk_size = ds64_data_size
+            return fmt, f.tell(), chunk_size
+        else:
+            f.seek(chunk_size, 1)
+        # chunks are padded to an even number of bytes
+        if chunk_size % 2:
+            f.seek(1, 1)
+
+
+def _parse_w64(f):
+    """Walk the chunks of a Wave64 file, return format, data offset and size"""
+    fmt = None
+    f.seek(24)
+    if f.read(16) != b'wave' + W64_SUFFIX:
+        raise ValueError("Not a W64 wave file")
+    while True:
+        chunk = f.read(24)
+        if len(chunk) < 24:
+            raise ValueError("No data chunk found")
+        guid, chunk_size = struct.unpack('<16sQ', chunk)
+        # chunk sizes include the 24 byte chunk header
+        body_size = chunk_size - 24
+        if guid == b'fmt ' + W64_SUFFIX:
+            fmt = _parse_fmt(f.read(body_size))
+        elif guid == b'data' + W64_SUFFIX:
+            if fmt is None:
+                raise ValueError("data chunk found before fmt chunk")
+            return fmt, f.tell(), body_size
+        else:
+            f.seek(body_size, 1)
+        # chunks are aligned to 8 bytes
+        f.seek(-chunk_size % 8, 1)
+
+
+def _parse_fmt(chunk):
+    """Return (channels, samplerate, block_align, dtype) from a fmt chunk"""
+    format_tag, channels, samplerate, _, block_align, bits = struct.unpack('<HHIIHH', chunk[:16])
+    if format_tag == WAVE_FORMAT_EXTENSIBLE:
+        # the actual format tag are the first two bytes of the sub format guid
+        format_tag = struct.unpack('<H', chunk[24:26])[0]
+    container_bytes = block_align // channels
+    if format_tag == WAVE_FORMAT_PCM:
+        dtypes = {1: np.uint8, 2: np.int16, 4: np.int32}
+    elif format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        dtypes = {4: np.float32, 8: np.float64}
+    else:
+        raise ValueError("Only uncompressed PCM or float wav files can be memory mapped")
+    if container_bytes not in dtypes:
+        raise ValueError("%d bit samples can not be memory mapped" % bits)
+    return channels, samplerate, block_align, np.dtype(dtypes[container_bytes]).newbyteorder('<')
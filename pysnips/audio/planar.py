@@ -0,0 +1,238 @@
+"""
+Chunked, channel-planar on-disk store for repeated random access to large
+multichannel recordings.
+
+A wav file is converted once into a directory with a JSON index and a single
+data file. The data file holds the signal in chunks of `chunk_frames` frames
+(the last one may be shorter), every chunk stores its channels one after
+another:
+
+    chunk 0: channel 0, channel 1, ..., chunk 1: channel 0, channel 1, ...
+
+so the samples of one channel within a chunk are contiguous. The store is
+read through a memory map, a slice of some channels and a time range only
+touches the parts of the chunks that hold them, which makes repeated queries
+cost O(requested data) instead of decoding the whole interleaved file.
+
+Example:
+    store = wav_to_planar('archive.wav', 'archive.planar')
+    block = store.read(channels=range(4, 9), start=12 * 60, stop=13 * 60)
+    block = store[12 * 60 * fs:13 * 60 * fs, 4:9]  # the same with frame indices
+"""
+
+import json
+import os
+
+import numpy as np
+
+from ..instrument import stage, staged
+from .blockio import BlockReader
+
+__all__ = ['wav_to_planar', 'PlanarStore']
+
+
+PLANAR_FORMAT = 'pysnips-planar'
+PLANAR_VERSION = 1
+INDEX_NAME = 'index.json'
+DATA_NAME = 'data.bin'
+
+
+def _source_info(filename):
+    st = os.stat(filename)
+    return {'name': os.path.abspath(filename), 'size': st.st_size, 'mtime': st.st_mtime}
+
+
+@staged('wav_to_planar')
+def wav_to_planar(filename, directory, chunk_frames=65536, dtype='native', mmap=False,
+                  force=False):
+    """
+    Convert a (multichannel) wav file into a chunked planar store.
+
+    The file is read once, chunk by chunk, memory use is bounded by one chunk.
+    If `directory` already holds a store of the unchanged file (same size and
+    modification time) with the same chunk size, it is reused.
+
+    filename - name of the file to convert
+    directory - directory of the store, created if necessary
+    chunk_frames - number of frames per chunk, small chunks favour short time
+                   ranges of many channels, large chunks long ranges of few channels
+    dtype - dtype of the stored samples ['native', 'float64', 'float32', 'int32',
+            'int16'], 'native' keeps the samples of the file without conversion
+    mmap - if true, the file is memory mapped instead of decoded (see memmap_wav)
+    force - convert even if an up-to-date store exists
+
+    returns:
+        PlanarStore of the new store
+    """
+    if chunk_frames < 1:
+        raise ValueError("chunk_frames must be positive")
+    index_path = os.path.join(directory, INDEX_NAME)
+    source = _source_info(filename)
+    if not force and os.path.exists(index_path):
+        store = PlanarStore(directory)
+        if (store.index['source'] == source and store.chunk_frames == chunk_frames and
+                dtype in ('native', store.dtype.name)):
+            return store
+        store.close()
+
+    os.makedirs(directory, exist_ok=True)
+    # an existing index is removed first, so a failed conversion never looks complete
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    with BlockReader(filename, chunk_frames, mmap, dtype) as f:
+        planar = np.empty((f.channels, chunk_frames), dtype=f.dtype)
+        with open(os.path.join(directory, DATA_NAME), 'wb') as out:
+            for _ in range(0, f.frames, chunk_frames):
+                chunk = f.read(chunk_frames)
+                n = len(chunk)
+                with stage('transpose') as st:
+                    planar[:, :n] = chunk.T
+                    st.add(n, chunk.nbytes)
+                with stage('write') as st:
+                    # the channels of a short last chunk are stored back to back as well
+                    planar[:, :n].tofile(out)
+                    st.add(n, chunk.nbytes)
+        index = {'format': PLANAR_FORMAT, 'version': PLANAR_VERSION,
+                 'samplerate': f.samplerate, 'frames': f.frames, 'channels': f.channels,
+                 'dtype': f.dtype.str, 'subtype': f.subtype, 'chunk_frames': chunk_frames,
+                 'source': source}
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, index_path)
+    return PlanarStore(directory)
+
+
+class PlanarStore(object):
+    """
+    Reader for a store created by wav_to_planar.
+
+    The store behaves like a read-only array of shape (frames, channels):
+    `store[t0:t1, channels]` returns the requested frames and channels as a new
+    array, read via a memory map from the chunks that contain them.
+
+    directory - directory of the store
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_NAME)) as f:
+            self.index = json.load(f)
+        if (self.index.get('format') != PLANAR_FORMAT or
+                self.index.get('version') != PLANAR_VERSION):
+            raise ValueError("%s is not a planar store of version %d" %
+                             (directory, PLANAR_VERSION))
+        self.samplerate = self.index['samplerate']
+        self.frames = self.index['frames']
+        self.channels = self.index['channels']
+        self.dtype = np.dtype(self.index['dtype'])
+        self.subtype = self.index['subtype']
+        self.chunk_frames = self.index['chunk_frames']
+        if self.frames:
+            self._data = np.memmap(os.path.join(directory, DATA_NAME), dtype=self.dtype,
+                                   mode='r', shape=(self.frames * self.channels,))
+        else:
+            self._data = np.empty(0, dtype=self.dtype)
+
+    @property
+    def shape(self):
+        return (self.frames, self.channels)
+
+    def __len__(self):
+        return self.frames
+
+    def _chunk(self, k):
+        """Array of shape (channels, frames) of chunk `k`, a view of the memory map"""
+        start = k * self.chunk_frames
+        n = min(self.chunk_frames, self.frames - start)
+        offset = start * self.channels
+        return self._data[offset:offset + n * self.channels].reshape(self.channels, n)
+
+    def _channel_indices(self, channels):
+        if channels is None:
+            return np.arange(self.channels)
+        if isinstance(channels, slice):
+            return np.arange(self.channels)[channels]
+        indices = np.atleast_1d(np.asarray(channels, dtype=np.intp))
+        if indices.ndim != 1:
+            raise ValueError("channels must be an integer, a slice or a sequence of integers")
+        if np.any(indices < -self.channels) or np.any(indices >= self.channels):
+            raise IndexError("channel index out of range for %d channels" % self.channels)
+        return indices % self.channels
+
+    def read_frames(self, channels=None, start=0, stop=None, out=None):
+        """
+        Return frames `start` to `stop` of `channels` as array of shape (frames, channels)
+
+        channels - channel number, sequence of channel numbers or slice, default: all
+        start - first frame
+        stop - frame after the last one, default: end of the store
+        out - optional output array of the right shape and dtype
+        """
+        start, stop, _ = slice(start, stop).indices(self.frames)
+        stop = max(start, stop)
+        indices = self._channel_indices(channels)
+        shape = (stop - start, len(indices))
+        if out is None:
+            out = np.empty(shape, dtype=self.dtype)
+        elif out.shape != shape:
+            raise ValueError("Output array has shape %s, expected %s" % (out.shape, shape))
+        if stop == start or len(indices) == 0:
+            return out
+        with stage('planar_read') as st:
+            # ascending ranges of channels are sliced, other selections gathered
+            contiguous = np.all(np.diff(indices) == 1)
+            for k in range(start // self.chunk_frames, (stop - 1) // self.chunk_frames + 1):
+                chunk_start = k * self.chunk_frames
+                chunk = self._chunk(k)
+                a = max(start, chunk_start) - chunk_start
+                b = min(stop, chunk_start + chunk.shape[1]) - chunk_start
+                pos = chunk_start + a - start
+                if contiguous:
+                    rows = chunk[indices[0]:indices[-1] + 1, a:b]
+                else:
+                    rows = chunk[indices, a:b]
+                out[pos:pos + b - a] = rows.T
+            st.add(shape[0], out.nbytes)
+        return out
+
+    def read(self, channels=None, start=None, stop=None, out=None):
+        """
+        Return the samples between `start` and `stop` seconds of `channels`
+        as array of shape (frames, channels), see read_frames
+        """
+        first = 0 if start is None else int(round(start * self.samplerate))
+        last = self.frames if stop is None else min(int(round(stop * self.samplerate)),
+                                                    self.frames)
+        if not 0 <= first <= last:
+            raise ValueError("Invalid time range: start=%s, stop=%s" % (start, stop))
+        return self.read_frames(channels, first, last, out)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        if len(key) != 2:
+            raise IndexError("A store is indexed with [frames, channels]")
+        frames, channels = key
+        squeeze_channels = np.ndim(channels) == 0 and not isinstance(channels, slice)
+        if isinstance(frames, slice):
+            if frames.step not in (None, 1):
+                raise IndexError("Only contiguous frame ranges are supported")
+            result = self.read_frames(channels, frames.start, frames.stop)
+        else:
+            frame = int(frames)
+            if frame < 0:
+                frame += self.frames
+            if not 0 <= frame < self.frames:
+                raise IndexError("frame index out of range for %d frames" % self.frames)
+            result = self.read_frames(channels, frame, frame + 1)[0]
+        return result[..., 0] if squeeze_channels else result
+
+    def close(self):
+        self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,354 @@
+"""
+Rotation of ambisonics signals of arbitrary order, e.g. to follow head tracking
+
+The rotation matrices of the spherical harmonics are built recursively from
+the first order matrix (Ivanic and Ruedenberg, "Rotation Matrices for Real
+Spherical Harmonics. Direct Determination by Recursion", J. Phys. Chem. 1996,
+with the corrections of 1998) and converted to the channel ordering and
+normalization of the signal. Time-varying rotations are applied block by
+block as matrix multiplications, the matrices of the orientations are cached
+with the angles quantized to `resolution` degrees and consecutive
+orientations are crossfaded to avoid clicks.
+
+Angles are given in degrees as yaw (about the z axis, positive to the left),
+pitch (about the y axis, positive downwards) and roll (about the x axis,
+positive to the right, all by the right hand rule), applied to the sound field
+in the order roll, pitch, yaw. To compensate the movement of a listener's
+head, rotate the sound field by the negated head angles.
+
+Example:
+    rotator = AmbisonicsRotator(3, ordering='acn', normalization='sn3d')
+    for block, (yaw, pitch, roll) in zip(blocks, head_tracker):
+        play(rotator.process(block, -yaw, -pitch, -roll))
+"""
+
+import functools
+
+import numpy as np
+
+from ..instrument import stage, staged
+from .ambisonics import _conversion_plan
+from .blockio import BlockReader, _as_float, _open_output, _writable
+
+__all__ = ['ambisonics_rotation_matrix',
+           'ambisonics_rotate',
+           'ambisonics_rotate_file',
+           'AmbisonicsRotator']
+
+
+# default quantization of the angles of cached rotation matrices in degrees
+ROTATION_RESOLUTION = 0.5
+# number of rotation matrices cached per process
+ROTATION_CACHE_SIZE = 4096
+
+
+def _axis_rotation(yaw, pitch, roll):
+    """Cartesian rotation matrix of the sound field, angles in degrees"""
+    a, b, c = np.radians([yaw, pitch, roll])
+    rz = np.array([[np.cos(a), -np.sin(a), 0], [np.sin(a), np.cos(a), 0], [0, 0, 1]])
+    ry = np.array([[np.cos(b), 0, np.sin(b)], [0, 1, 0], [-np.sin(b), 0, np.cos(b)]])
+    rx = np.array([[1, 0, 0], [0, np.cos(c), -np.sin(c)], [0, np.sin(c), np.cos(c)]])
+    return rz.dot(ry).dot(rx)
+
+
+@functools.lru_cache(maxsize=None)
+def _recursion_terms(l):
+    """
+    Coefficients u, v, w of degree `l` and the rows of the functions P the
+    terms U, V and W are made of, as indices into the rows -(l+1)..l+1 of the
+    (zero padded) rotation matrix of degree l-1 and their factors
+    """
+    m = np.arange(-l, l + 1)[:, None]
+    n = np.arange(-l, l + 1)[None, :]
+    d = (m == 0).astype(float)
+    denom = np.where(np.abs(n) < l, (l + n) * (l - n), 2 * l * (2 * l - 1)).astype(float)
+    u = np.sqrt((l + m) * (l - m) / denom)
+    v = 0.5 * np.sqrt((1 + d) * (l + np.abs(m) - 1) * (l + np.abs(m)) / denom) * (1 - 2 * d)
+    w = -0.5 * np.sqrt(np.maximum((l - np.abs(m) - 1) * (l - np.abs(m)), 0) / denom) * (1 - d)
+
+    m = m[:, 0]
+    one = (m == 1).astype(float)
+    minus_one = (m == -1).astype(float)
+    # V = c1 * P(1, a1) + c2 * P(-1, a2)
+    v_terms = (np.where(m == 0, 1, np.where(m > 0, m - 1, m + 1)),
+               np.where(m == 0, 1., np.where(m > 0, np.sqrt(1 + one), 1 - minus_one)),
+               np.where(m == 0, -1, np.where(m > 0, -m + 1, -m - 1)),
+               np.where(m == 0, 1., np.where(m > 0, -(1 - one), np.sqrt(1 + minus_one))))
+    # W = c1 * P(1, a1) + c2 * P(-1, a2), not needed for m = 0 (w is zero)
+    w_terms = (np.where(m > 0, m + 1, m - 1),
+               np.where(m == 0, 0., 1.),
+               np.where(m > 0, -m - 1, -m + 1),
+               np.where(m == 0, 0., np.where(m > 0, 1., -1.)))
+    # shift the indices from -(l+1)..l+1 to 0..2l+2
+    v_terms = (v_terms[0] + l + 1, v_terms[1], v_terms[2] + l + 1, v_terms[3])
+    w_terms = (w_terms[0] + l + 1, w_terms[1], w_terms[2] + l + 1, w_terms[3])
+    return u, v, w, m + l + 1, v_terms, w_terms
+
+
+def _p_rows(r1, i, previous):
+    """
+    Function P of the recursion for row `i` (-1, 0, 1) of the first order
+    matrix `r1` and all rows of the `previous` degree's matrix
+    """
+    ri_minus, ri_zero, ri_plus = r1[i + 1]
+    rows = np.empty((len(previous), previous.shape[1] + 2))
+    rows[:, 1:-1] = ri_zero * previous
+    rows[:, 0] = ri_plus * previous[:, 0] + ri_minus * previous[:, -1]
+    rows[:, -1] = ri_plus * previous[:, -1] - ri_minus * previous[:, 0]
+    return rows
+
+
+def _sh_rotation_blocks(order, rotation):
+    """
+    Rotation matrices of the real spherical harmonics of every degree up to
+    `order` (orthonormal or SN3D, indexed by m = -l..l) for the cartesian `rotation`
+    """
+    # the first order harmonics are proportional to y, z and x
+    perm = [1, 2, 0]
+    r1 = rotation[np.ix_(perm, perm)]
+    blocks = [np.ones((1, 1))]
+    previous = np.ones((1, 1))
+    for l in range(1, order + 1):
+        if l == 1:
+            current = r1
+        else:
+            u, v, w, a_u, v_terms, w_terms = _recursion_terms(l)
+            padded = np.zeros((2 * l + 3, 2 * l - 1))
+            padded[2:-2] = previous
+            p = {i: _p_rows(r1, i, padded) for i in (-1, 0, 1)}
+            current = u * p[0][a_u]
+            current += v * (v_terms[1][:, None] * p[1][v_terms[0]] +
+                            v_terms[3][:, None] * p[-1][v_terms[2]])
+            current += w * (w_terms[1][:, None] * p[1][w_terms[0]] +
+                            w_terms[3][:, None] * p[-1][w_terms[2]])
+        blocks.append(current)
+        previous = current
+    return blocks
+
+
+def ambisonics_rotation_matrix(order, yaw=0., pitch=0., roll=0., ordering='acn',
+                               normalization='sn3d'):
+    """
+    Return the matrix that rotates an ambisonics signal, such that
+    `rotated = signal_array.dot(matrix.T)` for an array of shape (frames, channels).
+
+    order - ambisonics order, full sphere representation is assumed
+    yaw, pitch, roll - rotation of the sound field in degrees
+    ordering - channel ordering ['acn', 'sid', 'fuma']
+    normalization - normalization ['sn3d', 'n3d', 'maxn', 'fuma']
+    """
+    blocks = _sh_rotation_blocks(order, _axis_rotation(yaw, pitch, roll))
+    n = (order + 1)**2
+    acn = np.zeros((n, n))
+    for l, block in enumerate(blocks):
+        acn[l * l:(l + 1)**2, l * l:(l + 1)**2] = block
+    # acn_sn3d[:, i] = signal[:, indices[i]] * gains[i], convert the matrix accordingly
+    indices, gains = _conversion_plan(order, ordering, 'acn', normalization, 'sn3d')
+    if gains is not None:
+        acn = acn * gains[None, :] / gains[:, None]
+    matrix = np.empty((n, n))
+    matrix[np.ix_(indices, indices)] = acn
+    return matrix
+
+
+@functools.lru_cache(maxsize=ROTATION_CACHE_SIZE)
+def _cached_rotation_matrix(order, ordering, normalization, yaw, pitch, roll):
+    """ambisonics_rotation_matrix of quantized angles, read-only since shared"""
+    matrix = ambisonics_rotation_matrix(order, yaw, pitch, roll, ordering, normalization)
+    matrix.flags.writeable = False
+    return matrix
+
+
+def _quantize(angle, resolution):
+    """Wrap `angle` to [-180, 180) and round it to multiples of `resolution`"""
+    angle = (float(angle) + 180.) % 360. - 180.
+    if resolution:
+        angle = round(angle / resolution) * resolution
+    return angle
+
+
+class AmbisonicsRotator(object):
+    """
+    Rotates consecutive blocks of an ambisonics signal with a possibly
+    changing orientation.
+
+    Whenever the (quantized) orientation changes, the first `crossfade`
+    frames of the block are faded from the previous to the new rotation, the
+    rotation matrices are cached per process.
+
+    order - ambisonics order, full sphere representation is assumed
+    ordering - channel ordering ['acn', 'sid', 'fuma']
+    normalization - normalization ['sn3d', 'n3d', 'maxn', 'fuma']
+    crossfade - number of frames of the crossfade, default: None (the whole block)
+    resolution - quantization of the angles in degrees, 0 for exact angles
+                 (which are not worth caching), default: 0.5
+
+    Example:
+        rotator = AmbisonicsRotator(1, crossfade=256)
+        out = rotator.process(block, yaw=30.)
+    """
+
+    def __init__(self, order, ordering='acn', normalization='sn3d', crossfade=None,
+                 resolution=ROTATION_RESOLUTION):
+        if crossfade is not None and crossfade < 0:
+            raise ValueError("crossfade must not be negative")
+        self.order = order
+        self.ordering = ordering
+        self.normalization = normalization
+        self.channels = (order + 1)**2
+        self.crossfade = crossfade
+        self.resolution = resolution
+        # validates order, ordering and normalization
+        _conversion_plan(order, ordering, 'acn', normalization, 'sn3d')
+        self._orientation = None
+        self._matrix = None
+        self._ramps = {}
+
+    def matrix(self, yaw=0., pitch=0., roll=0.):
+        """Rotation matrix of an orientation, from the cache"""
+        angles = tuple(_quantize(a, self.resolution) for a in (yaw, pitch, roll))
+        if not self.resolution:
+            return ambisonics_rotation_matrix(self.order, *angles, ordering=self.ordering,
+                                              normalization=self.normalization)
+        return _cached_rotation_matrix(self.order, self.ordering, self.normalization, *angles)
+
+    def _ramp(self, n, dtype):
+        key = (n, dtype)
+        if key not in self._ramps:
+            self._ramps[key] = (np.arange(1, n + 1, dtype=dtype) / dtype.type(n + 1))[:, None]
+        return self._ramps[key]
+
+    def reset(self):
+        """Forget the previous orientation, the next block is not crossfaded"""
+        self._orientation = None
+        self._matrix = None
+
+    def process(self, block, yaw=0., pitch=0., roll=0., out=None):
+        """
+        Rotate the next `block` of shape (frames, channels) to the given orientation
+
+        out - optional output array of the same shape, must not be `block`
+
+        returns:
+            the rotated block (`out` if given)
+        """
+        block = np.asarray(block)
+        if block.ndim != 2 or block.shape[1] != self.channels:
+            raise ValueError("Order %d needs blocks of shape (frames, %d)" %
+                             (self.order, self.channels))
+        if not np.issubdtype(block.dtype, np.floating):
+            block = block.astype(np.float64)
+        if out is None:
+            out = np.empty(block.shape, dtype=block.dtype)
+        elif out.shape != block.shape:
+            raise ValueError("Output array has shape %s, expected %s" % (out.shape, block.shape))
+        elif np.may_share_memory(out, block):
+            raise ValueError("Blocks can not be rotated in place")
+        orientation = tuple(_quantize(a, self.resolution) for a in (yaw, pitch, roll))
+        previous = self._matrix
+        if orientation != self._orientation:
+            self._matrix = self.matrix(*orientation)
+            self._orientation = orientation
+        with stage('rotate') as st:
+            new = self._matrix.T.astype(block.dtype, copy=False)
+            np.matmul(block, new, out=out)
+            if previous is not None and previous is not self._matrix and len(block):
+                n = len(block) if self.crossfade is None else min(self.crossfade, len(block))
+                if n:
+                    # out = old + ramp * (new - old) over the first n frames
+                    old = np.matmul(block[:n], previous.T.astype(block.dtype, copy=False))
+                    faded = out[:n]
+                    faded -= old
+                    faded *= self._ramp(n, block.dtype)
+                    faded += old
+            st.add(len(block), block.nbytes)
+        return out
+
+
+def _orientation_rows(orientations, blocks):
+    """Array of one (yaw, pitch, roll) row per block, the last one is held"""
+    orientations = np.asarray(orientations, dtype=float)
+    if orientations.ndim == 1:
+        orientations = orientations[None]
+    if orientations.ndim != 2 or orientations.shape[1] != 3 or not len(orientations):
+        raise ValueError("orientations must be (yaw, pitch, roll) or a sequence of those")
+    if len(orientations) < blocks:
+        held = np.repeat(orientations[-1:], blocks - len(orientations), axis=0)
+        orientations = np.concatenate((orientations, held))
+    return orientations
+
+
+@staged('ambisonics_rotate')
+def ambisonics_rotate(signal_array, order, orientations, ordering='acn',
+                      normalization='sn3d', blocksize=1024, crossfade=None,
+                      resolution=ROTATION_RESOLUTION, out=None):
+    """
+    Rotate an ambisonics signal with a fixed or time-varying orientation.
+
+    signal_array - array of shape (frames, channels)
+    order - order of the ambisonics signals, full sphere representation is assumed
+    orientations - (yaw, pitch, roll) in degrees for a fixed rotation, or a
+                   sequence of those with one orientation per block (the last one
+                   is held if there are fewer orientations than blocks)
+    ordering - channel ordering ['acn', 'sid', 'fuma']
+    normalization - normalization ['sn3d', 'n3d', 'maxn', 'fuma']
+    blocksize - number of frames per orientation
+    crossfade - number of frames the change of orientation is faded over at the
+                start of a block, default: None (the whole block)
+    resolution - quantization of the angles in degrees, see AmbisonicsRotator
+    out - output array of the same shape, a new array is allocated if not given
+
+    returns:
+        the rotated signals (`out` if given), integer signals are returned as float64
+    """
+    rotator = AmbisonicsRotator(order, ordering, normalization, crossfade, resolution)
+    signal_array = np.asarray(signal_array)
+    if signal_array.ndim != 2 or signal_array.shape[1] != rotator.channels:
+        raise ValueError("Order %d needs an array with %d channels" % (order, rotator.channels))
+    if out is None:
+        floating = np.issubdtype(signal_array.dtype, np.floating)
+        out = np.empty(signal_array.shape, dtype=signal_array.dtype if floating else np.float64)
+    elif out.shape != signal_array.shape:
+        raise ValueError("Output array has shape %s, expected %s" %
+                         (out.shape, signal_array.shape))
+    starts = range(0, len(signal_array), blocksize)
+    for start, angles in zip(starts, _orientation_rows(orientations, len(starts))):
+        stop = start + blocksize
+        block = signal_array[start:stop].astype(out.dtype, copy=False)
+        rotator.process(block, *angles, out=out[start:stop])
+    return out
+
+
+@staged('ambisonics_rotate_file')
+def ambisonics_rotate_file(filename, new_filename, order, orientations, ordering='acn',
+                           normalization='sn3d', blocksize=1024, crossfade=None,
+                           resolution=ROTATION_RESOLUTION, mmap=False, dtype='float32',
+                           subtype=None):
+    """
+    Rotate an ambisonics wav file block by block into a new file, see
+    `ambisonics_rotate` for the rotation parameters.
+
+    blocksize - number of frames read, rotated and written at once (one
+                orientation per block)
+    mmap - if true, the input is memory mapped instead of decoded (see memmap_wav)
+    dtype - dtype the samples are rotated in ['float32', 'float64'], default: 'float32'
+    subtype - soundfile subtype of the new file, default: the subtype of the input
+    """
+    if np.dtype(dtype) not in (np.float32, np.float64):
+        raise ValueError("Rotation needs float32 or float64 samples, not %s" % dtype)
+    rotator = AmbisonicsRotator(order, ordering, normalization, crossfade, resolution)
+    with BlockReader(filename, blocksize, mmap, 'native' if mmap else dtype) as f:
+        if f.channels != rotator.channels:
+            raise ValueError("Order %d needs a file with %d channels" % (order, rotator.channels))
+        starts = range(0, f.frames, blocksize)
+        buffer = np.empty((blocksize, f.channels), dtype=dtype)
+        with _open_output(new_filename, f.samplerate, f.channels, subtype, f.subtype) as out:
+            for _, angles in zip(starts, _orientation_rows(orientations, len(starts))):
+                block = f.read(blocksize)
+                # memory mapped samples come in the dtype of the file
+                if block.dtype != buffer.dtype:
+                    block = _as_float(block).astype(buffer.dtype, copy=False)
+                rotated = rotator.process(block, *angles, out=buffer[:len(block)])
+                with stage('write') as st:
+                    out.write(_writable(rotated))
+                    st.add(len(rotated), rotated.nbytes)
@@ -2,19 +2,365 @@
 Module for generating commonly used signals for testing or stuff.
 """
 
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
-__all__ = ['white_noise']
+from .filters import IIRFilter
+
+__all__ = ['white_noise', 'white_noise_blocks',
+           'pink_noise', 'pink_noise_blocks',
+           'brown_noise', 'brown_noise_blocks',
+           'exponential_sweep', 'exponential_sweep_blocks',
+           'mls', 'mls_blocks']
+
+
+# noise is drawn in chunks of this many frames, every chunk of every channel
+# has its own random stream derived from the seed; this makes the output
+# independent of the number of threads or the block size used to generate it
+NOISE_CHUNK = 2**18
+
+# pinking filter approximating a 1/f spectrum within 0.05 dB (J. O. Smith)
+PINK_B = [0.049922035, -0.095993537, 0.050612699, -0.004408786]
+PINK_A = [1, -2.494956002, 2.017265875, -0.522189400]
+# brown noise is leakily integrated white noise, with a 1/f^2 spectrum above this frequency
+BROWN_CUTOFF = 5.
+
+# delays of the feedback taps of maximum length shift registers: the sequence
+# follows s[n] = s[n - lags[0]] ^ s[n - lags[1]] ^ ...
+MLS_LAGS = {2: (2, 1), 3: (3, 2), 4: (4, 3), 5: (5, 3), 6: (6, 5), 7: (7, 6),
+            8: (8, 6, 5, 4), 9: (9, 5), 10: (10, 7), 11: (11, 9), 12: (12, 6, 4, 1),
+            13: (13, 4, 3, 1), 14: (14, 5, 3, 1), 15: (15, 14), 16: (16, 15, 13, 4),
+            17: (17, 14), 18: (18, 11), 19: (19, 6, 2, 1), 20: (20, 17), 21: (21, 19),
+            22: (22, 21), 23: (23, 18), 24: (24, 23, 22, 17), 25: (25, 22),
+            26: (26, 6, 2, 1), 27: (27, 5, 2, 1), 28: (28, 25), 29: (29, 27),
+            30: (30, 6, 4, 1), 31: (31, 28), 32: (32, 22, 2, 1)}
+
 
+def _seed_sequence(seed):
+    """Turn `seed` (None, int or SeedSequence) into a SeedSequence"""
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
 
-def white_noise(length_seconds, fs, amp, db=True):
+
+def _chunk_rng(seed, channel, chunk):
+    """Random generator for one chunk of one channel"""
+    child = np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + (channel, chunk))
+    return np.random.Generator(np.random.PCG64(child))
+
+
+def white_noise(length_seconds, fs, amp, db=True, channels=1, seed=None,
+                dtype=np.float64, threads=1):
     """
     Generate white noise signal
 
-    length_seconds: length of the signal in seconds
+    length_seconds: length of the signal in seconds (rounded to whole samples)
     fs: sampling frequency
     amp: maximum amplitude (next argument specifies db or lin)
     db: if true, amp is interpreted as decibels, otherwise as linear factor
+    channels: number of independent channels, for more than one channel an array
+              of shape (frames, channels) is returned
+    seed: seed for the random generator (int or numpy.random.SeedSequence), the
+          same seed always gives the same signal
+    dtype: float32 or float64
+    threads: number of threads used to fill the buffer
+    """
+    amp = 10 ** (amp / 20) if db else amp
+    dtype = np.dtype(dtype)
+    seed = _seed_sequence(seed)
+    frames = int(round(length_seconds * fs))
+    # channels are generated planar, so that every chunk is contiguous
+    noise = np.empty((channels, frames), dtype=dtype)
+
+    def fill(task):
+        c, k = task
+        chunk = noise[c, k * NOISE_CHUNK:(k + 1) * NOISE_CHUNK]
+        _chunk_rng(seed, c, k).random(out=chunk, dtype=dtype)
+        chunk -= 0.5
+        chunk *= 2 * amp
+
+    tasks = [(c, k) for c in range(channels) for k in range(-(-frames // NOISE_CHUNK))]
+    if threads > 1:
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(fill, tasks))
+    else:
+        for task in tasks:
+            fill(task)
+    return noise[0] if channels == 1 else noise.T
+
+
+class _NoiseSource(object):
+    """
+    Stateful source of uniform or normal distributed noise, read(n) returns the
+    next n frames as array of shape (channels, n)
+    """
+
+    def __init__(self, seed, channels, dtype, normal=False):
+        self._seed = _seed_sequence(seed)
+        self._channels = channels
+        self._dtype = np.dtype(dtype)
+        self._normal = normal
+        self._rngs = [None] * channels
+        self._pos = 0
+
+    def read(self, n):
+        block = np.empty((self._channels, n), dtype=self._dtype)
+        for c in range(self._channels):
+            done = 0
+            while done < n:
+                k, offset = divmod(self._pos + done, NOISE_CHUNK)
+                if offset == 0:
+                    self._rngs[c] = _chunk_rng(self._seed, c, k)
+                m = min(n - done, NOISE_CHUNK - offset)
+                out = block[c, done:done + m]
+                if self._normal:
+                    self._rngs[c].standard_normal(out=out, dtype=self._dtype)
+                else:
+                    self._rngs[c].random(out=out, dtype=self._dtype)
+                done += m
+        self._pos += n
+        return block
+
+
+class _FilteredNoiseSource(object):
+    """Normal distributed noise shaped by an IIR filter, scaled to an RMS of `amp`"""
+
+    def __init__(self, b, a, amp, seed, channels, dtype):
+        self._noise = _NoiseSource(seed, channels, np.float64, normal=True)
+        self._filter = IIRFilter(b, a)
+        self._gain = amp / self._filter.noise_gain()
+        self._dtype = np.dtype(dtype)
+
+    def read(self, n):
+        block = self._filter.process(self._noise.read(n))
+        block *= self._gain
+        return block.astype(self._dtype, copy=False)
+
+
+class _SweepSource(object):
+    """Exponential sine sweep, the phase is computed from the absolute sample position"""
+
+    def __init__(self, length_seconds, fs, f_start, f_stop, amp, dtype):
+        self._fs = fs
+        self._rate = np.log(f_stop / f_start) / length_seconds
+        self._phase_scale = 2 * np.pi * f_start / self._rate
+        self._amp = amp
+        self._dtype = np.dtype(dtype)
+        self._pos = 0
+
+    def read(self, n):
+        t = (self._pos + np.arange(n)) / self._fs
+        self._pos += n
+        block = np.sin(self._phase_scale * np.expm1(self._rate * t))
+        block *= self._amp
+        return block.astype(self._dtype, copy=False)[None]
+
+
+class _MLSSource(object):
+    """
+    Maximum length sequence from a linear feedback shift register.
+
+    The register is not clocked bit by bit, instead whole chunks of the sequence
+    are computed from its history at once: since the feedback polynomial p(x)
+    satisfies p(x)^(2^j) = p(x^(2^j)) over GF(2), the sequence also follows the
+    recurrence with all lags scaled by 2^j.
+    """
+
+    def __init__(self, order, amp, dtype, chunk=2**16):
+        if order not in MLS_LAGS:
+            raise ValueError("MLS order must be between %d and %d" %
+                             (min(MLS_LAGS), max(MLS_LAGS)))
+        self._lags = MLS_LAGS[order]
+        self._scale = 1
+        while min(self._lags) * self._scale * 2 <= chunk:
+            self._scale *= 2
+        # the register starts with all ones, these are the first values of the sequence
+        self._seq = np.ones(order, dtype=np.uint8)
+        self._start = 0
+        self._pos = 0
+        self._amp = amp
+        self._dtype = np.dtype(dtype)
+
+    def _extend(self):
+        length = len(self._seq)
+        scale = self._scale
+        while max(self._lags) * scale > length:
+            scale //= 2
+        n = min(self._lags) * scale
+        new = np.zeros(n, dtype=np.uint8)
+        for lag in self._lags:
+            i = length - lag * scale
+            new ^= self._seq[i:i + n]
+        self._seq = np.concatenate((self._seq, new))
+
+    def read(self, n):
+        while self._start + len(self._seq) < self._pos + n:
+            self._extend()
+        i = self._pos - self._start
+        bits = self._seq[i:i + n]
+        self._pos += n
+        # drop values that were returned and are no longer needed as history
+        drop = min(self._pos - self._start, len(self._seq) - max(self._lags) * self._scale)
+        if drop > 0:
+            self._seq = self._seq[drop:]
+            self._start += drop
+        block = (1 - 2 * bits.astype(self._dtype)) * self._dtype.type(self._amp)
+        return block[None]
+
+
+def _render(source, frames, channels):
+    """Read `frames` frames from a source at once"""
+    block = source.read(frames)
+    return block[0] if channels == 1 else block.T
+
+
+def _iter_blocks(source, frames, blocksize, channels):
+    """Read a source in blocks of `blocksize` frames, endless if `frames` is None"""
+    pos = 0
+    while frames is None or pos < frames:
+        n = blocksize if frames is None else min(blocksize, frames - pos)
+        block = source.read(n)
+        pos += n
+        yield block[0] if channels == 1 else block.T
+
+
+def _frames(length_seconds, fs):
+    return None if length_seconds is None else int(round(length_seconds * fs))
+
+
+def white_noise_blocks(length_seconds, fs, amp, blocksize, db=True, channels=1, seed=None,
+                       dtype=np.float64):
+    """
+    Generate white noise block by block, yields arrays of `blocksize` frames
+    (the last one may be shorter).
+
+    The concatenated blocks are identical to the output of white_noise with the
+    same arguments. See white_noise for the arguments, additionally:
+
+    length_seconds: may be None for an endless stream of blocks
+    blocksize: number of frames per block
+    """
+    amp = 10 ** (amp / 20) if db else amp
+    source = _NoiseSource(seed, channels, dtype)
+    for block in _iter_blocks(source, _frames(length_seconds, fs), blocksize, channels):
+        block -= 0.5
+        block *= 2 * amp
+        yield block
+
+
+def pink_noise(length_seconds, fs, amp, db=True, channels=1, seed=None, dtype=np.float64):
+    """
+    Generate pink noise (1/f power spectrum) by filtering normal distributed
+    white noise with a stateful IIR filter
+
+    length_seconds: length of the signal in seconds (rounded to whole samples)
+    fs: sampling frequency
+    amp: RMS amplitude (next argument specifies db or lin)
+    db: if true, amp is interpreted as decibels, otherwise as linear factor
+    channels: number of independent channels, for more than one channel an array
+              of shape (frames, channels) is returned
+    seed: seed for the random generator (int or numpy.random.SeedSequence)
+    dtype: float32 or float64
+    """
+    amp = 10 ** (amp / 20) if db else amp
+    source = _FilteredNoiseSource(PINK_B, PINK_A, amp, seed, channels, dtype)
+    return _render(source, _frames(length_seconds, fs), channels)
+
+
+def pink_noise_blocks(length_seconds, fs, amp, blocksize, db=True, channels=1, seed=None,
+                      dtype=np.float64):
+    """
+    Generate pink noise block by block, the filter state is carried from block
+    to block. See pink_noise for the arguments, additionally:
+
+    length_seconds: may be None for an endless stream of blocks
+    blocksize: number of frames per block
+    """
+    amp = 10 ** (amp / 20) if db else amp
+    source = _FilteredNoiseSource(PINK_B, PINK_A, amp, seed, channels, dtype)
+    return _iter_blocks(source, _frames(length_seconds, fs), blocksize, channels)
+
+
+def _brown_coefficients(fs):
+    return [1.], [1., -np.exp(-2 * np.pi * BROWN_CUTOFF / fs)]
+
+
+def brown_noise(length_seconds, fs, amp, db=True, channels=1, seed=None, dtype=np.float64):
+    """
+    Generate brown noise (1/f^2 power spectrum) by leaky integration of normal
+    distributed white noise, see pink_noise for the arguments
+    """
+    amp = 10 ** (amp / 20) if db else amp
+    b, a = _brown_coefficients(fs)
+    source = _FilteredNoiseSource(b, a, amp, seed, channels, dtype)
+    return _render(source, _frames(length_seconds, fs), channels)
+
+
+def brown_noise_blocks(length_seconds, fs, amp, blocksize, db=True, channels=1, seed=None,
+                       dtype=np.float64):
+    """
+    Generate brown noise block by block, see pink_noise_blocks for the arguments
+    """
+    amp = 10 ** (amp / 20) if db else amp
+    b, a = _brown_coefficients(fs)
+    source = _FilteredNoiseSource(b, a, amp, seed, channels, dtype)
+    return _iter_blocks(source, _frames(length_seconds, fs), blocksize, channels)
+
+
+def exponential_sweep(length_seconds, fs, f_start, f_stop, amp, db=True, dtype=np.float64):
+    """
+    Generate an exponential sine sweep
+
+    length_seconds: length of the sweep in seconds (rounded to whole samples)
+    fs: sampling frequency
+    f_start: start frequency in Hz
+    f_stop: stop frequency in Hz
+    amp: maximum amplitude (next argument specifies db or lin)
+    db: if true, amp is interpreted as decibels, otherwise as linear factor
+    dtype: float32 or float64
+    """
+    amp = 10 ** (amp / 20) if db else amp
+    source = _SweepSource(length_seconds, fs, f_start, f_stop, amp, dtype)
+    return _render(source, _frames(length_seconds, fs), 1)
+
+
+def exponential_sweep_blocks(length_seconds, fs, f_start, f_stop, amp, blocksize, db=True,
+                             dtype=np.float64):
+    """
+    Generate an exponential sine sweep block by block, see exponential_sweep
+    for the arguments, additionally:
+
+    blocksize: number of frames per block
+    """
+    amp = 10 ** (amp / 20) if db else amp
+    source = _SweepSource(length_seconds, fs, f_start, f_stop, amp, dtype)
+    return _iter_blocks(source, _frames(length_seconds, fs), blocksize, 1)
+
+
+def mls(order, amp, db=True, length=None, dtype=np.float64):
+    """
+    Generate a maximum length sequence with values -amp and amp
+
+    order: order of the shift register (2 ... 32), the period is 2**order - 1 samples
+    amp: amplitude (next argument specifies db or lin)
+    db: if true, amp is interpreted as decibels, otherwise as linear factor
+    length: number of samples, the sequence is repeated periodically
+            (default: one period)
+    dtype: float32 or float64
+    """
+    amp = 10 ** (amp / 20) if db else amp
+    length = 2**order - 1 if length is None else length
+    return _render(_MLSSource(order, amp, dtype), length, 1)
+
+
+def mls_blocks(order, amp, blocksize, db=True, length=None, dtype=np.float64):
+    """
+    Generate a maximum length sequence block by block, see mls for the
+    arguments, additionally:
+
+    blocksize: number of samples per block
+    length: number of samples, may be None for an endless stream of blocks
     """
     amp = 10 ** (amp / 20) if db else amp
-    return (np.random.rand(length_seconds * fs) - 0.5) * amp * 2
+    return _iter_blocks(_MLSSource(order, amp, dtype), length, blocksize, 1)
@@ -5,12 +5,18 @@ messing with audio files
 
 import numpy as np
 import soundfile as sf
-import itertools
 from collections import OrderedDict
+from contextlib import ExitStack
+
+from ..instrument import stage, staged
+from .ambisonics import ambisonics_convert, _ambisonics_channel_count_from_order
+from .blockio import (BlockReader, ReadAhead, _common_subtype, _native_dtype, _open_output,
+                      _writable)
 
 __all__ = ['ambisonics_reorder_channels',
            'extract_channels_from_wav',
-           'monofiles_to_multitrack']
+           'monofiles_to_multitrack',
+           'multitrack_to_monofiles']
 
 
 FUMA = OrderedDict(enumerate(['w',
@@ -24,49 +30,252 @@ ACN = OrderedDict(enumerate(['w',
 AMBISONICS_ORDERINGS = {'fuma': FUMA, 'acn': ACN}
 
 
-def _ambisonics_channel_count_from_order(order, three_dim=True):
-    """
-    Helper function that computes the number of channels for a given ambisonics order.
-    """
-    return (order + 1)**2 if three_dim else (2 * order + 1)
-
-
-def ambisonics_reorder_channels(signal_array, order, input_ordering, output_ordering):
+def ambisonics_reorder_channels(signal_array, order, input_ordering, output_ordering, out=None):
     """
     Reorder ambisonics signals from one channel ordering to another.
 
-    signal_array - Array with the signals as given by soundfile.read from a wav file
+    The orderings are computed for any order and cached, see ambisonics_convert
+    for conversions that also change the normalization.
+
+    signal_array - Array with the signals as given by soundfile.read or memmap_wav,
+                   its dtype is kept (integer samples are only moved, not converted)
     order - order of the ambisonics signals, full sphere representation is assumed
-    input_ordering - name of channel ordering of the array ['fuma', 'acn']
-    output_ordering - desired output ordering ['fuma', 'acn']
+    input_ordering - name of channel ordering of the array ['fuma', 'acn', 'sid']
+    output_ordering - desired output ordering ['fuma', 'acn', 'sid']
+    out - optional output array of the same shape, may be `signal_array` itself
     """
-    channel_count = _ambisonics_channel_count_from_order(order)
-    assert(signal_array.shape[1] == channel_count)
-    input_ordering = OrderedDict(itertools.islice(AMBISONICS_ORDERINGS[input_ordering].items(), channel_count))
-    output_ordering = OrderedDict(itertools.islice(AMBISONICS_ORDERINGS[output_ordering].items(), channel_count))
-    input_ordering = {v: k for k, v in input_ordering.items()}
-    new_order = [input_ordering[output_ordering[i]] for i in output_ordering.keys()]
+    return ambisonics_convert(signal_array, order, input_ordering, output_ordering, out=out)
+
 
-    return signal_array[:, new_order]
+@staged('extract_channels_from_wav')
+def extract_channels_from_wav(filename, channels, write_file=None, start=None, stop=None,
+                              blocksize=65536, return_signal=True, mmap=False, dtype=None,
+                              subtype=None):
+    """
+    Read wav file and extract only the specified channel numbers
 
+    The file is read block by block and only the requested channels are kept,
+    so the full multichannel signal is never held in memory.
 
-def extract_channels_from_wav(filename, channels, write_file=None):
-    """Read wav file and extract only the specified channel numbers"""
-    s, fs = sf.read(filename)
-    if type(channels) == int:
+    filename - name of the file to read
+    channels - channel number or sequence of channel numbers to extract
+    write_file - if given, the extracted channels are written to this file
+    start - start time in seconds, the file is seeked to this position (default: 0)
+    stop - stop time in seconds (default: end of file)
+    blocksize - number of frames read per block
+    return_signal - if false, the extracted signal is not collected and None is
+                    returned, use this together with `write_file` to extract
+                    channels in constant memory
+    mmap - if true, the file is memory mapped instead of decoded (see memmap_wav),
+           the returned signal then keeps the native dtype of the file
+    dtype - dtype the file is decoded to ['native', 'float64', 'float32', 'int32', 'int16'],
+            default: 'float64' if the signal is returned, otherwise 'native'
+            (the samples are only routed to `write_file` without conversion)
+    subtype - soundfile subtype of `write_file`, default: the subtype of the input
+    """
+    if dtype is None:
+        dtype = 'float64' if return_signal else 'native'
+    if isinstance(channels, int):
         channels = [channels]
-    s = s[:, channels]
-    if write_file is not None:
-        sf.write(write_file, s, fs)
+    channels = list(channels)
+
+    with ExitStack() as stack:
+        f = stack.enter_context(BlockReader(filename, blocksize, mmap, dtype))
+        fs = f.samplerate
+        first = 0 if start is None else int(round(start * fs))
+        last = f.frames if stop is None else min(int(round(stop * fs)), f.frames)
+        if not 0 <= first <= last:
+            raise ValueError("Invalid time range: start=%s, stop=%s" % (start, stop))
+        total = last - first
+        f.seek(first)
+
+        out = None
+        if write_file is not None:
+            out = stack.enter_context(_open_output(write_file, fs, len(channels), subtype,
+                                                   f.subtype))
+        s = np.empty((total, len(channels)), dtype=f.dtype) if return_signal else None
+        pos = 0
+        while pos < total:
+            read = f.read(min(blocksize, total - pos))
+            n = len(read)
+            if n == 0:
+                break
+            with stage('select') as st:
+                selected = read[:, channels]
+                st.add(n, selected.nbytes)
+            if out is not None:
+                with stage('write') as st:
+                    out.write(_writable(selected))
+                    st.add(n, selected.nbytes)
+            if s is not None:
+                s[pos:pos + n] = selected
+            pos += n
+    if s is not None and pos < total:
+        s = s[:pos]
     return s
 
 
-def monofiles_to_multitrack(monofiles, new_filename):
-    """Read mono wav files and combine them into a multitrack wavfile"""
-    # TODO: this causes MemoryError when signals are very long
-    signals = []
-    for f in monofiles:
-        s, fs = sf.read(f)
-        signals.append(s)
-    multitrack_array = np.asarray(signals).T
-    sf.write(new_filename, multitrack_array, fs)
+@staged('monofiles_to_multitrack')
+def monofiles_to_multitrack(monofiles, new_filename, blocksize=65536, length='longest',
+                            mmap=False, dtype='native', subtype=None, io_threads=None,
+                            read_ahead=2):
+    """
+    Read mono wav files and combine them into a multitrack wavfile
+
+    The files are streamed block by block, so memory use is bounded by
+    `blocksize` times the number of files (and `read_ahead`) regardless of
+    signal length. The inputs are decoded concurrently on a thread pool that
+    reads ahead while the current block is written.
+
+    monofiles - sequence of filenames of mono files, one per output channel
+    new_filename - name of the multitrack file to write
+    blocksize - number of frames read from every input file per block
+    length - how to handle inputs of different lengths ['longest', 'shortest']
+             'longest' pads the shorter signals with zeros, 'shortest' truncates
+             all signals to the length of the shortest one
+    mmap - if true, the inputs are memory mapped instead of decoded (see memmap_wav),
+           all inputs must then share the same sample format
+    dtype - dtype the files are decoded to ['native', 'float64', 'float32', 'int32',
+            'int16'], 'native' uses the smallest dtype that holds the samples of all
+            inputs, so merging files of the same format needs no conversion
+    subtype - soundfile subtype of the new file, default: the subtype of the inputs,
+              for inputs of different formats the smallest one that holds all of them
+              (e.g. PCM_24 for PCM_16 and PCM_24 inputs)
+    io_threads - number of threads reading the inputs, default: one per input (at
+                 most 16), 0 reads all inputs one after another in the calling thread
+    read_ahead - number of blocks per input that are read in advance (including
+                 the current one), default: 2 (double buffering)
+    """
+    if length not in ('longest', 'shortest'):
+        raise ValueError('unknown value for `length`: %s' % length)
+    monofiles = list(monofiles)
+    if len(monofiles) == 0:
+        raise ValueError("Need at least one file to create a multitrack file")
+
+    with ExitStack() as stack:
+        if dtype == 'native' and not mmap:
+            dtype = _common_native_dtype(monofiles)
+        inputs = [stack.enter_context(BlockReader(f, blocksize, mmap, dtype))
+                  for f in monofiles]
+        fs = inputs[0].samplerate
+        for f in inputs:
+            if f.channels != 1:
+                raise ValueError("%s is not a mono file" % f.name)
+            if f.samplerate != fs:
+                raise ValueError("Sample rate of %s (%d) differs from %d" %
+                                 (f.name, f.samplerate, fs))
+        if len(set(f.dtype for f in inputs)) > 1:
+            raise ValueError("Can not combine memory mapped files of different sample formats")
+        source_subtype = _common_subtype(f.subtype for f in inputs)
+        if subtype is None and source_subtype is None:
+            raise ValueError("The inputs have different subtypes (%s), pass `subtype`"
+                             % ', '.join(sorted(set(f.subtype for f in inputs))))
+        frame_counts = [f.frames for f in inputs]
+        total = max(frame_counts) if length == 'longest' else min(frame_counts)
+
+        out = stack.enter_context(_open_output(new_filename, fs, len(inputs), subtype,
+                                               source_subtype))
+        # buffers are allocated once and reused for every block
+        block = np.zeros((blocksize, len(inputs)), dtype=inputs[0].dtype)
+        pos = 0
+        for step in ReadAhead(inputs, blocksize, total, io_threads, read_ahead):
+            n = min(blocksize, total - pos)
+            with stage('interleave') as st:
+                for i, read in enumerate(step):
+                    block[:len(read), i] = read[:, 0]
+                    # zero padding for inputs that ran out of samples
+                    block[len(read):n, i] = 0
+                st.add(n, block[:n].nbytes)
+            with stage('write') as st:
+                out.write(_writable(block[:n]))
+                st.add(n, block[:n].nbytes)
+            pos += n
+
+
+def _common_native_dtype(filenames):
+    """Smallest dtype that holds the samples of all files without loss"""
+    dtypes = set(_native_dtype(sf.info(f).subtype) for f in filenames)
+    if len(dtypes) == 1:
+        return dtypes.pop()
+    if all(d.kind == 'i' for d in dtypes):
+        return np.dtype('int32')
+    return np.dtype('float64')
+
+
+def _split_outputs(outputs, channels, n_channels):
+    """Return the (channel, filename) pairs for multitrack_to_monofiles"""
+    if isinstance(outputs, str):
+        if channels is None:
+            channels = range(n_channels)
+        pairs = [(c, outputs % c) for c in channels]
+    elif isinstance(outputs, dict):
+        if channels is not None:
+            raise ValueError("`channels` can not be used together with a mapping")
+        pairs = sorted(outputs.items())
+    else:
+        outputs = list(outputs)
+        if channels is None:
+            channels = range(len(outputs))
+        channels = list(channels)
+        if len(channels) != len(outputs):
+            raise ValueError("Need one output file per channel, got %d files for %d channels"
+                             % (len(outputs), len(channels)))
+        pairs = list(zip(channels, outputs))
+    if len(pairs) == 0:
+        raise ValueError("Need at least one channel to split")
+    for c, _ in pairs:
+        if not 0 <= c < n_channels:
+            raise ValueError("Channel %d does not exist, the file has %d channels"
+                             % (c, n_channels))
+    return pairs
+
+
+@staged('multitrack_to_monofiles')
+def multitrack_to_monofiles(filename, outputs, channels=None, blocksize=65536,
+                            dtype='native', subtype=None, mmap=False):
+    """
+    Split a multitrack wav file into mono files (inverse of monofiles_to_multitrack)
+
+    The file is read only once, block by block, and every block is distributed
+    to all output files, so splitting costs a single pass over the input
+    regardless of the number of channels.
+
+    filename - name of the multitrack file to read
+    outputs - where to write the channels, one of
+              - a mapping of channel numbers to filenames
+              - a sequence of filenames, one for every entry of `channels`
+              - a filename pattern with a '%d' for the channel number, e.g. 'ch%02d.wav'
+    channels - channel numbers to write, default: all channels (or the first
+               len(outputs) channels for a sequence of filenames)
+    blocksize - number of frames read per block
+    dtype - dtype the file is decoded to ['native', 'float64', 'float32', 'int32',
+            'int16'], 'native' routes the samples without conversion to float
+    subtype - soundfile subtype of the output files (e.g. 'PCM_24', 'FLOAT'),
+              default: the subtype of the input
+    mmap - if true, the file is memory mapped instead of decoded (see memmap_wav),
+           `dtype` is then ignored and the samples keep their native dtype
+
+    returns:
+        list of the (channel, filename) pairs that were written
+    """
+    with ExitStack() as stack:
+        f = stack.enter_context(BlockReader(filename, blocksize, mmap, dtype))
+        pairs = _split_outputs(outputs, channels, f.channels)
+        outs = [stack.enter_context(_open_output(name, f.samplerate, 1, subtype, f.subtype))
+                for _, name in pairs]
+        selected = [c for c, _ in pairs]
+        # channels are gathered into contiguous rows once per block
+        planar = np.empty((len(pairs), blocksize), dtype=f.dtype)
+        for _ in range(0, f.frames, blocksize):
+            read = f.read(blocksize)
+            n = len(read)
+            if n == 0:
+                break
+            with stage('select') as st:
+                np.take(read, selected, axis=1, out=planar[:, :n].T)
+                st.add(n, planar[:, :n].nbytes)
+            with stage('write') as st:
+                for out, row in zip(outs, planar[:, :n]):
+                    out.write(_writable(row))
+                st.add(n, planar[:, :n].nbytes)
+    return pairs
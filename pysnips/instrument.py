@@ -0,0 +1,320 @@
+"""
+Opt-in instrumentation of the pysnips hot paths
+
+The audio helpers and plotting functions are divided into stages (read,
+select, reorder, write, setup, artists, draw, ...) that report their duration,
+the frames and bytes they handled and optionally their peak allocation to
+pluggable sinks. As long as no sink is installed a stage costs a single check,
+so the instrumentation can stay in place under load.
+
+Instrumentation is enabled with a context manager
+
+    with instrumented(Aggregator()) as aggregator:
+        monofiles_to_multitrack(files, 'multi.wav')
+    print(aggregator.report())
+
+or for a whole program via the environment variable PYSNIPS_INSTRUMENT: '1'
+prints a summary to stderr at exit, any other value is the name of a JSON
+lines file the records are appended to. PYSNIPS_INSTRUMENT_MEMORY=1
+additionally records the peak allocation of every stage (with tracemalloc,
+which slows everything down noticeably).
+
+Sinks are callables that get one record (a dict) per finished stage:
+    stage - names of the enclosing stages and the stage, joined by '/' (the
+            read-ahead threads of the audio helpers report under the stages
+            of the thread that started the read)
+    start - wall clock time the stage started at
+    seconds - duration of the stage
+    thread - name of the thread that ran the stage
+    frames, bytes - counts added by the stage, if any
+    peak_bytes - peak allocation during the stage above its start, if recorded
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+__all__ = ['instrumented', 'enable', 'disable', 'enabled', 'stage', 'staged', 'Aggregator',
+           'JSONLinesSink']
+
+
+_sinks = []
+_memory = False
+# whether tracemalloc was started by `enable` (and is stopped again by `disable`)
+_started_tracing = False
+_local = threading.local()
+
+
+class _NullStage(object):
+    """Stage used while instrumentation is disabled, does nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def add(self, frames=0, bytes=0):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.bytes = 0
+
+    def add(self, frames=0, bytes=0):
+        """Count frames and bytes handled by this stage"""
+        self.frames += frames
+        self.bytes += bytes
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.path = '/'.join([s.name for s in stack] + [self.name])
+        self._parent = stack[-1] if stack else None
+        stack.append(self)
+        self._memory = _memory and tracemalloc.is_tracing()
+        if self._memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._parent is not None and self._parent._memory:
+                self._parent._peak = max(self._parent._peak, peak)
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+                peak = current
+            self._start_memory = current
+            self._peak = peak
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        seconds = time.perf_counter() - self._t0
+        _local.stack.pop()
+        record = {'stage': self.path, 'start': self.start, 'seconds': seconds,
+                  'thread': threading.current_thread().name}
+        if self.frames:
+            record['frames'] = self.frames
+        if self.bytes:
+            record['bytes'] = self.bytes
+        if self._memory:
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            record['peak_bytes'] = max(self._peak - self._start_memory, 0)
+            if self._parent is not None and self._parent._memory:
+                self._parent._peak = max(self._parent._peak, self._peak)
+        for sink in list(_sinks):
+            sink(record)
+        return False
+
+
+def enabled():
+    """Whether any sink is installed, to skip work that is only done for the records"""
+    return bool(_sinks)
+
+
+def stage(name):
+    """
+    Context manager timing the stage `name`, use its `add(frames, bytes)` to
+    count the data handled. Costs nothing but a check while disabled.
+    """
+    if not _sinks:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def staged(name):
+    """Decorator that runs every call of the function as stage `name`"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _sinks:
+                return function(*args, **kwargs)
+            with _Stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _current_stack():
+    """The stages enclosing the calling thread, to run work of other threads under them"""
+    return list(getattr(_local, 'stack', None) or ())
+
+
+def _run_in_stack(stack, function, *args):
+    """Call `function(*args)` with `stack` (from _current_stack) as the enclosing stages"""
+    previous = getattr(_local, 'stack', None)
+    _local.stack = list(stack)
+    try:
+        return function(*args)
+    finally:
+        _local.stack = previous
+
+
+def enable(*sinks, **kwargs):
+    """
+    Install `sinks` (callables that receive the records of finished stages)
+
+    memory - keyword argument, if true the peak allocation of every stage is
+             recorded as well (starts tracemalloc), default: False
+    """
+    global _memory, _started_tracing
+    memory = kwargs.pop('memory', False)
+    if kwargs:
+        raise TypeError("Unexpected keyword arguments: %s" % ', '.join(sorted(kwargs)))
+    if not sinks:
+        raise ValueError("Need at least one sink")
+    if memory:
+        _memory = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+    _sinks.extend(sinks)
+
+
+def disable(*sinks):
+    """Remove `sinks` (all sinks if none are given), stops recording memory with the last one"""
+    global _memory, _started_tracing
+    if sinks:
+        for sink in sinks:
+            _sinks.remove(sink)
+    else:
+        del _sinks[:]
+    if not _sinks and _memory:
+        _memory = False
+        if _started_tracing:
+            _started_tracing = False
+            tracemalloc.stop()
+
+
+class instrumented(object):
+    """
+    Context manager that enables instrumentation with `sinks` for its body,
+    returns the first sink.
+
+    sinks - callables receiving the records, default: a new Aggregator
+    memory - keyword argument, record peak allocations as well, default: False
+    """
+
+    def __init__(self, *sinks, **kwargs):
+        self.sinks = sinks or (Aggregator(),)
+        self.memory = kwargs.pop('memory', False)
+        if kwargs:
+            raise TypeError("Unexpected keyword arguments: %s" % ', '.join(sorted(kwargs)))
+
+    def __enter__(self):
+        enable(*self.sinks, memory=self.memory)
+        return self.sinks[0]
+
+    def __exit__(self, *args):
+        disable(*self.sinks)
+        for sink in self.sinks:
+            if hasattr(sink, 'flush'):
+                sink.flush()
+        return False
+
+
+class Aggregator(object):
+    """
+    In-memory sink that sums up the records per stage, thread-safe.
+
+    summary() returns for every stage the number of calls, the total and
+    maximum seconds, the frames and bytes and the largest peak allocation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def __call__(self, record):
+        with self._lock:
+            s = self._stages.get(record['stage'])
+            if s is None:
+                s = self._stages[record['stage']] = {'calls': 0, 'seconds': 0.,
+                                                     'max_seconds': 0., 'frames': 0,
+                                                     'bytes': 0, 'peak_bytes': 0}
+            s['calls'] += 1
+            s['seconds'] += record['seconds']
+            s['max_seconds'] = max(s['max_seconds'], record['seconds'])
+            s['frames'] += record.get('frames', 0)
+            s['bytes'] += record.get('bytes', 0)
+            s['peak_bytes'] = max(s['peak_bytes'], record.get('peak_bytes', 0))
+
+    def summary(self):
+        with self._lock:
+            return {name: dict(s) for name, s in self._stages.items()}
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+
+    def report(self):
+        """Table of all stages, sorted by name (so nested stages follow their parents)"""
+        lines = ['%-50s %8s %12s %12s %10s %12s' %
+                 ('stage', 'calls', 'total [ms]', 'max [ms]', 'MB/s', 'peak [MB]')]
+        for name, s in sorted(self.summary().items()):
+            rate = s['bytes'] / s['seconds'] / 1e6 if s['bytes'] and s['seconds'] else 0.
+            lines.append('%-50s %8d %12.2f %12.2f %10.1f %12.2f' %
+                         (name, s['calls'], s['seconds'] * 1e3, s['max_seconds'] * 1e3,
+                          rate, s['peak_bytes'] / 2**20))
+        return '\n'.join(lines)
+
+
+class JSONLinesSink(object):
+    """
+    Sink writing every record as one line of JSON, thread-safe.
+
+    file - name of the file to append to or an open text file
+    """
+
+    def __init__(self, file):
+        self._lock = threading.Lock()
+        if isinstance(file, str):
+            self._file = open(file, 'a')
+            self._own = True
+        else:
+            self._file = file
+            self._own = False
+
+    def __call__(self, record):
+        line = json.dumps(record) + '\n'
+        with self._lock:
+            self._file.write(line)
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._own:
+                self._file.close()
+            else:
+                self._file.flush()
+
+
+def _enable_from_environment():
+    setting = os.environ.get('PYSNIPS_INSTRUMENT', '')
+    if setting in ('', '0'):
+        return
+    memory = os.environ.get('PYSNIPS_INSTRUMENT_MEMORY', '') not in ('', '0')
+    if setting == '1':
+        sink = Aggregator()
+        atexit.register(lambda: print(sink.report(), file=sys.stderr))
+    else:
+        sink = JSONLinesSink(setting)
+        atexit.register(sink.close)
+    enable(sink, memory=memory)
+
+
+_enable_from_environment()
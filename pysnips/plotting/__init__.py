@@ -1,2 +1,28 @@
-from .radar_chart import plot_radar_chart
-from .semantic_differential import plot_sem_diff
+import importlib
+
+# public functions and the submodules defining them, imported on first access
+# so that matplotlib is only loaded when something is plotted
+_LAZY = {'plot_radar_chart': 'radar_chart',
+         'plot_sem_diff': 'semantic_differential',
+         'SemDiffSummary': 'semantic_differential',
+         'render_radar_charts': 'batch',
+         'RadarChart': 'live',
+         'SemDiffChart': 'live',
+         'RenderCache': 'cache',
+         'radar_chart_svg': 'svg',
+         'sem_diff_svg': 'svg'}
+_SUBMODULES = set(_LAZY.values())
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(attr):
+    if attr in _LAZY:
+        return getattr(importlib.import_module('.' + _LAZY[attr], __name__), attr)
+    if attr in _SUBMODULES:
+        return importlib.import_module('.' + attr, __name__)
+    raise AttributeError("module %r has no attribute %r" % (__name__, attr))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
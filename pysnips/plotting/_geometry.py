@@ -0,0 +1,68 @@
+"""
+Geometry of the charts that does not depend on matplotlib, shared by the
+matplotlib and the svg renderers
+"""
+
+import numpy as np
+
+# with alpha='density' every line gets an alpha of DENSITY_LINES / rows (so about
+# this many overlaid lines are needed for full opacity)
+DENSITY_LINES = 10
+
+
+def _handle_input_data(data):
+    """Helper function for input data validation and calculating helper values"""
+    data = np.asarray(data)
+    if np.ndim(data) == 1:
+        d_rows = 1
+        d_cols = len(data)
+        data = data.reshape((1, data.shape[0]))
+    elif np.ndim(data) == 2:
+        d_rows = data.shape[0]
+        d_cols = data.shape[1]
+    else:
+        raise ValueError("Incorrect dimensionality of data. Must be <= 2")
+    return data, d_rows, d_cols
+
+
+def _unit_poly_verts(theta):
+    """Return vertices of polygon for subplot axes as array of shape (len(theta), 2).
+
+    This polygon is circumscribed by a unit circle centered at (0.5, 0.5)
+    """
+    x0, y0, r = [0.5] * 3
+    theta = np.asarray(theta)
+    return np.column_stack((r*np.cos(theta) + x0, r*np.sin(theta) + y0))
+
+
+def _theta(num_vars):
+    """Return array of theta values.
+    Values are evenly spaced and corrected for radar plotting
+    """
+    theta = np.linspace(0, 2*np.pi, num_vars, endpoint=False)
+    # rotate theta such that the first axis is at the top
+    theta += np.pi/2
+    return theta
+
+
+def _radar_rmax(top, num_vars, frame, round_up=False):
+    """
+    Upper limit of the radial axis for data up to `top`. For a polygon frame
+    the limit is chosen such that a circle with radius `top` fits completely
+    inside the polygon (the distance from the center to the midpoint of an
+    edge is `top`), `round_up` rounds it up to the next integer.
+    """
+    if frame == 'circle':
+        return top
+    elif frame == 'polygon':
+        angle_of_slice = 2 * np.pi / num_vars
+        r = top / np.cos(angle_of_slice / 2.)
+        if round_up:
+            r = np.ceil(r)
+        return r
+    raise ValueError('unknown value for `frame`: %s' % frame)
+
+
+def _density_alpha(rows):
+    """Alpha of the lines of a chart with `rows` rows for alpha='density'"""
+    return min(1., max(DENSITY_LINES / rows, 1 / 255.))
@@ -0,0 +1,144 @@
+"""
+Headless rendering of many charts across a process pool
+
+Charts are drawn on an Agg canvas without pyplot, so no global figure state is
+involved. Every worker process reuses a single figure that is cleared after
+each chart, which keeps memory flat over tens of thousands of charts.
+"""
+
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from ..instrument import stage, staged
+from .radar_chart import _draw_radar_chart, _handle_input_data, _radar_axes_class
+
+__all__ = ['render_radar_charts']
+
+
+# options of a job that are passed on to the drawing of the chart
+RADAR_OPTIONS = ('title', 'r_ticks', 'r_tick_labels', 'colours', 'collection', 'fill',
+                 'alpha')
+
+# the figure reused by all jobs of a process
+_figure = None
+# the render cache of a worker process, set by _init_worker
+_cache = None
+
+
+def _init_worker(cache):
+    """Keep the cache for all jobs of the worker, instead of one copy per task"""
+    global _cache
+    _cache = cache
+
+
+def _get_figure(figsize, dpi):
+    """Return the (cleared) figure of this process, adjusted to the given size"""
+    global _figure
+    if _figure is None:
+        _figure = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(_figure)
+    else:
+        if figsize is not None:
+            _figure.set_size_inches(figsize)
+        if dpi is not None:
+            _figure.set_dpi(dpi)
+    return _figure
+
+
+@staged('render_radar_chart')
+def _render_radar_job(args):
+    """
+    Render one job, returns the output path or the rendered bytes and whether
+    it was taken from the cache (None without cache)
+    """
+    index, job, output_dir, fmt, figsize, dpi, cache = args
+    if cache is None:
+        cache = _cache
+    data, line_labels, var_labels = job[:3]
+    options = dict(job[3]) if len(job) > 3 else {}
+    filename = options.pop('filename', 'radar_%05d.%s' % (index, fmt))
+    frame = options.pop('frame', 'polygon')
+    unknown = set(options) - set(RADAR_OPTIONS)
+    if unknown:
+        raise ValueError("unknown options for job %d: %s" % (index, ', '.join(sorted(unknown))))
+
+    data, d_rows, d_cols = _handle_input_data(data)
+    content = None
+    hit = None
+    if cache is not None:
+        key = cache.key('render_radar_charts', data, line_labels, var_labels, frame, options,
+                        fmt, figsize, dpi)
+        # hits and misses are counted by the caller, whose cache may be another copy
+        content = cache._read(key, fmt)
+        hit = content is not None
+    if content is None:
+        fig = _get_figure(figsize, dpi)
+        try:
+            with stage('setup'):
+                ax = fig.add_subplot(projection=_radar_axes_class(d_cols, frame).name)
+            with stage('artists') as st:
+                _draw_radar_chart(fig, ax, data, line_labels, var_labels, **options)
+                st.add(bytes=data.nbytes)
+            with stage('draw') as st:
+                buffer = io.BytesIO()
+                fig.savefig(buffer, format=fmt)
+                content = buffer.getvalue()
+                st.add(bytes=len(content))
+        finally:
+            fig.clear()
+        if cache is not None:
+            cache.put(key, fmt, content)
+    if output_dir is None:
+        return content, hit
+    path = os.path.join(output_dir, filename)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path, hit
+
+
+def render_radar_charts(jobs, output_dir=None, format='png', workers=None, figsize=None,
+                        dpi=None, chunksize=16, cache=None):
+    """
+    Render radar charts without any interactive backend.
+
+    jobs - iterable of (data, line_labels, var_labels) or
+           (data, line_labels, var_labels, options) tuples, the first three are
+           the same as for plot_radar_chart. `options` is a dict with any of
+           `title`, `r_ticks`, `r_tick_labels`, `colours`, `collection`,
+           `fill`, `alpha`, `frame` and `filename` (name of the output file,
+           default: radar_<index>.<format>)
+    output_dir - directory to write the charts to, if None the rendered files
+                 are returned as bytes instead
+    format - file format ['png', 'svg', 'pdf', ...]
+    workers - number of worker processes, default: number of cores,
+              0 renders in the calling process
+    figsize - figure size in inches, default: matplotlib's default
+    dpi - resolution, default: matplotlib's default
+    chunksize - number of jobs sent to a worker at once
+    cache - optional RenderCache, charts with unchanged inputs are taken from it,
+            its hit and miss counts include the lookups of the worker processes
+
+    returns:
+        list with the output path (or bytes) of every job, in the order of `jobs`
+    """
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    if workers == 0:
+        tasks = ((i, job, output_dir, format, figsize, dpi, cache)
+                 for i, job in enumerate(jobs))
+        results = [_render_radar_job(task) for task in tasks]
+    else:
+        # the workers get the cache once when they start, not with every task
+        tasks = ((i, job, output_dir, format, figsize, dpi, None)
+                 for i, job in enumerate(jobs))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(cache,)) as pool:
+            results = list(pool.map(_render_radar_job, tasks, chunksize=chunksize))
+    if cache is not None:
+        for _, hit in results:
+            cache._count(hit)
+    return [result for result, _ in results]
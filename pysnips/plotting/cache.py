@@ -0,0 +1,221 @@
+"""
+Content-addressed on-disk cache for rendered charts
+
+The key of a chart is a hash of everything that determines how it looks: the
+plotting function, the data, labels and keyword arguments, the output format
+and the versions of matplotlib and pysnips. Charts whose inputs did not change
+are then served from disk without touching matplotlib.
+
+Several processes can share a cache directory: files are written atomically and
+entries that vanish because another process evicted them count as misses.
+"""
+
+import hashlib
+import io
+import numbers
+import os
+import tempfile
+
+import numpy as np
+
+from ..instrument import stage
+
+__all__ = ['RenderCache']
+
+
+# number of puts after which the cache directory is recounted, so that entries
+# written by other processes sharing the directory are taken into account
+RESCAN_INTERVAL = 256
+
+
+def _feed(hasher, obj):
+    """Feed a canonical byte representation of `obj` into `hasher`"""
+    if isinstance(obj, np.ndarray):
+        hasher.update(b'array%s%s' % (obj.dtype.str.encode(), str(obj.shape).encode()))
+        if obj.dtype.hasobject:
+            _feed(hasher, obj.tolist())
+        else:
+            hasher.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, (list, tuple)):
+        hasher.update(b'%s%d(' % (type(obj).__name__.encode(), len(obj)))
+        for item in obj:
+            _feed(hasher, item)
+        hasher.update(b')')
+    elif isinstance(obj, dict):
+        hasher.update(b'dict%d{' % len(obj))
+        for k in sorted(obj, key=repr):
+            _feed(hasher, k)
+            _feed(hasher, obj[k])
+        hasher.update(b'}')
+    elif obj is None or isinstance(obj, (str, bytes, bool, numbers.Number)):
+        hasher.update(b'%s:%s;' % (type(obj).__name__.encode(), repr(obj).encode()))
+    elif isinstance(obj, np.generic):
+        _feed(hasher, obj.item())
+    elif isinstance(obj, (set, frozenset)):
+        _feed(hasher, sorted(obj, key=repr))
+    else:
+        raise TypeError("Can not compute a stable cache key for %s" % type(obj).__name__)
+
+
+class RenderCache(object):
+    """
+    Size bounded on-disk cache for rendered charts with LRU eviction.
+
+    directory - directory of the cache, created if necessary
+    max_bytes - the least recently used entries are evicted when the cache
+                grows beyond this size, default: 512 MB
+
+    Example:
+        cache = RenderCache('~/.cache/charts')
+        png = cache.render(plot_radar_chart, data, line_labels, var_labels, title='A')
+    """
+
+    def __init__(self, directory, max_bytes=512 * 2**20):
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # size of the entries when the directory was last counted plus what was put since
+        self._size = None
+        self._puts = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def stats(self):
+        """Hit and miss counts of this cache object and of the workers of render_radar_charts"""
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.}
+
+    def key(self, *parts):
+        """Stable hash of `parts` (arrays, sequences, dicts and scalars) and the versions"""
+        import matplotlib
+        import pysnips
+        hasher = hashlib.sha256()
+        _feed(hasher, (matplotlib.__version__, pysnips.__version__) + parts)
+        return hasher.hexdigest()
+
+    def _path(self, key, format):
+        return os.path.join(self.directory, key[:2], '%s.%s' % (key, format))
+
+    def get(self, key, format):
+        """Return the stored bytes for `key` or None"""
+        content = self._read(key, format)
+        self._count(content is not None)
+        return content
+
+    def _read(self, key, format):
+        """get without counting the hit or miss"""
+        path = self._path(key, format)
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+            # mark as recently used for the eviction
+            os.utime(path)
+        except OSError:
+            return None
+        return content
+
+    def _count(self, hit):
+        """Count a hit or miss, e.g. of a lookup done by a worker process"""
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def put(self, key, format, content):
+        """Store `content` under `key`"""
+        path = self._path(key, format)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        # write to a temporary file and rename, so readers never see partial files
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        # the directory is only scanned when the cache may have grown too large
+        self._puts += 1
+        if self._size is None or self._puts % RESCAN_INTERVAL == 0:
+            self._evict()
+        else:
+            self._size += len(content) - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """
+        Count the entries and remove the least recently used ones until the
+        cache fits into max_bytes
+        """
+        entries = []
+        total = 0
+        for sub in os.scandir(self.directory):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    # already evicted by another process
+                    pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        self._size = total
+
+    def clear(self):
+        """Remove all entries"""
+        max_bytes, self.max_bytes = self.max_bytes, -1
+        try:
+            self._evict()
+        finally:
+            self.max_bytes = max_bytes
+
+    def render(self, plot_function, *args, **kwargs):
+        """
+        Return the rendered chart of `plot_function(*args, **kwargs)` as bytes,
+        from the cache if possible.
+
+        plot_function - plot_radar_chart, plot_sem_diff or any function that
+                        accepts `show` and returns a figure or (figure, axes)
+        format - keyword argument, file format of the chart, default: 'png'
+        savefig_kw - keyword argument, dict of arguments for `savefig`
+        """
+        import matplotlib.pyplot as plt
+        format = kwargs.pop('format', 'png')
+        savefig_kw = kwargs.pop('savefig_kw', {})
+        name = '%s.%s' % (plot_function.__module__, plot_function.__qualname__)
+        key = self.key(name, args, kwargs, format, savefig_kw)
+        content = self.get(key, format)
+        if content is not None:
+            return content
+
+        result = plot_function(*args, show=False, **kwargs)
+        fig = result[0] if isinstance(result, tuple) else result
+        try:
+            with stage('draw') as st:
+                buffer = io.BytesIO()
+                fig.savefig(buffer, format=format, **savefig_kw)
+                st.add(bytes=buffer.tell())
+        finally:
+            plt.close(fig)
+        content = buffer.getvalue()
+        self.put(key, format, content)
+        return content
@@ -0,0 +1,153 @@
+"""
+Chart handles for live updating figures
+
+The figure is drawn completely once, afterwards `update` only changes the data
+of the existing lines and redraws them on top of the stored background of the
+axes (blitting), which takes milliseconds instead of a full figure rebuild.
+
+Example:
+    chart = RadarChart(first_values, line_labels, var_labels, r_max=5)
+    plt.show(block=False)
+    while running:
+        chart.update(next_values())
+        plt.pause(0.1)
+"""
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from ..instrument import stage
+from . import radar_chart
+from .semantic_differential import _jitter_offsets, plot_sem_diff
+
+__all__ = ['RadarChart', 'SemDiffChart']
+
+
+class _LiveChart(object):
+    """
+    Base class that keeps a copy of the background of `ax` and blits the
+    `artists` on top of it
+    """
+
+    def __init__(self, fig, ax, artists):
+        self.fig = fig
+        self.ax = ax
+        self._artists = list(artists)
+        for artist in self._artists:
+            artist.set_animated(True)
+        self._background = None
+        # a full draw (first show, resize, ...) recaptures the background
+        self._cid = fig.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, event):
+        self._background = self.fig.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self._artists:
+            self.ax.draw_artist(artist)
+
+    def _redraw(self, full=False):
+        canvas = self.fig.canvas
+        with stage('draw'):
+            if not getattr(canvas, 'supports_blit', False):
+                canvas.draw_idle()
+            elif full or self._background is None:
+                canvas.draw()
+            else:
+                canvas.restore_region(self._background)
+                self._draw_artists()
+                canvas.blit(self.ax.bbox)
+                canvas.flush_events()
+
+    def savefig(self, *args, **kwargs):
+        """Save the figure (fig.savefig would leave out the animated lines)"""
+        for artist in self._artists:
+            artist.set_animated(False)
+        try:
+            self.fig.savefig(*args, **kwargs)
+        finally:
+            for artist in self._artists:
+                artist.set_animated(True)
+            # saving redraws the canvas without the animated artists
+            self._background = None
+
+    def close(self):
+        """Disconnect from the canvas and close the figure"""
+        self.fig.canvas.mpl_disconnect(self._cid)
+        plt.close(self.fig)
+
+
+class RadarChart(_LiveChart):
+    """
+    Radar chart that can be updated with new values in place
+
+    data - initial data, see plot_radar_chart
+    line_labels - labels for the legend, see plot_radar_chart
+    var_labels - labels for the 'theta-axes', see plot_radar_chart
+    r_max - fixed maximum of the radial axis, default: None
+            If None, the chart is scaled to the initial data and rescaled (with
+            a full redraw) whenever an update exceeds the current range.
+    kwargs - further keyword arguments for plot_radar_chart (title, r_ticks,
+             r_tick_labels, colours, frame, ...)
+    """
+
+    def __init__(self, data, line_labels, var_labels, r_max=None, **kwargs):
+        kwargs['show'] = False
+        kwargs.pop('collection', None)
+        fig, ax = radar_chart.plot_radar_chart(data, line_labels, var_labels, **kwargs)
+        self._autoscale = r_max is None
+        if r_max is not None:
+            ax.set_rscale(r_max)
+        self._theta = np.append(ax.theta, ax.theta[0])
+        super(RadarChart, self).__init__(fig, ax, ax.get_lines())
+
+    def update(self, data):
+        """Show new `data` (same shape as the initial data)"""
+        data, d_rows, d_cols = radar_chart._handle_input_data(data)
+        if d_rows != len(self._artists) or d_cols != len(self._theta) - 1:
+            raise ValueError("Data must have shape (%d, %d)" %
+                             (len(self._artists), len(self._theta) - 1))
+        for line, row in zip(self._artists, data):
+            line.set_data(self._theta, np.append(row, row[0]))
+        full = False
+        if self._autoscale and np.max(data) > self.ax.get_ylim()[1]:
+            self.ax.set_rscale(np.max(data), round_up=True)
+            full = True
+        self._redraw(full)
+
+
+class SemDiffChart(_LiveChart):
+    """
+    Semantic differential that can be updated with new values in place
+
+    data - initial data, see plot_sem_diff (missing values are allowed)
+    x_labels - labels for the values on the x axis, see plot_sem_diff
+    y_labels - labels for the y axes, see plot_sem_diff
+    kwargs - further keyword arguments for plot_sem_diff (x_pad, x_offset,
+             colours, line_labels, title, jitter_amount)
+    """
+
+    def __init__(self, data, x_labels, y_labels, **kwargs):
+        kwargs['show'] = False
+        if kwargs.get('aggregate') is not None:
+            raise ValueError("SemDiffChart does not support aggregation")
+        fig = plot_sem_diff(data, x_labels, y_labels, **kwargs)
+        ax = fig.axes[0]
+        lines = ax.get_lines()
+        self._offsets = _jitter_offsets(len(lines), kwargs.get('jitter_amount', 0))
+        self._d_cols = len(lines[0].get_ydata())
+        super(SemDiffChart, self).__init__(fig, ax, lines)
+
+    def update(self, data):
+        """Show new `data` (same shape as the initial data)"""
+        data = np.asarray(data, dtype=float)
+        if data.ndim == 1:
+            data = data.reshape(1, -1)
+        if data.shape != (len(self._artists), self._d_cols):
+            raise ValueError("Data must have shape (%d, %d)" %
+                             (len(self._artists), self._d_cols))
+        data = data + self._offsets[:, None]
+        for line, row in zip(self._artists, data):
+            line.set_xdata(row)
+        self._redraw()
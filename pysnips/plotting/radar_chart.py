@@ -6,15 +6,25 @@ Radar chart plotting
 Most of the code is taken from:
     https://matplotlib.org/examples/api/radar_chart.html
 """
+import functools
+
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.path import Path
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.lines import Line2D
+from matplotlib.patches import Patch
 from matplotlib.spines import Spine
 from matplotlib.projections.polar import PolarAxes
 from matplotlib.projections import register_projection
 
+from ..instrument import enabled, stage, staged
+from ._geometry import (_density_alpha, _handle_input_data, _radar_rmax, _theta,
+                        _unit_poly_verts)
+
 FULL_CIRCLE_DEG = 360
 
+@staged('plot_radar_chart')
 def plot_radar_chart(data, line_labels, var_labels, **kwargs):
     """Make a radar chart.
 
@@ -25,8 +35,8 @@ def plot_radar_chart(data, line_labels, var_labels, **kwargs):
     ----------
     data: sequence, one- or two-dimensional
         Data to plot. Must be some sort of sequence that can be converted to a numpy array
-    line_labels: sequence, one-dimensional
-        Labels for the legend of the plot
+    line_labels: sequence, one-dimensional or None
+        Labels for the legend of the plot, no legend is drawn if None
     var_labels: sequence, one-dimensional
         Labels for the 'theta-axes'
     kwargs: keyword arguments
@@ -35,6 +45,14 @@ def plot_radar_chart(data, line_labels, var_labels, **kwargs):
             `r_ticks` - sequence, positions for the radial ticks
             `r_tick_labels` - sequence, labels for the radial ticks given by `r_ticks`
             `colours` - sequence with matplotlib colours for the lines
+            `show` - bool, whether to call `plt.show()`, default: True
+            `collection` - bool, draw all rows as a single LineCollection instead
+                           of one line per row (much faster for many rows), default: False
+            `fill` - bool, draw filled polygons (only with `collection`), default: False
+            `alpha` - float or 'density', transparency of the lines/polygons,
+                      'density' chooses it from the number of rows so that
+                      regions with many overlaid observations get darker,
+                      default: None
         or keyword args accepted by create_radar_chart function
     """
     # get kwargs that should not be passed on to create_radar_chart
@@ -42,64 +60,178 @@ def plot_radar_chart(data, line_labels, var_labels, **kwargs):
     r_ticks = kwargs.pop('r_ticks', None)
     r_tick_labels = kwargs.pop('r_tick_labels', None)
     colours = kwargs.pop('colours', None)
+    show = kwargs.pop('show', True)
+    collection = kwargs.pop('collection', False)
+    fill = kwargs.pop('fill', False)
+    alpha = kwargs.pop('alpha', None)
 
     # validate input data
     data, d_rows, d_cols = _handle_input_data(data)
 
     # plot the thing
-    theta = _theta(d_cols)
-    fig, ax = create_radar_chart(d_cols, **kwargs)
-    for i in range(d_rows):
-        if colours is None:
-            ax.plot(theta, data[i], label=line_labels[i])
-        else:
-            ax.plot(theta, data[i], label=line_labels[i], color=colours[i])
+    with stage('setup'):
+        fig, ax = create_radar_chart(d_cols, **kwargs)
+    with stage('artists') as st:
+        _draw_radar_chart(fig, ax, data, line_labels, var_labels, title, r_ticks,
+                          r_tick_labels, colours, collection, fill, alpha)
+        st.add(bytes=data.nbytes)
+    if show:
+        if enabled():
+            # draw once under the stage, plt.show() may block until the window is closed
+            with stage('draw'):
+                fig.canvas.draw()
+        plt.show()
+
+    return fig, ax
+
+
+def _draw_radar_chart(fig, ax, data, line_labels, var_labels, title='', r_ticks=None,
+                      r_tick_labels=None, colours=None, collection=False, fill=False,
+                      alpha=None):
+    """Draw validated `data` into the radar axes `ax` of `fig`"""
+    d_rows, d_cols = data.shape
+    if alpha == 'density':
+        alpha = _density_alpha(d_rows)
+    if collection:
+        _draw_radar_collection(ax, data, line_labels, colours, fill, alpha)
+    else:
+        theta = _theta(d_cols)
+        for i in range(d_rows):
+            label = None if line_labels is None else line_labels[i]
+            if colours is None:
+                ax.plot(theta, data[i], label=label, alpha=alpha)
+            else:
+                ax.plot(theta, data[i], label=label, color=colours[i], alpha=alpha)
     if r_ticks is not None:
         ax.set_yticks(r_ticks)
     if r_tick_labels is not None:
         ax.set_yticklabels(r_tick_labels)
     ax.set_rscale(np.max(data), round_up=True)
     ax.set_varlabels(var_labels)
-    ax.legend()
+    if line_labels is not None and not collection:
+        ax.legend()
     fig.suptitle(title)
-    plt.show()
-
-    return fig, ax
 
 
-def _handle_input_data(data):
-    """Helper function for input data validation and calculating helper values"""
-    data = np.asarray(data)
-    if np.ndim(data) == 1:
-        d_rows = 1
-        d_cols = len(data)
-        data = data.reshape((1, data.shape[0]))
-    elif np.ndim(data) == 2:
-        d_rows = data.shape[0]
-        d_cols = data.shape[1]
+def _draw_radar_collection(ax, data, line_labels, colours, fill, alpha):
+    """Draw all rows of `data` as one (closed) LineCollection or PolyCollection"""
+    d_rows, d_cols = data.shape
+    theta = _theta(d_cols)
+    # close all lines at once by repeating the first column
+    verts = np.empty((d_rows, d_cols + 1, 2))
+    verts[:, :-1, 0] = theta
+    verts[:, -1, 0] = theta[0]
+    verts[:, :-1, 1] = data
+    verts[:, -1, 1] = data[:, 0]
+    if colours is None:
+        # same colours as consecutive calls to plot would give
+        cycle = plt.rcParams['axes.prop_cycle'].by_key()['color']
+        colours = [cycle[i % len(cycle)] for i in range(d_rows)]
+    if fill:
+        artist = PolyCollection(verts, facecolors=colours, edgecolors=colours, alpha=alpha)
     else:
-        raise ValueError("Incorrect dimensionality of data. Must be <= 2")
-    return data, d_rows, d_cols
-
+        artist = LineCollection(verts, colors=colours, alpha=alpha)
+    ax.add_collection(artist)
+    if line_labels is not None:
+        # proxy artists, since a collection only has one legend entry
+        if fill:
+            handles = [Patch(color=c, alpha=alpha) for c in colours]
+        else:
+            handles = [Line2D([], [], color=c, alpha=alpha) for c in colours]
+        ax.legend(handles, line_labels)
+    return artist
 
-def _unit_poly_verts(theta):
-    """Return vertices of polygon for subplot axes.
 
-    This polygon is circumscribed by a unit circle centered at (0.5, 0.5)
+class RadarAxes(PolarAxes):
     """
-    x0, y0, r = [0.5] * 3
-    verts = [(r*np.cos(t) + x0, r*np.sin(t) + y0) for t in theta]
-    return verts
+    Projection class for a radar chart
 
+    This is a base class, the concrete projections for a given number of
+    variables and frame shape are created (and registered) once by
+    `_radar_axes_class`.
+    """
 
-def _theta(num_vars):
-    """Return array of theta values.
-    Values are evenly spaced and corrected for radar plotting
+    # use 1 line segment to connect specified points
+    RESOLUTION = 1
+    # number of variables, frame shape, angles of the variables and (for
+    # polygon frames) the vertices of the frame, set by subclasses
+    size = None
+    shape = None
+    theta = None
+    verts = None
+
+    def set_rscale(self, top, bottom=0, round_up=False):
+        """Scale the radar chart
+            If circle chart then this function just sets the ylim of the polar ax.
+            If polygon chart then ylim will be set to fit a circle with radius h
+            completely inside it (distance from center to midpoint of polygon 
+            edge will be h.
+        """
+        self.set_ylim(bottom, _radar_rmax(top, self.size, self.shape, round_up))
+
+    def fill(self, *args, **kwargs):
+        """Override fill so that line is closed by default"""
+        closed = kwargs.pop('closed', True)
+        return super(RadarAxes, self).fill(closed=closed, *args, **kwargs)
+
+    def plot(self, *args, **kwargs):
+        """Override plot so that line is closed by default"""
+        lines = super(RadarAxes, self).plot(*args, **kwargs)
+        for line in lines:
+            self._close_line(line)
+
+    def _close_line(self, line):
+        x, y = line.get_data()
+        # FIXME: markers at x[0], y[0] get doubled-up
+        if x[0] != x[-1]:
+            x = np.concatenate((x, [x[0]]))
+            y = np.concatenate((y, [y[0]]))
+            line.set_data(x, y)
+
+    def set_varlabels(self, labels):
+        """Label the radial axes"""
+        self.set_thetagrids(np.degrees(self.theta) % FULL_CIRCLE_DEG, labels)
+
+    def _gen_axes_patch(self):
+        if self.shape == 'circle':
+            # unit circle centered on (0.5, 0.5)
+            return plt.Circle((0.5, 0.5), 0.5)
+        return plt.Polygon(self.verts[:-1], closed=True, edgecolor='k')
+
+    def _gen_axes_spines(self):
+        if self.shape == 'circle':
+            return PolarAxes._gen_axes_spines(self)
+        # The following is a hack to get the spines (i.e. the axes frame)
+        # to draw correctly for a polygon frame.
+
+        # spine_type must be 'left', 'right', 'top', 'bottom', or `circle`.
+        spine_type = 'circle'
+        path = Path(self.verts)
+
+        spine = Spine(self, spine_type, path)
+        spine.set_transform(self.transAxes)
+        return {'polar': spine}
+
+
+@functools.lru_cache(maxsize=None)
+def _radar_axes_class(num_vars, frame):
     """
-    theta = np.linspace(0, 2*np.pi, num_vars, endpoint=False)
-    # rotate theta such that the first axis is at the top
-    theta += np.pi/2
-    return theta
+    Create and register the radar projection for `num_vars` variables and the
+    given frame shape. Every combination gets its own projection name and is
+    only created once per process.
+    """
+    theta = _theta(num_vars)
+    attrs = {'name': 'radar_%d_%s' % (num_vars, frame),
+             'size': num_vars,
+             'shape': frame,
+             'theta': theta}
+    if frame == 'polygon':
+        verts = _unit_poly_verts(theta)
+        # close off polygon by repeating first vertex
+        attrs['verts'] = np.vstack((verts, verts[:1]))
+    cls = type('RadarAxes%d%s' % (num_vars, frame.capitalize()), (RadarAxes,), attrs)
+    register_projection(cls)
+    return cls
 
 
 def create_radar_chart(num_vars, frame='polygon', **kwargs):
@@ -116,104 +248,16 @@ def create_radar_chart(num_vars, frame='polygon', **kwargs):
         for others see: https://matplotlib.org/devdocs/api/_as_gen/matplotlib.pyplot.subplots.html
 
     """
-    theta = _theta(num_vars)
-
-    def draw_poly_patch(self):
-        verts = _unit_poly_verts(theta)
-        return plt.Polygon(verts, closed=True, edgecolor='k')
-
-    def draw_circle_patch(self):
-        # unit circle centered on (0.5, 0.5)
-        return plt.Circle((0.5, 0.5), 0.5)
-
-    patch_dict = {'polygon': draw_poly_patch, 'circle': draw_circle_patch}
-    if frame not in patch_dict:
+    if frame not in ('polygon', 'circle'):
         raise ValueError('unknown value for `frame`: %s' % frame)
+    projection = _radar_axes_class(int(num_vars), frame).name
 
-    class RadarAxes(PolarAxes):
-        """
-        Projection class for a radar chart
-        """
-
-        name = 'radar'
-        size = num_vars
-        # use 1 line segment to connect specified points
-        RESOLUTION = 1
-        # define draw_frame method
-        shape = frame
-        draw_patch = patch_dict[frame]
-
-        def set_rscale(self, top, bottom=0, round_up=False):
-            """Scale the radar chart
-                If circle chart then this function just sets the ylim of the polar ax.
-                If polygon chart then ylim will be set to fit a circle with radius h
-                completely inside it (distance from center to midpoint of polygon 
-                edge will be h.
-            """
-            if self.shape == 'circle':
-                r = top
-            elif self.shape == 'polygon':
-                angle_of_slice = 2 * np.pi / self.size
-                r = top / np.cos(angle_of_slice / 2.)
-                if round_up:
-                    r = np.ceil(r)
-            else:
-                # this should never happen since this is checked for in class
-                # creation
-                raise ValueError('unknown value for `frame`: %s' % self.shape)
-            self.set_ylim(bottom, r)
-
-        def fill(self, *args, **kwargs):
-            """Override fill so that line is closed by default"""
-            closed = kwargs.pop('closed', True)
-            return super(RadarAxes, self).fill(closed=closed, *args, **kwargs)
-
-        def plot(self, *args, **kwargs):
-            """Override plot so that line is closed by default"""
-            lines = super(RadarAxes, self).plot(*args, **kwargs)
-            for line in lines:
-                self._close_line(line)
-
-        def _close_line(self, line):
-            x, y = line.get_data()
-            # FIXME: markers at x[0], y[0] get doubled-up
-            if x[0] != x[-1]:
-                x = np.concatenate((x, [x[0]]))
-                y = np.concatenate((y, [y[0]]))
-                line.set_data(x, y)
-
-        def set_varlabels(self, labels):
-            """Label the radial axes"""
-            self.set_thetagrids(np.degrees(theta) % FULL_CIRCLE_DEG, labels)
-
-        def _gen_axes_patch(self):
-            return self.draw_patch()
-
-        def _gen_axes_spines(self):
-            if frame == 'circle':
-                return PolarAxes._gen_axes_spines(self)
-            # The following is a hack to get the spines (i.e. the axes frame)
-            # to draw correctly for a polygon frame.
-
-            # spine_type must be 'left', 'right', 'top', 'bottom', or `circle`.
-            spine_type = 'circle'
-            verts = _unit_poly_verts(theta)
-            # close off polygon by repeating first vertex
-            verts.append(verts[0])
-            path = Path(verts)
-
-            spine = Spine(self, spine_type, path)
-            spine.set_transform(self.transAxes)
-            return {'polar': spine}
-
-    register_projection(RadarAxes)
-    
     # if subplot_kw argument is given, overwrite projection field
     # TODO: maybe throw error when projection is given?
     if 'subplot_kw' in kwargs:
-        kwargs['subplot_kw']['projection'] = 'radar'
+        kwargs['subplot_kw']['projection'] = projection
     else:
-        kwargs['subplot_kw'] = {'projection': 'radar'}
+        kwargs['subplot_kw'] = {'projection': projection}
     fig, axes = plt.subplots(**kwargs)
 
     return fig, axes
@@ -2,17 +2,26 @@
 Create a profile plot aka semantic differential
 """
 
-import matplotlib.pyplot as plt
+import math
+
 import numpy as np
 
+from ..instrument import enabled, stage, staged
+
+
+# opacity of the bands drawn around aggregated lines
+BAND_ALPHA = 0.2
 
+
+@staged('plot_sem_diff')
 def plot_sem_diff(data, x_labels, y_labels, **kwargs):
     """
     Plot the semantic differential of the values given by `data`
 
     data - sequence containing the data
         must be either one- or twodimensional
-        with the different observations in the rows and the attributes in the columns
+        with the different observations in the rows and the attributes in the columns,
+        or a SemDiffSummary (implies aggregation)
     x_labels - labels for the values on the x axis
     y_labels - sequence of labels for the y axes
         If given a one-dimensional sequence (i.e. a seq of labels), labels will
@@ -39,6 +48,21 @@ def plot_sem_diff(data, x_labels, y_labels, **kwargs):
         jitter_amount - value used for jittering the lines, can help to better
                         seperate the lines visually if their values are similar,
                         only makes sense for integer scales, default: 0
+        aggregate - instead of one line per row, plot one summary line per group,
+                    'mean' or 'median', default: None
+        groups - sequence with a group label for every row of `data`, only used
+                 when aggregating, default: None (all rows form one group)
+                 The group labels are used for the legend if no `line_labels` are given.
+        band - band drawn around the summary lines, 'ci' (confidence interval of
+               the mean), 'quantiles' or None, default: 'ci' for the mean and
+               'quantiles' for the median
+        quantiles - pair of quantiles limiting the band, default: (0.25, 0.75)
+        ci - confidence level of the confidence interval, default: 0.95
+        show - whether to call `plt.show()`, default: True
+        ax - axes to draw on, default: None
+             If given, the chart is drawn on `ax` without touching pyplot (`show`
+             is ignored), so charts can be drawn on figures created with
+             `matplotlib.figure.Figure` from several threads at once.
 
     returns:
         the figure used for the plotting
@@ -50,45 +74,83 @@ def plot_sem_diff(data, x_labels, y_labels, **kwargs):
     line_labels = kwargs.pop('line_labels', None)
     title = kwargs.pop('title', '')
     jitter_amount = kwargs.pop('jitter_amount', 0)
+    aggregate = kwargs.pop('aggregate', None)
+    groups = kwargs.pop('groups', None)
+    band = kwargs.pop('band', 'default')
+    quantiles = kwargs.pop('quantiles', (0.25, 0.75))
+    ci = kwargs.pop('ci', 0.95)
+    show = kwargs.pop('show', True)
+    ax = kwargs.pop('ax', None)
     # set up things by helper functions
-    data, d_rows, d_cols = _handle_input_data(data, jitter_amount)
+    bands = None
+    if aggregate is not None or isinstance(data, SemDiffSummary):
+        data, bands, group_labels = _summarize(data, groups, aggregate or 'mean', band,
+                                               quantiles, ci)
+        if line_labels is None:
+            line_labels = group_labels
+        d_rows, d_cols = data.shape
+        if jitter_amount:
+            offsets = _jitter_offsets(d_rows, jitter_amount)[:, None]
+            data = data + offsets
+            if bands is not None:
+                bands = (bands[0] + offsets, bands[1] + offsets)
+    else:
+        data, d_rows, d_cols = _handle_input_data(data, jitter_amount)
     left_labels, right_labels, line_labels, do_legend = _get_labels(y_labels,
                                                                     line_labels,
                                                                     d_rows)
     colours, n_c = _handle_colours(colours, d_rows)
 
     # do the actual plotting
-    fig = plt.figure()
-    y = np.arange(d_cols)[::-1]
-    for i in range(len(data)):
-        _do_plot(data[i], y, colour=colours[i % n_c], label=line_labels[i])
-    plt.title(title)
-
-    # set the x-axis labels
-    x_lab_pos = np.arange(0, len(x_labels)) + x_offset
-    plt.xticks(x_lab_pos, x_labels)
-    plt.xlim(x_lab_pos[0] - x_pad, x_lab_pos[-1] + x_pad)
-
-    # set y-axis labels on the right side of the plot (since this is the direction in
-    # which the respective attribute grows) or (if two sets of labels are given)
-    # on both sides
-    if left_labels is None:
-        plt.tick_params(labelleft=False, labelright=True)
-        plt.yticks(y, right_labels)
+    if ax is None:
+        import matplotlib.pyplot as plt
+        with stage('setup'):
+            fig = plt.figure()
+            ax = fig.add_subplot()
     else:
-        ax_l = fig.gca()
-        plt.yticks(y, left_labels)
-        ax_r = ax_l.twinx()
-        ax_r.set_ylim(ax_l.get_ylim())
-        plt.yticks(y, right_labels)
-        plt.sca(ax_l)
+        fig = ax.figure
+        show = False
+    with stage('artists') as st:
+        y = np.arange(d_cols)[::-1]
+        _plot_rows(ax, data, y, colours, line_labels)
+        if bands is not None:
+            for i in range(d_rows):
+                ax.fill_betweenx(y, bands[0][i], bands[1][i], color=colours[i % n_c],
+                                 alpha=BAND_ALPHA, linewidth=0)
+        ax.set_title(title)
+
+        # set the x-axis labels
+        x_lab_pos = np.arange(0, len(x_labels)) + x_offset
+        ax.set_xticks(x_lab_pos)
+        ax.set_xticklabels(x_labels)
+        ax.set_xlim(x_lab_pos[0] - x_pad, x_lab_pos[-1] + x_pad)
 
-    # set grid and legend if necessary
-    plt.grid()
-    if do_legend:
-        plt.legend()
+        # set y-axis labels on the right side of the plot (since this is the direction
+        # in which the respective attribute grows) or (if two sets of labels are
+        # given) on both sides
+        ax.set_yticks(y)
+        if left_labels is None:
+            ax.tick_params(labelleft=False, labelright=True)
+            ax.set_yticklabels(right_labels)
+        else:
+            ax.set_yticklabels(left_labels)
+            ax_r = ax.twinx()
+            ax_r.set_ylim(ax.get_ylim())
+            ax_r.set_yticks(y)
+            ax_r.set_yticklabels(right_labels)
 
-    plt.show()
+        # set grid and legend if necessary
+        ax.grid()
+        if do_legend:
+            ax.legend()
+        st.add(bytes=data.nbytes)
+
+    if show:
+        if enabled():
+            # draw once under the stage, plt.show() may block until the window is closed
+            with stage('draw'):
+                fig.canvas.draw()
+        plt.show()
 
     return fig
 
@@ -97,10 +159,8 @@ def _handle_colours(colours, d_rows):
     """Handle the case where no colours are given"""
     if colours is None:
         from matplotlib import colors
-        colours = colors.BASE_COLORS
-        # default value to enable reuse in one session
-        colours.pop('w', None)
-        colours = list(colours.keys())
+        # all base colours but white (which would be invisible)
+        colours = [c for c in colors.BASE_COLORS if c != 'w']
     elif d_rows != len(colours):
         raise ValueError("Must give a colour for every row in data or non at all")
     n_c = len(colours)
@@ -124,37 +184,249 @@ def _handle_input_data(data, jitter_amount):
     return data, d_rows, d_cols
 
 
+def _jitter_offsets(d_rows, amount):
+    """Offsets that separate `d_rows` lines by `amount`, centered around zero"""
+    i_max = int(np.ceil(d_rows/2))
+    shift = 0 if d_rows % 2 else amount/2
+    i = np.arange(d_rows)
+    # the upper half of the rows gets the negative offsets
+    i = np.where(i < i_max, i, i - d_rows)
+    return i * amount + shift
+
+
 def _jitter_data(data, d_rows, amount):
     """Add jitter to the data to separate the lines by `amount`"""
-    i_max = d_rows/2
-    shift = 0 if d_rows % 2 else amount/2
-    for i in range(int(-np.floor(i_max)), int(np.ceil(i_max))):
-        data[i] += i * amount + shift
+    data += _jitter_offsets(d_rows, amount)[:, None]
     return data
 
 
-def _do_plot(data, y, colour, label):
+def _summarize(data, groups, aggregate, band, quantiles, ci):
+    """
+    Compute the summary lines (and bands) of `data`, returns the lines, the
+    bands as (lower, upper) or None and the group labels
+    """
+    if isinstance(data, SemDiffSummary):
+        summary = data
+    else:
+        data, _, _ = _handle_input_data(data, 0)
+        summary = SemDiffSummary().update(data, groups)
+    if band == 'default':
+        band = 'ci' if aggregate == 'mean' else 'quantiles'
+
+    if aggregate == 'mean':
+        lines = summary.mean()
+    elif aggregate == 'median':
+        lines = summary.median()
+    else:
+        raise ValueError("unknown value for `aggregate`: %s" % aggregate)
+    if band is None:
+        bands = None
+    elif band == 'ci':
+        bands = summary.ci(ci)
+    elif band == 'quantiles':
+        bands = summary.quantile(quantiles)
+    else:
+        raise ValueError("unknown value for `band`: %s" % band)
+    # rows without a group label do not get an entry in the legend
+    if summary.groups == [None]:
+        return lines, bands, None
+    return lines, bands, [str(g) for g in summary.groups]
+
+
+class _GroupStats(object):
+    """Running statistics of the rows of one group, per attribute"""
+
+    def __init__(self, d_cols):
+        self.n = np.zeros(d_cols)
+        self.mean = np.zeros(d_cols)
+        self.m2 = np.zeros(d_cols)
+        # distinct values and how often they occur per attribute
+        self.values = np.empty(0)
+        self.counts = np.zeros((0, d_cols), dtype=np.int64)
+
+    def update(self, data):
+        valid = ~np.isnan(data)
+        n = valid.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.nansum(data, axis=0) / n
+            m2 = np.nansum((data - mean)**2, axis=0)
+        # merge with the previous statistics (Chan et al.)
+        total = self.n + n
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = mean - self.mean
+            self.mean = np.where(n > 0, self.mean + delta * n / total, self.mean)
+            self.m2 = np.where(n > 0, self.m2 + m2 + delta**2 * self.n * n / total, self.m2)
+        self.n = total
+        if not valid.any():
+            # nothing but missing values
+            return
+
+        # count the distinct values of every attribute
+        values = np.unique(data[valid])
+        cols = np.broadcast_to(np.arange(data.shape[1]), data.shape)[valid]
+        idx = np.searchsorted(values, data[valid])
+        counts = np.bincount(idx * data.shape[1] + cols,
+                             minlength=len(values) * data.shape[1]).reshape(len(values), -1)
+        merged = np.union1d(self.values, values)
+        new_counts = np.zeros((len(merged), data.shape[1]), dtype=np.int64)
+        new_counts[np.searchsorted(merged, self.values)] += self.counts
+        new_counts[np.searchsorted(merged, values)] += counts
+        self.values, self.counts = merged, new_counts
+
+    def quantile(self, q):
+        """Quantiles like numpy.quantile (linear interpolation) from the value counts"""
+        result = np.full(self.counts.shape[1], np.nan)
+        cum = np.cumsum(self.counts, axis=0)
+        for j in range(self.counts.shape[1]):
+            n = cum[-1, j] if len(cum) else 0
+            if n == 0:
+                continue
+            h = (n - 1) * q
+            lo = self.values[np.searchsorted(cum[:, j], np.floor(h), side='right')]
+            hi = self.values[np.searchsorted(cum[:, j], np.ceil(h), side='right')]
+            result[j] = lo + (hi - lo) * (h - np.floor(h))
+        return result
+
+
+def _normal_quantile(p):
+    """Quantile of the standard normal distribution (by bisection on erf)"""
+    lo, hi = -10., 10.
+    for _ in range(100):
+        mid = (lo + hi) / 2
+        if 0.5 * (1 + math.erf(mid / math.sqrt(2))) < p:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+
+class SemDiffSummary(object):
+    """
+    Per attribute statistics of semantic differential data, optionally per group
+
+    The statistics are updated chunk by chunk, so data sets that do not fit into
+    memory can be summarized. Missing values (`Nan`) are ignored. Mean, standard
+    deviation and confidence intervals are exact. Medians and quantiles are
+    computed from the counts of the distinct values of every attribute, which is
+    exact as well but meant for rating scales with few distinct values.
+
+    Example:
+        summary = SemDiffSummary()
+        for chunk, groups in read_chunks():
+            summary.update(chunk, groups)
+        plot_sem_diff(summary, x_labels, y_labels, aggregate='median')
+    """
+
+    def __init__(self):
+        self._stats = {}
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """Summarize an iterable of data chunks or (data, groups) pairs"""
+        summary = cls()
+        for chunk in chunks:
+            if isinstance(chunk, tuple):
+                summary.update(*chunk)
+            else:
+                summary.update(chunk)
+        return summary
+
+    @property
+    def groups(self):
+        """Group labels in order of their first appearance"""
+        return list(self._stats)
+
+    def update(self, data, groups=None):
+        """
+        Add the rows of `data` (observations in rows, attributes in columns)
+
+        groups - group label for every row, default: None (all rows in one group)
+        """
+        data = np.asarray(data, dtype=float)
+        if data.ndim == 1:
+            data = data.reshape(1, -1)
+        if data.ndim != 2:
+            raise ValueError("Incorrect dimensionality of data. Must be <= 2")
+        if groups is None:
+            labels, inverse = np.array([None]), np.zeros(len(data), dtype=int)
+        else:
+            groups = np.asarray(groups)
+            if len(groups) != len(data):
+                raise ValueError("Must give a group label for every row in data")
+            labels, first, inverse = np.unique(groups, return_index=True, return_inverse=True)
+            # keep the order in which the groups appear in the data
+            order = np.argsort(first)
+            labels = labels[order]
+            inverse = np.argsort(order)[inverse.ravel()]
+        for g, label in enumerate(labels):
+            label = label.item() if hasattr(label, 'item') else label
+            if label not in self._stats:
+                self._stats[label] = _GroupStats(data.shape[1])
+            elif len(self._stats[label].n) != data.shape[1]:
+                raise ValueError("Number of attributes differs from previous data")
+            self._stats[label].update(data[inverse == g])
+        return self
+
+    def _collect(self, attr):
+        return np.array([getattr(s, attr) for s in self._stats.values()])
+
+    def count(self):
+        """Number of values per group (rows) and attribute (columns)"""
+        return self._collect('n').astype(int)
+
+    def mean(self):
+        """Mean per group (rows) and attribute (columns)"""
+        n = self._collect('n')
+        return np.where(n > 0, self._collect('mean'), np.nan)
+
+    def std(self):
+        """Sample standard deviation per group (rows) and attribute (columns)"""
+        n = self._collect('n')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(n > 1, np.sqrt(self._collect('m2') / (n - 1)), np.nan)
+
+    def ci(self, level=0.95):
+        """
+        Confidence interval of the mean (normal approximation), returns the
+        lower and upper limits per group (rows) and attribute (columns)
+        """
+        z = _normal_quantile(0.5 + level / 2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            half_width = z * self.std() / np.sqrt(self._collect('n'))
+        mean = self.mean()
+        return mean - half_width, mean + half_width
+
+    def quantile(self, q):
+        """
+        Quantile(s) `q` per group (rows) and attribute (columns), for a
+        sequence of quantiles a tuple of such arrays is returned
+        """
+        if np.ndim(q) > 0:
+            return tuple(self.quantile(qi) for qi in q)
+        return np.array([s.quantile(q) for s in self._stats.values()])
+
+    def median(self):
+        """Median per group (rows) and attribute (columns)"""
+        return self.quantile(0.5)
+
+
+def _plot_rows(ax, data, y, colours, line_labels):
     """
-    Wrapper for the actual plotting that takes care of missing values in the data
-    (represented by `Nan`).
+    Plot all rows of `data` against `y` with a single plot call. Missing values
+    (represented by `Nan`) break the lines, which matplotlib does natively, so
+    there is no need to split the rows into segments.
 
-    data - x-axis data
+    ax - axes to plot on
+    data - x-axis data, one row per line
     y - y-axis data
-    colour - colour for the plot
-    label - label for the line
+    colours - colours for the lines, cycled if there are fewer than rows
+    line_labels - labels for the lines
     """
-    data = np.asarray(data)
-    y = np.asarray(y)
-    if np.ndim(data) > 1:
-        raise ValueError("_do_plot handles only one-d data!")
-
-    x, y = _split_by_nan(data, y)
-
-    for x_arr, y_arr in zip(x, y):
-        plt.plot(x_arr, y_arr, color=colour, linestyle='--', marker='x', label=label)
-        # this assures that when doing multiple plots because of an omitted nan
-        # value the label of the plot only appears once in the legend
-        label = None
+    lines = ax.plot(data.T, y, linestyle='--', marker='x')
+    for i, line in enumerate(lines):
+        line.set_color(colours[i % len(colours)])
+        line.set_label(line_labels[i])
+    return lines
 
 
 def _get_labels(y_labels, line_labels, d_rows):
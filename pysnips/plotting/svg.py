@@ -0,0 +1,566 @@
+"""
+Radar charts and semantic differentials rendered directly to SVG
+
+The charts are laid out like the matplotlib versions with the default settings
+(a 6.4 x 4.8 inch figure at 100 dpi with 10 pt fonts), but all geometry is
+computed with numpy and written out as SVG markup without creating any
+artists. This needs no matplotlib at all and takes a fraction of a millisecond
+per chart, so it suits web services and reports with thousands of charts.
+Text extents are estimated from typical character widths, so the positions of
+legends can differ slightly from matplotlib for long labels.
+
+Example:
+    svg = radar_chart_svg(data, ['before', 'after'], var_labels, title='Ratings')
+    with open('ratings.svg', 'w') as f:
+        f.write(svg)
+"""
+
+import hashlib
+import math
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from ..instrument import stage, staged
+from ._geometry import _density_alpha, _handle_input_data, _radar_rmax, _theta, _unit_poly_verts
+from .semantic_differential import (BAND_ALPHA, SemDiffSummary, _get_labels,
+                                    _handle_colours, _jitter_offsets, _split_by_nan,
+                                    _summarize)
+from .semantic_differential import _handle_input_data as _sem_diff_input_data
+
+__all__ = ['radar_chart_svg', 'sem_diff_svg']
+
+
+# default size of the image in pixels
+WIDTH = 640
+HEIGHT = 480
+# area of the axes as (left, bottom, right, top) in fractions of the figure
+AXES_BOX = (0.125, 0.11, 0.9, 0.88)
+# pixels per point at 100 dpi
+PT = 100 / 72.
+FONT_SIZE = 10 * PT
+TITLE_SIZE = 12 * PT
+FONT_FAMILY = 'DejaVu Sans, Bitstream Vera Sans, Arial, sans-serif'
+LINE_WIDTH = 1.5 * PT
+THIN_WIDTH = 0.8 * PT
+GRID_COLOUR = '#b0b0b0'
+TICK_LENGTH = 3.5 * PT
+TICK_PAD = 3.5 * PT
+TITLE_PAD = 6 * PT
+# distance of the variable labels of a radar chart from its frame
+VAR_LABEL_PAD = 14 * PT
+# angle of the radial tick labels of a radar chart in degrees
+R_LABEL_ANGLE = 22.5
+# dashes and 'x' markers of the semantic differential lines
+DASHES = (3.7 * LINE_WIDTH, 1.6 * LINE_WIDTH)
+MARKER_SIZE = 6 * PT
+MARKER_WIDTH = 1 * PT
+
+# matplotlib's colour cycle, single letter colours and the default colours of
+# the semantic differential lines (all base colours but white)
+CYCLE = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2',
+         '#7f7f7f', '#bcbd22', '#17becf']
+BASE_COLOURS = {'b': '#0000ff', 'g': '#008000', 'r': '#ff0000', 'c': '#00bfbf',
+                'm': '#bf00bf', 'y': '#bfbf00', 'k': '#000000', 'w': '#ffffff'}
+SEM_DIFF_COLOURS = ['b', 'g', 'r', 'c', 'm', 'y', 'k']
+
+# legend layout in units of the font size, as in matplotlib's rcParams
+LEGEND_BORDER_AXES_PAD = 0.5
+LEGEND_BORDER_PAD = 0.4
+LEGEND_HANDLE_LENGTH = 2.
+LEGEND_HANDLE_HEIGHT = 0.7
+LEGEND_HANDLE_TEXT_PAD = 0.8
+LEGEND_LABEL_SPACING = 0.5
+LEGEND_ALPHA = 0.8
+LEGEND_EDGE_COLOUR = '#cccccc'
+# legend locations in the order matplotlib tries them for loc='best', as
+# (horizontal, vertical) alignment within the axes
+LEGEND_LOCATIONS = [('right', 'top'), ('left', 'top'), ('left', 'bottom'),
+                    ('right', 'bottom'), ('right', 'center'), ('left', 'center'),
+                    ('right', 'center'), ('center', 'bottom'), ('center', 'top'),
+                    ('center', 'center')]
+
+# height of a line of text (ascent and descent) in units of the font size
+_LINE_HEIGHT = 1.0325
+# offset of the baseline from the anchor of a text in units of the font size
+_BASELINE = {'bottom': -0.236, 'center': 0.26, 'top': 0.764, 'baseline': 0.}
+_TEXT_ANCHOR = {'left': 'start', 'center': 'middle', 'right': 'end'}
+# approximate character widths of DejaVu Sans in units of the font size
+_CHAR_WIDTHS = {}
+_CHAR_WIDTHS.update(dict.fromkeys('ijlI.,:;\'|!', 0.28))
+_CHAR_WIDTHS.update(dict.fromkeys('frt()[]{}-/ ', 0.36))
+_CHAR_WIDTHS.update(dict.fromkeys('mwMW%@', 0.9))
+_CHAR_WIDTHS.update(dict.fromkeys('0123456789', 0.64))
+_DEFAULT_CHAR_WIDTH = 0.6
+_UPPER_CHAR_WIDTH = 0.7
+
+
+def _text_width(s, size=FONT_SIZE):
+    """Estimated width of the string `s` in pixels"""
+    width = 0.
+    for c in s:
+        if c in _CHAR_WIDTHS:
+            width += _CHAR_WIDTHS[c]
+        elif c.isupper():
+            width += _UPPER_CHAR_WIDTH
+        else:
+            width += _DEFAULT_CHAR_WIDTH
+    return width * size
+
+
+def _colour(colour):
+    """SVG colour and opacity (None if opaque) of a matplotlib style colour"""
+    if isinstance(colour, str):
+        if colour in BASE_COLOURS:
+            return BASE_COLOURS[colour], None
+        if len(colour) == 2 and colour[0] == 'C' and colour[1].isdigit():
+            return CYCLE[int(colour[1])], None
+        try:
+            grey = float(colour)
+        except ValueError:
+            return colour, None
+        return '#%02x%02x%02x' % ((int(round(255 * grey)),) * 3), None
+    rgba = [float(v) for v in colour]
+    css = '#%02x%02x%02x' % tuple(int(round(255 * v)) for v in rgba[:3])
+    return css, (rgba[3] if len(rgba) == 4 else None)
+
+
+def _paint(colour, alpha=None, attr='stroke'):
+    """Attributes painting the stroke or fill with `colour`, `alpha` overrides its opacity"""
+    css, opacity = _colour(colour)
+    if alpha is not None:
+        opacity = alpha
+    if opacity is None or opacity >= 1:
+        return '%s="%s"' % (attr, css)
+    return '%s="%s" %s-opacity="%.3g"' % (attr, css, attr, opacity)
+
+
+def _text(x, y, s, size=FONT_SIZE, ha='center', va='baseline'):
+    return ('<text x="%.2f" y="%.2f" font-size="%.2f" text-anchor="%s">%s</text>' %
+            (x, y + _BASELINE[va] * size, size, _TEXT_ANCHOR[ha], escape(str(s))))
+
+
+def _path_data(x, y, closed=False):
+    """SVG path data of the line through `x`, `y`, broken at missing values (`Nan`)"""
+    parts = []
+    for xs, ys in zip(*_split_by_nan(x, y)):
+        if len(xs):
+            parts.append('M' + 'L'.join(['%.2f %.2f' % p for p in zip(xs.tolist(), ys.tolist())]))
+    if closed:
+        parts.append('Z')
+    return ''.join(parts)
+
+
+def _marker_data(x, y, size=MARKER_SIZE):
+    """SVG path data of 'x' markers at all points with values"""
+    h = size / 2.
+    valid = ~(np.isnan(x) | np.isnan(y))
+    return ''.join(['M%.2f %.2fL%.2f %.2fM%.2f %.2fL%.2f %.2f' %
+                    (a - h, b - h, a + h, b + h, a - h, b + h, a + h, b - h)
+                    for a, b in zip(x[valid].tolist(), y[valid].tolist())])
+
+
+def _axes_box(width, height):
+    """Area of the axes as (left, top, right, bottom) in pixels"""
+    left, bottom, right, top = AXES_BOX
+    return left * width, (1 - top) * height, right * width, (1 - bottom) * height
+
+
+def _open(width, height):
+    return ['<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" '
+            'viewBox="0 0 %d %d" font-family="%s">' % (width, height, width, height, FONT_FAMILY),
+            '<rect width="100%" height="100%" fill="#ffffff"/>']
+
+
+def _clip_id(name, shape):
+    """
+    Id of a clip path, unique per clip `shape` so that several charts can be
+    inlined into one HTML document (charts sharing an id share the shape)
+    """
+    return '%s-%s' % (name, hashlib.sha1(shape.encode()).hexdigest()[:12])
+
+
+def _segments_hit(start, delta, boxes):
+    """
+    Which of the segments from `start` by `delta` (arrays of shape (segments, 2))
+    intersect which of the `boxes` (array of (left, top, right, bottom) rows),
+    returns a boolean array of shape (boxes, segments) (Liang-Barsky clipping)
+    """
+    x, y = start.T
+    dx, dy = delta.T
+    left, top, right, bottom = [b[:, None] for b in boxes.T]
+    t0 = np.zeros((len(boxes), len(start)))
+    t1 = np.ones_like(t0)
+    hit = np.ones(t0.shape, dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for p, q in ((-dx, x - left), (dx, right - x), (-dy, y - top), (dy, bottom - y)):
+            ratio = q / p
+            t0 = np.where(p < 0, np.maximum(t0, ratio), t0)
+            t1 = np.where(p > 0, np.minimum(t1, ratio), t1)
+            hit &= (p != 0) | (q >= 0)
+    return hit & (t0 <= t1)
+
+
+def _best_legend_box(axes, size, paths):
+    """
+    Position (left, top) of a legend of `size` in the `axes` box, chosen like
+    matplotlib's loc='best': the first location with the fewest vertices of the
+    `paths` (pairs of x and y arrays) inside and the fewest paths crossing it
+    """
+    w, h = size
+    pad = LEGEND_BORDER_AXES_PAD * FONT_SIZE
+    left, top, right, bottom = axes[0] + pad, axes[1] + pad, axes[2] - pad, axes[3] - pad
+    xs = {'left': left, 'center': (left + right - w) / 2, 'right': right - w}
+    ys = {'top': top, 'center': (top + bottom - h) / 2, 'bottom': bottom - h}
+    corners = np.array([(xs[ha], ys[va]) for ha, va in LEGEND_LOCATIONS])
+    if not paths:
+        return corners[0]
+    boxes = np.column_stack((corners, corners + (w, h)))
+
+    # all paths in one array, separated by a row of Nan values
+    sizes = [len(x) + 1 for x, _ in paths]
+    xy = np.column_stack((np.concatenate([np.append(x, np.nan) for x, _ in paths]),
+                          np.concatenate([np.append(y, np.nan) for _, y in paths])))
+    path_ids = np.repeat(np.arange(len(paths)), sizes)
+    valid = ~np.isnan(xy).any(axis=1)
+    px, py = xy[valid].T
+    badness = ((px > boxes[:, 0:1]) & (px < boxes[:, 2:3]) &
+               (py > boxes[:, 1:2]) & (py < boxes[:, 3:4])).sum(axis=1)
+    segment = valid[:-1] & valid[1:]
+    if segment.any():
+        hit = _segments_hit(xy[:-1][segment], np.diff(xy, axis=0)[segment], boxes)
+        # number of paths with at least one segment in the box
+        ids = path_ids[:-1][segment]
+        first = np.flatnonzero(np.diff(ids, prepend=-1))
+        badness = badness + np.maximum.reduceat(hit, first, axis=1).sum(axis=1)
+    # argmin returns the first of equally good locations, like matplotlib
+    return corners[np.argmin(badness)]
+
+
+def _legend(axes, entries, paths):
+    """
+    Markup of a legend at the best location in the `axes` box
+
+    entries - sequence of (label, handle) with handles 'line', 'dashed' (dashed
+              line with an 'x' marker) or 'patch' plus their paint attributes
+    paths - the lines in the axes the legend should not cover
+    """
+    entries = [(label, handle) for label, handle in entries
+               if label and not str(label).startswith('_')]
+    if not entries:
+        return []
+    em = FONT_SIZE
+    text_x = (LEGEND_BORDER_PAD + LEGEND_HANDLE_LENGTH + LEGEND_HANDLE_TEXT_PAD) * em
+    width = text_x + max(_text_width(str(label)) for label, _ in entries) + LEGEND_BORDER_PAD * em
+    row = _LINE_HEIGHT * em
+    step = row + LEGEND_LABEL_SPACING * em
+    height = 2 * LEGEND_BORDER_PAD * em + len(entries) * step - LEGEND_LABEL_SPACING * em
+    x, y = _best_legend_box(axes, (width, height), paths)
+
+    out = ['<rect x="%.2f" y="%.2f" width="%.2f" height="%.2f" rx="%.2f" fill="#ffffff" '
+           'fill-opacity="%.2g" stroke="%s" stroke-opacity="%.2g" stroke-width="%.2f"/>' %
+           (x, y, width, height, 0.2 * em, LEGEND_ALPHA, LEGEND_EDGE_COLOUR, LEGEND_ALPHA, PT)]
+    h0 = x + LEGEND_BORDER_PAD * em
+    h1 = h0 + LEGEND_HANDLE_LENGTH * em
+    for i, (label, (kind, paint)) in enumerate(entries):
+        yc = y + LEGEND_BORDER_PAD * em + i * step + row / 2
+        if kind == 'patch':
+            out.append('<rect x="%.2f" y="%.2f" width="%.2f" height="%.2f" %s/>' %
+                       (h0, yc - LEGEND_HANDLE_HEIGHT * em / 2, h1 - h0,
+                        LEGEND_HANDLE_HEIGHT * em, paint))
+        elif kind == 'dashed':
+            out.append('<path d="M%.2f %.2fL%.2f %.2f" fill="none" %s stroke-width="%.2f" '
+                       'stroke-dasharray="%.2f,%.2f"/>' %
+                       (h0, yc, h1, yc, paint, LINE_WIDTH, DASHES[0], DASHES[1]))
+            out.append('<path d="%s" fill="none" %s stroke-width="%.2f"/>' %
+                       (_marker_data(np.array([(h0 + h1) / 2]), np.array([yc])), paint,
+                        MARKER_WIDTH))
+        else:
+            out.append('<path d="M%.2f %.2fL%.2f %.2f" fill="none" %s stroke-width="%.2f"/>' %
+                       (h0, yc, h1, yc, paint, LINE_WIDTH))
+        out.append(_text(x + text_x, yc, label, va='center', ha='left'))
+    return out
+
+
+def _radial_ticks(rmax):
+    """Radial ticks in (0, rmax] as matplotlib's default locator picks them"""
+    if not rmax > 0:
+        return np.empty(0)
+    scale = 10 ** math.floor(math.log10(rmax / 9.))
+    for step in (1, 2, 2.5, 5, 10):
+        step *= scale
+        if math.ceil(rmax / step - 1e-9) <= 9:
+            break
+    return np.arange(1, math.floor(rmax / step + 1e-9) + 1) * step
+
+
+@staged('radar_chart_svg')
+def radar_chart_svg(data, line_labels, var_labels, **kwargs):
+    """
+    Render a radar chart as SVG, without matplotlib (see plot_radar_chart)
+
+    data - one- or two-dimensional sequence with the observations in the rows
+           and the variables in the columns
+    line_labels - labels for the legend, no legend is drawn if None
+    var_labels - labels of the variables
+    kwargs: keyword arguments, can be:
+        title - title of the chart, default: ''
+        frame - shape of the frame, 'polygon' or 'circle', default: 'polygon'
+        r_ticks - positions of the radial ticks, default: None (chosen like matplotlib)
+        r_tick_labels - labels for the radial ticks, default: None (the tick values)
+        colours - colours of the lines, matplotlib colour letters, 'C0' to 'C9',
+                  rgb(a) tuples or any SVG colour, default: None (matplotlib's cycle)
+        fill - draw filled polygons instead of lines, default: False
+        alpha - float or 'density', see plot_radar_chart, default: None
+        width - width of the image in pixels, default: 640
+        height - height of the image in pixels, default: 480
+
+    returns:
+        the SVG document as string
+    """
+    title = kwargs.pop('title', '')
+    frame = kwargs.pop('frame', 'polygon')
+    r_ticks = kwargs.pop('r_ticks', None)
+    r_tick_labels = kwargs.pop('r_tick_labels', None)
+    colours = kwargs.pop('colours', None)
+    fill = kwargs.pop('fill', False)
+    alpha = kwargs.pop('alpha', None)
+    width = kwargs.pop('width', WIDTH)
+    height = kwargs.pop('height', HEIGHT)
+    if kwargs:
+        raise TypeError("Unexpected keyword arguments: %s" % ', '.join(sorted(kwargs)))
+    if frame not in ('polygon', 'circle'):
+        raise ValueError('unknown value for `frame`: %s' % frame)
+
+    data, d_rows, d_cols = _handle_input_data(data)
+    data = data.astype(float)
+    if alpha == 'density':
+        alpha = _density_alpha(d_rows)
+    if colours is None:
+        colours = [CYCLE[i % len(CYCLE)] for i in range(d_rows)]
+
+    with stage('layout') as st:
+        left, top, right, bottom = _axes_box(width, height)
+        side = min(right - left, bottom - top)
+        cx, cy = (left + right) / 2., (top + bottom) / 2.
+        radius = side / 2.
+        theta = _theta(d_cols)
+        rmax = _radar_rmax(np.nanmax(data), d_cols, frame, round_up=True)
+        scale = radius / rmax
+        # the lines are closed by repeating the first column, like RadarAxes.plot
+        closed = np.concatenate((data, data[:, :1]), axis=1) * scale
+        cos = np.append(np.cos(theta), np.cos(theta[0]))
+        sin = np.append(np.sin(theta), np.sin(theta[0]))
+        xs = cx + closed * cos
+        ys = cy - closed * sin
+
+        if r_ticks is None:
+            ticks = _radial_ticks(rmax)
+        else:
+            ticks = np.asarray(r_ticks, dtype=float)
+        if r_tick_labels is None:
+            tick_labels = ['%g' % t for t in ticks]
+        else:
+            tick_labels = list(r_tick_labels)
+        # the default ticks leave out the center, like matplotlib's
+        shown = ((ticks > 0) if r_ticks is None else (ticks >= 0)) & (ticks <= rmax)
+        if frame == 'polygon':
+            verts = _unit_poly_verts(theta)
+            frame_x = cx - radius + verts[:, 0] * side
+            frame_y = cy + radius - verts[:, 1] * side
+            shape = '<path d="%s"' % _path_data(frame_x, frame_y, closed=True)
+        else:
+            shape = '<circle cx="%.2f" cy="%.2f" r="%.2f"' % (cx, cy, radius)
+        st.add(bytes=data.nbytes)
+
+    with stage('markup') as st:
+        out = _open(width, height)
+        clip = _clip_id('radar-frame', shape)
+        out.append('<defs><clipPath id="%s">%s/></clipPath></defs>' % (clip, shape))
+        out.append('%s fill="#ffffff"/>' % shape)
+        # grid
+        out.append('<g clip-path="url(#%s)" fill="none" stroke="%s" '
+                   'stroke-width="%.2f">' % (clip, GRID_COLOUR, THIN_WIDTH))
+        for t in ticks[shown].tolist():
+            out.append('<circle cx="%.2f" cy="%.2f" r="%.2f"/>' % (cx, cy, t * scale))
+        out.append('<path d="%s"/>' % ''.join(
+            ['M%.2f %.2fL%.2f %.2f' % (cx, cy, cx + radius * c, cy - radius * s)
+             for c, s in zip(cos[:-1].tolist(), sin[:-1].tolist())]))
+        out.append('</g>')
+        # data
+        out.append('<g clip-path="url(#%s)" stroke-width="%.2f" '
+                   'stroke-linejoin="round" stroke-linecap="square">' % (clip, LINE_WIDTH))
+        entries = []
+        for i in range(d_rows):
+            colour = colours[i % len(colours)]
+            label = None if line_labels is None else line_labels[i]
+            d = _path_data(xs[i], ys[i])
+            if fill:
+                out.append('<path d="%sZ" %s %s/>' %
+                           (d, _paint(colour, alpha, 'fill'), _paint(colour, alpha)))
+                entries.append((label, ('patch', _paint(colour, alpha, 'fill'))))
+            else:
+                out.append('<path d="%s" fill="none" %s/>' % (d, _paint(colour, alpha)))
+                entries.append((label, ('line', _paint(colour, alpha))))
+        out.append('</g>')
+        # frame, tick labels and variable labels
+        out.append('%s fill="none" stroke="#000000" stroke-width="%.2f"/>' % (shape, THIN_WIDTH))
+        angle = math.radians(R_LABEL_ANGLE)
+        for t, label, show in zip(ticks.tolist(), tick_labels, shown.tolist()):
+            if show:
+                out.append(_text(cx + t * scale * math.cos(angle),
+                                 cy - t * scale * math.sin(angle), label, ha='left',
+                                 va='bottom'))
+        label_radius = radius + VAR_LABEL_PAD
+        for c, s, label in zip(cos[:-1].tolist(), sin[:-1].tolist(), var_labels):
+            out.append(_text(cx + label_radius * c, cy - label_radius * s, label,
+                             va='center'))
+        if line_labels is not None:
+            out.extend(_legend((cx - radius, cy - radius, cx + radius, cy + radius), entries,
+                               list(zip(xs, ys))))
+        if title:
+            out.append(_text(width / 2., 0.02 * height, title, TITLE_SIZE, va='top'))
+        out.append('</svg>')
+        svg = '\n'.join(out)
+        st.add(bytes=len(svg))
+    return svg
+
+
+@staged('sem_diff_svg')
+def sem_diff_svg(data, x_labels, y_labels, **kwargs):
+    """
+    Render a semantic differential as SVG, without matplotlib (see plot_sem_diff)
+
+    data - one- or twodimensional sequence with the observations in the rows and
+           the attributes in the columns, or a SemDiffSummary
+    x_labels - labels for the values on the x axis
+    y_labels - labels for the y axes, a sequence of labels (right side only) or
+               of pairs of labels (both sides)
+    kwargs: keyword arguments, the ones of plot_sem_diff (x_pad, x_offset,
+            colours, line_labels, title, jitter_amount, aggregate, groups, band,
+            quantiles, ci) except `show` and `ax`, plus
+        width - width of the image in pixels, default: 640
+        height - height of the image in pixels, default: 480
+
+    returns:
+        the SVG document as string
+    """
+    x_pad = kwargs.pop('x_pad', 0.2)
+    x_offset = kwargs.pop('x_offset', 0)
+    colours = kwargs.pop('colours', None)
+    line_labels = kwargs.pop('line_labels', None)
+    title = kwargs.pop('title', '')
+    jitter_amount = kwargs.pop('jitter_amount', 0)
+    aggregate = kwargs.pop('aggregate', None)
+    groups = kwargs.pop('groups', None)
+    band = kwargs.pop('band', 'default')
+    quantiles = kwargs.pop('quantiles', (0.25, 0.75))
+    ci = kwargs.pop('ci', 0.95)
+    width = kwargs.pop('width', WIDTH)
+    height = kwargs.pop('height', HEIGHT)
+    if kwargs:
+        raise TypeError("Unexpected keyword arguments: %s" % ', '.join(sorted(kwargs)))
+
+    bands = None
+    if aggregate is not None or isinstance(data, SemDiffSummary):
+        data, bands, group_labels = _summarize(data, groups, aggregate or 'mean', band,
+                                               quantiles, ci)
+        if line_labels is None:
+            line_labels = group_labels
+        d_rows, d_cols = data.shape
+        if jitter_amount:
+            offsets = _jitter_offsets(d_rows, jitter_amount)[:, None]
+            data = data + offsets
+            if bands is not None:
+                bands = (bands[0] + offsets, bands[1] + offsets)
+    else:
+        data, d_rows, d_cols = _sem_diff_input_data(data, jitter_amount)
+    left_labels, right_labels, line_labels, do_legend = _get_labels(y_labels,
+                                                                    line_labels,
+                                                                    d_rows)
+    if colours is None:
+        colours, n_c = SEM_DIFF_COLOURS, len(SEM_DIFF_COLOURS)
+    else:
+        colours, n_c = _handle_colours(colours, d_rows)
+
+    with stage('layout') as st:
+        left, top, right, bottom = _axes_box(width, height)
+        x_pos = np.arange(len(x_labels)) + x_offset
+        x0, x1 = x_pos[0] - x_pad, x_pos[-1] + x_pad
+        y = np.arange(d_cols)[::-1].astype(float)
+        # y limits of matplotlib's autoscaling with 5 % margins
+        y0, y1 = (-0.055, 0.055) if d_cols == 1 else (-0.05 * (d_cols - 1), 1.05 * (d_cols - 1))
+        x_scale = (right - left) / (x1 - x0)
+        y_scale = (bottom - top) / (y1 - y0)
+        xs = left + (data - x0) * x_scale
+        ys = bottom - (y - y0) * y_scale
+        tick_x = left + (x_pos - x0) * x_scale
+        if bands is not None:
+            band_x = (left + (bands[0] - x0) * x_scale, left + (bands[1] - x0) * x_scale)
+        st.add(bytes=data.nbytes)
+
+    with stage('markup') as st:
+        out = _open(width, height)
+        shape = ('<rect x="%.2f" y="%.2f" width="%.2f" height="%.2f"/>'
+                 % (left, top, right - left, bottom - top))
+        clip = _clip_id('sem-diff-axes', shape)
+        out.append('<defs><clipPath id="%s">%s</clipPath></defs>' % (clip, shape))
+        out.append('<g clip-path="url(#%s)">' % clip)
+        paths = []
+        if bands is not None:
+            for i in range(d_rows):
+                lower, upper = band_x[0][i], band_x[1][i]
+                # the bands are interrupted where one of their limits is missing
+                _, pieces = _split_by_nan(lower + upper, np.column_stack((lower, upper, ys)))
+                for piece in pieces:
+                    if not len(piece):
+                        continue
+                    px = np.concatenate((piece[:, 0], piece[::-1, 1]))
+                    py = np.concatenate((piece[:, 2], piece[::-1, 2]))
+                    out.append('<path d="%s" %s/>' % (
+                        _path_data(px, py, closed=True),
+                        _paint(colours[i % n_c], BAND_ALPHA, 'fill')))
+                    paths.append((px, py))
+        grid = (['M%.2f %.2fL%.2f %.2f' % (x, top, x, bottom) for x in tick_x.tolist()
+                 if left <= x <= right] +
+                ['M%.2f %.2fL%.2f %.2f' % (left, y, right, y) for y in ys.tolist()])
+        out.append('<path d="%s" fill="none" stroke="%s" stroke-width="%.2f"/>' %
+                   (''.join(grid), GRID_COLOUR, THIN_WIDTH))
+        entries = []
+        for i in range(d_rows):
+            paint = _paint(colours[i % n_c])
+            out.append('<path d="%s" fill="none" %s stroke-width="%.2f" '
+                       'stroke-dasharray="%.2f,%.2f"/>' %
+                       (_path_data(xs[i], ys), paint, LINE_WIDTH, DASHES[0], DASHES[1]))
+            out.append('<path d="%s" fill="none" %s stroke-width="%.2f"/>' %
+                       (_marker_data(xs[i], ys), paint, MARKER_WIDTH))
+            entries.append((line_labels[i], ('dashed', paint)))
+            paths.append((xs[i], ys))
+        out.append('</g>')
+
+        # spines, ticks and their labels
+        out.append('<rect x="%.2f" y="%.2f" width="%.2f" height="%.2f" fill="none" '
+                   'stroke="#000000" stroke-width="%.2f"/>' %
+                   (left, top, right - left, bottom - top, THIN_WIDTH))
+        ticks = ['M%.2f %.2fl0 %.2f' % (x, bottom, TICK_LENGTH) for x in tick_x.tolist()]
+        ticks += ['M%.2f %.2fl%.2f 0' % (left, y, -TICK_LENGTH) for y in ys.tolist()]
+        if left_labels is not None:
+            ticks += ['M%.2f %.2fl%.2f 0' % (right, y, TICK_LENGTH) for y in ys.tolist()]
+        out.append('<path d="%s" stroke="#000000" stroke-width="%.2f"/>' %
+                   (''.join(ticks), THIN_WIDTH))
+        label_offset = TICK_LENGTH + TICK_PAD
+        for x, label in zip(tick_x.tolist(), x_labels):
+            out.append(_text(x, bottom + label_offset, label, va='top'))
+        for y, label in zip(ys.tolist(), right_labels):
+            out.append(_text(right + label_offset, y, label, ha='left', va='center'))
+        if left_labels is not None:
+            for y, label in zip(ys.tolist(), left_labels):
+                out.append(_text(left - label_offset, y, label, ha='right', va='center'))
+        if do_legend:
+            out.extend(_legend((left, top, right, bottom), entries, paths))
+        if title:
+            out.append(_text((left + right) / 2., top - TITLE_PAD, title, TITLE_SIZE))
+        out.append('</svg>')
+        svg = '\n'.join(out)
+        st.add(bytes=len(svg))
+    return svg
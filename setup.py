@@ -13,5 +13,6 @@ setuptools.setup(
     long_description_content_type = 'text/markdown',
     url = 'https://github.com/phenyque/python-snippets',
     packages = setuptools.find_packages(),
-    python_requires='>=3.5'
+    entry_points = {'console_scripts': ['pysnips-audio = pysnips.audio.cli:main']},
+    python_requires='>=3.7'
 )
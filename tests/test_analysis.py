@@ -0,0 +1,55 @@
+import numpy as np
+import soundfile as sf
+
+from pysnips.audio import LevelMeter, analyze_files, analyze_levels
+from pysnips.audio.analysis import _k_weighting
+
+# K-weighting coefficients at 48 kHz as published in ITU-R BS.1770
+BS1770_SHELF = ([1.53512485958697, -2.69169618940638, 1.19839281085285],
+                [1.0, -1.69065929318241, 0.73248077421585])
+BS1770_HIGHPASS = ([1.0, -2.0, 1.0], [1.0, -1.99004745483398, 0.99007225036621])
+
+
+def _sine(amplitude, seconds=10, fs=48000, f=997.):
+    return amplitude * np.sin(2 * np.pi * f * np.arange(int(seconds * fs)) / fs)
+
+
+def test_k_weighting_matches_the_published_coefficients():
+    for (b, a), (b_ref, a_ref) in zip(_k_weighting(48000), (BS1770_SHELF, BS1770_HIGHPASS)):
+        np.testing.assert_allclose(np.array(b) / a[0], b_ref, atol=1e-8)
+        np.testing.assert_allclose(np.array(a) / a[0], a_ref, atol=1e-8)
+
+
+def test_loudness_of_the_reference_sine():
+    # a full scale 997 Hz sine in one channel measures -3.01 LKFS
+    meter = LevelMeter(1, 48000, loudness=True)
+    meter.process(_sine(1.))
+    np.testing.assert_allclose(meter.result().loudness, -3.01, atol=0.01)
+    meter = LevelMeter(1, 48000, loudness=True)
+    meter.process(_sine(0.1))
+    np.testing.assert_allclose(meter.result().loudness, -23.01, atol=0.01)
+
+
+def test_result_does_not_depend_on_the_blocksize():
+    signal = np.random.default_rng(0).uniform(-0.5, 0.5, (48000 * 3, 2))
+    results = []
+    for blocksize in (1000, 4800, len(signal)):
+        meter = LevelMeter(2, 48000, loudness=True)
+        for start in range(0, len(signal), blocksize):
+            meter.process(signal[start:start + blocksize])
+        results.append(meter.result())
+    for r in results[1:]:
+        np.testing.assert_allclose(r.loudness, results[0].loudness)
+        np.testing.assert_allclose(r.rms, results[0].rms)
+    np.testing.assert_allclose(results[0].peak, np.abs(signal).max(axis=0))
+    np.testing.assert_allclose(results[0].dc_offset, signal.mean(axis=0))
+
+
+def test_analyze_files(tmp_path):
+    filename = str(tmp_path / 'sine.wav')
+    sf.write(filename, np.column_stack((_sine(0.5, 2), _sine(0.25, 2))), 48000,
+             subtype='FLOAT')
+    levels = analyze_levels(filename, blocksize=10000, db=True)
+    np.testing.assert_allclose(levels.peak, 20 * np.log10([0.5, 0.25]), atol=1e-3)
+    np.testing.assert_allclose(levels.crest_factor, 20 * np.log10(np.sqrt(2)), atol=1e-3)
+    assert analyze_files([filename], workers=0)[0].frames == 96000
@@ -0,0 +1,100 @@
+import struct
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from pysnips.audio import (extract_channels_from_wav, monofiles_to_multitrack,
+                           multitrack_to_monofiles)
+
+# (file extension, subtype) of the round trips, the memory maps have no 24 bit samples
+FORMATS = [('wav', 'PCM_24'), ('wav', 'PCM_U8'), ('rf64', 'PCM_16'), ('rf64', 'PCM_24'),
+           ('w64', 'PCM_24'), ('w64', 'FLOAT')]
+MMAP_FORMATS = [('wav', 'PCM_U8'), ('rf64', 'PCM_16'), ('rf64', 'FLOAT'), ('w64', 'PCM_16'),
+                ('w64', 'PCM_U8')]
+CASES = ([(ext, subtype, False) for ext, subtype in FORMATS] +
+         [(ext, subtype, True) for ext, subtype in MMAP_FORMATS])
+
+
+def _write(path, subtype, channels=3, frames=1000):
+    """Write random samples that are exact in `subtype`, return them as float64"""
+    signal = np.random.default_rng(0).uniform(-0.9, 0.9, (frames, channels))
+    sf.write(str(path), signal, 48000, subtype=subtype)
+    return sf.read(str(path), dtype='float64', always_2d=True)[0]
+
+
+def _read(path):
+    return sf.read(str(path), dtype='float64', always_2d=True)[0]
+
+
+@pytest.mark.parametrize('ext, subtype, mmap', CASES)
+def test_extract_round_trip(tmp_path, ext, subtype, mmap):
+    source = tmp_path / ('multi.' + ext)
+    signal = _write(source, subtype)
+    out = tmp_path / ('out.' + ext)
+    extract_channels_from_wav(str(source), [2, 0], str(out), blocksize=300,
+                              return_signal=False, mmap=mmap)
+    assert sf.info(str(out)).subtype == subtype
+    np.testing.assert_array_equal(_read(out), signal[:, [2, 0]])
+
+
+@pytest.mark.parametrize('ext, subtype, mmap', CASES)
+def test_split_and_merge_round_trip(tmp_path, ext, subtype, mmap):
+    source = tmp_path / ('multi.' + ext)
+    signal = _write(source, subtype)
+    pattern = str(tmp_path / ('ch%d.' + ext))
+    multitrack_to_monofiles(str(source), pattern, blocksize=300, mmap=mmap)
+    for c in range(3):
+        assert sf.info(pattern % c).subtype == subtype
+        np.testing.assert_array_equal(_read(pattern % c)[:, 0], signal[:, c])
+
+    merged = tmp_path / ('merged.' + ext)
+    monofiles_to_multitrack([pattern % c for c in range(3)], str(merged), blocksize=300,
+                            mmap=mmap)
+    assert sf.info(str(merged)).subtype == subtype
+    np.testing.assert_array_equal(_read(merged), signal)
+
+
+@pytest.mark.parametrize('subtypes, expected', [(['PCM_16', 'PCM_24'], 'PCM_24'),
+                                                (['PCM_U8', 'PCM_16'], 'PCM_16'),
+                                                (['PCM_24', 'FLOAT'], 'FLOAT'),
+                                                (['PCM_32', 'FLOAT'], 'DOUBLE')])
+def test_merge_of_different_subtypes_keeps_all_samples(tmp_path, subtypes, expected):
+    files = []
+    signals = []
+    for i, subtype in enumerate(subtypes):
+        name = str(tmp_path / ('mono%d.wav' % i))
+        signals.append(_write(name, subtype, channels=1)[:, 0])
+        files.append(name)
+    merged = str(tmp_path / 'merged.wav')
+    monofiles_to_multitrack(files, merged)
+    assert sf.info(merged).subtype == expected
+    np.testing.assert_array_equal(_read(merged), np.column_stack(signals))
+
+
+def test_merge_of_incompatible_subtypes_needs_a_subtype(tmp_path):
+    files = [str(tmp_path / 'a.wav'), str(tmp_path / 'b.wav')]
+    _write(files[0], 'PCM_16', channels=1)
+    _write(files[1], 'ULAW', channels=1)
+    with pytest.raises(ValueError, match='subtype'):
+        monofiles_to_multitrack(files, str(tmp_path / 'merged.wav'))
+    monofiles_to_multitrack(files, str(tmp_path / 'merged.wav'), subtype='PCM_16')
+    assert sf.info(str(tmp_path / 'merged.wav')).subtype == 'PCM_16'
+
+
+@pytest.mark.parametrize('extra', [0, 2**32 - 2, 2**32 + 6])
+def test_memmap_of_riff_file_with_wrapped_data_size(tmp_path, extra):
+    from pysnips.audio import memmap_wav
+    # 4 GB of 16 bit mono samples plus `extra` bytes, stored as sparse file
+    data_size = 2**32 + extra
+    path = tmp_path / 'large.wav'
+    with open(str(path), 'wb') as f:
+        f.write(struct.pack('<4sI4s', b'RIFF', (36 + data_size) % 2**32, b'WAVE'))
+        f.write(struct.pack('<4sIHHIIHH', b'fmt ', 16, 1, 1, 48000, 96000, 2, 16))
+        f.write(struct.pack('<4sI', b'data', data_size % 2**32))
+        f.seek(44 + data_size - 2)
+        f.write(b'\x01\x00')
+    signal, fs = memmap_wav(str(path))
+    assert fs == 48000
+    assert signal.shape == (data_size // 2, 1)
+    assert signal[-1, 0] == 1
@@ -0,0 +1,64 @@
+import os
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pytest
+
+from pysnips.plotting import RenderCache, render_radar_charts
+from pysnips.plotting import cache as cache_module
+
+
+def _jobs(n):
+    rng = np.random.default_rng(0)
+    return [(rng.integers(1, 5, (2, 5)), ['a', 'b'], list('vwxyz')) for _ in range(n)]
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_render_radar_charts_counts_hits_and_misses(tmp_path, workers):
+    cache = RenderCache(str(tmp_path / 'cache'))
+    jobs = _jobs(4)
+    first = render_radar_charts(jobs, workers=workers, cache=cache, chunksize=1)
+    assert cache.stats['hits'] == 0 and cache.stats['misses'] == 4
+    second = render_radar_charts(jobs, workers=workers, cache=cache, chunksize=1)
+    assert cache.stats == {'hits': 4, 'misses': 4, 'hit_rate': 0.5}
+    assert first == second
+
+
+def test_put_scans_the_directory_only_when_needed(tmp_path, monkeypatch):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=10000)
+    scans = []
+    evict = cache._evict
+    monkeypatch.setattr(cache, '_evict', lambda: scans.append(1) or evict())
+    for i in range(50):
+        cache.put(cache.key(i), 'bin', b'x' * 100)
+    # one initial count, the entries fit into the cache afterwards
+    assert len(scans) == 1
+    assert cache._size == 5000
+
+
+def test_eviction_keeps_the_cache_below_max_bytes(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=1000)
+    keys = [cache.key(i) for i in range(30)]
+    for i, key in enumerate(keys):
+        cache.put(key, 'bin', b'x' * 100)
+        # distinct modification times for the LRU order
+        os.utime(cache._path(key, 'bin'), (i, i))
+    sizes = [os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(cache.directory)
+             for f in files]
+    assert sum(sizes) <= 1000
+    assert cache.get(keys[-1], 'bin') == b'x' * 100
+    assert cache.get(keys[0], 'bin') is None
+
+
+def test_rescan_picks_up_entries_of_other_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, 'RESCAN_INTERVAL', 4)
+    directory = str(tmp_path / 'cache')
+    cache = RenderCache(directory, max_bytes=1000)
+    other = RenderCache(directory, max_bytes=10**9)
+    cache.put(cache.key('own'), 'bin', b'x' * 100)
+    for i in range(20):
+        other.put(other.key(i), 'bin', b'x' * 100)
+    for i in range(3):
+        cache.put(cache.key('own', i), 'bin', b'x' * 100)
+    assert cache._size <= 1000
@@ -0,0 +1,34 @@
+import numpy as np
+import soundfile as sf
+
+from pysnips.audio.cli import main
+
+
+def _write(path, channels=2, frames=1000):
+    signal = np.random.default_rng(0).uniform(-0.5, 0.5, (frames, channels))
+    sf.write(str(path), signal, 48000, subtype='PCM_16')
+    return signal
+
+
+def test_extract_batch(tmp_path):
+    for name in ('a.wav', 'b.wav'):
+        _write(tmp_path / name)
+    out_dir = tmp_path / 'out'
+    assert main(['batch', 'extract', str(tmp_path / '*.wav'), '-c', '1', '-o', str(out_dir),
+                 '-j', '1', '-q']) == 0
+    for name in ('a.wav', 'b.wav'):
+        assert sf.info(str(out_dir / name)).channels == 1
+
+
+def test_missing_input_with_existing_output_is_a_job_failure(tmp_path, capsys):
+    _write(tmp_path / 'good.wav')
+    # the output of the missing input exists, so only its input can not be checked
+    _write(tmp_path / 'stale.wav')
+    manifest = tmp_path / 'jobs.txt'
+    manifest.write_text('%s %s\n%s %s\n' % (tmp_path / 'missing.wav', tmp_path / 'stale.wav',
+                                            tmp_path / 'good.wav', tmp_path / 'good_out.wav'))
+    assert main(['batch', 'extract', '--manifest', str(manifest), '-c', '0', '-j', '1']) == 1
+    assert sf.info(str(tmp_path / 'good_out.wav')).channels == 1
+    err = capsys.readouterr().err
+    assert 'FAILED' in err and 'stale.wav' in err
+    assert '1 done, 1 failed' in err
@@ -0,0 +1,41 @@
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+import soundfile as sf
+
+from pysnips.audio import monofiles_to_multitrack
+from pysnips.instrument import Aggregator, instrumented
+from pysnips.plotting import plot_radar_chart
+
+
+def test_read_ahead_threads_report_under_the_helper(tmp_path):
+    files = []
+    for i in range(2):
+        name = str(tmp_path / ('mono%d.wav' % i))
+        sf.write(name, np.zeros(1000), 8000, subtype='PCM_16')
+        files.append(name)
+    with instrumented(Aggregator()) as aggregator:
+        monofiles_to_multitrack(files, str(tmp_path / 'multi.wav'), blocksize=256)
+    summary = aggregator.summary()
+    assert 'read' not in summary
+    assert summary['monofiles_to_multitrack/read']['calls'] == 8
+    assert summary['monofiles_to_multitrack/read']['frames'] == 2000
+
+
+def test_plot_radar_chart_reports_the_draw():
+    with instrumented(Aggregator()) as aggregator:
+        plot_radar_chart([[1, 2, 3]], ['a'], ['x', 'y', 'z'])
+    stages = set(aggregator.summary())
+    assert {'plot_radar_chart/setup', 'plot_radar_chart/artists',
+            'plot_radar_chart/draw'} <= stages
+
+
+def test_shown_chart_is_not_drawn_while_disabled(monkeypatch):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    draws = []
+    original = FigureCanvasAgg.draw
+    monkeypatch.setattr(FigureCanvasAgg, 'draw',
+                        lambda canvas: draws.append(canvas) or original(canvas))
+    plot_radar_chart([[1, 2, 3]], ['a'], ['x', 'y', 'z'])
+    assert draws == []
@@ -0,0 +1,33 @@
+import numpy as np
+
+from pysnips.plotting import SemDiffSummary
+
+
+def test_summary_matches_numpy():
+    data = np.random.default_rng(0).integers(1, 6, (40, 3)).astype(float)
+    data[::7, 1] = np.nan
+    summary = SemDiffSummary.from_chunks([data[:15], data[15:]])
+    np.testing.assert_allclose(summary.mean()[0], np.nanmean(data, axis=0))
+    np.testing.assert_allclose(summary.std()[0], np.nanstd(data, axis=0, ddof=1))
+    np.testing.assert_allclose(summary.median()[0], np.nanmedian(data, axis=0))
+
+
+def test_all_nan_chunk_is_ignored():
+    data = np.array([[1., 2.], [3., 5.]])
+    summary = SemDiffSummary().update(data)
+    summary.update(np.full((3, 2), np.nan))
+    np.testing.assert_allclose(summary.mean(), [[2., 3.5]])
+    np.testing.assert_allclose(summary.median(), [[2., 3.5]])
+    np.testing.assert_array_equal(summary.count(), [[2, 2]])
+
+
+def test_group_with_only_missing_values():
+    data = np.array([[1., 2.], [np.nan, np.nan], [3., 4.]])
+    summary = SemDiffSummary().update(data, groups=['a', 'b', 'a'])
+    assert summary.groups == ['a', 'b']
+    np.testing.assert_allclose(summary.mean()[0], [2., 3.])
+    assert np.isnan(summary.mean()[1]).all()
+    assert np.isnan(summary.median()[1]).all()
+    # the group gets values later
+    summary.update([[5., 6.]], groups=['b'])
+    np.testing.assert_allclose(summary.median()[1], [5., 6.])
@@ -0,0 +1,25 @@
+import re
+
+from pysnips.plotting.svg import radar_chart_svg, sem_diff_svg
+
+
+def _clip_ids(svg):
+    defined = re.findall(r'<clipPath id="([^"]+)"', svg)
+    used = set(re.findall(r'url\(#([^)]+)\)', svg))
+    assert len(defined) == 1 and used == set(defined)
+    return defined[0]
+
+
+def test_charts_with_different_frames_have_different_clip_ids():
+    ids = [_clip_ids(radar_chart_svg([[1, 2, 3]], None, ['a', 'b', 'c'])),
+           _clip_ids(radar_chart_svg([[1, 2, 3, 4]], None, ['a', 'b', 'c', 'd'])),
+           _clip_ids(radar_chart_svg([[1, 2, 3]], None, ['a', 'b', 'c'], frame='circle')),
+           _clip_ids(sem_diff_svg([[1, 2, 3]], ['1', '2', '3'], ['a', 'b', 'c'])),
+           _clip_ids(sem_diff_svg([[1, 2, 3]], ['1', '2', '3'], ['a', 'b', 'c'],
+                                  width=800))]
+    assert len(set(ids)) == len(ids)
+
+
+def test_clip_id_is_stable():
+    assert (radar_chart_svg([[1, 2, 3]], None, ['a', 'b', 'c']) ==
+            radar_chart_svg([[1, 2, 3]], None, ['a', 'b', 'c']))